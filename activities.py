@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Activity definitions and events for Finance Tracker
+- activities defines every tracked activity (label, emoji, colour, order), so
+  adding one is an INSERT rather than a schema change and code edits
+- activity_log holds one (date, activity_id) row per activity done; generic
+  aggregates scale with logged events instead of activities x days
+- The original activities keep their personal_log columns (column_name);
+  triggers mirror those columns into activity_log, so every existing writer
+  keeps it current. Activities added later live only in activity_log
+- Migration 11 copies personal_log history across in small batches, each its
+  own short transaction, so the app keeps writing while it runs
+
+Usage: python activities.py list
+       python activities.py add meditation "Meditation" [--emoji 🧘] [--color info]
+       python activities.py hide NAME / python activities.py show NAME
+"""
+
+import argparse
+import re
+import sqlite3
+
+import cache
+import rollups
+
+BACKFILL_BATCH_SIZE = 500
+
+# Names double as form field names next to date and notes, and as column names
+# in personal exports and analytics series, so they can't take those columns'
+# names (the built-in activities' names are already taken)
+NAME_PATTERN = re.compile(r'[a-z][a-z0-9_]{0,39}')
+RESERVED_NAMES = {'id', 'date', 'notes', 'created_at', 'updated_at',
+                  'bucket', 'start', 'end', 'spending', 'entries', 'days_logged'}
+
+# An activity's id - 1 is its bit in 64-bit activity masks (activity_bits.py)
+MAX_ACTIVITIES = 63
+
+# (name, label, emoji, colour, shown on the dashboard) for the personal_log columns
+BUILTIN = (
+    ('gym', 'Gym', '💪', 'primary', 1),
+    ('jiu_jitsu', 'Jiu Jitsu', '🥋', 'danger', 1),
+    ('skateboarding', 'Skateboarding', '🛹', 'warning', 1),
+    ('work', 'Work', '💼', 'success', 1),
+    ('coitus', 'Coitus', '❤️', 'info', 0),
+    ('sauna', 'Sauna', '🧖‍♂️', 'secondary', 1),
+    ('supplements', 'Supplements', '💊', 'dark', 1),
+)
+
+# Built-in activities get ids 1..7 in rollups.ACTIVITIES order
+BUILTIN_IDS = {name: i + 1 for i, name in enumerate(rollups.ACTIVITIES)}
+_BUILTIN_ID_LIST = ', '.join(str(i) for i in BUILTIN_IDS.values())
+
+TRIGGERS = (
+    'personal_log_activities_insert',
+    'personal_log_activities_update',
+    'personal_log_activities_delete',
+    'activity_log_count_insert',
+    'activity_log_count_delete',
+)
+
+
+# ------------------------------
+# Schema
+# ------------------------------
+def _mirror(row):
+    """Statements inserting a personal_log row's built-in flags into activity_log"""
+    return ''.join(f'''
+            INSERT OR IGNORE INTO activity_log (date, activity_id)
+            SELECT {row}.date, {activity_id} WHERE IFNULL({row}.{name}, 0) != 0;'''
+                   for name, activity_id in BUILTIN_IDS.items())
+
+
+def _unmirror(row):
+    return f'''
+            DELETE FROM activity_log WHERE date = {row}.date AND activity_id IN ({_BUILTIN_ID_LIST});'''
+
+
+def _triggers():
+    return (
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_activities_insert
+        AFTER INSERT ON personal_log BEGIN{_mirror('NEW')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_activities_update
+        AFTER UPDATE ON personal_log BEGIN{_unmirror('OLD')}{_mirror('NEW')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_activities_delete
+        AFTER DELETE ON personal_log BEGIN{_unmirror('OLD')}
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS activity_log_count_insert
+        AFTER INSERT ON activity_log BEGIN
+            INSERT INTO activity_counts (activity_id, days) VALUES (NEW.activity_id, 1)
+            ON CONFLICT(activity_id) DO UPDATE SET days = days + 1;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS activity_log_count_delete
+        AFTER DELETE ON activity_log BEGIN
+            UPDATE activity_counts SET days = days - 1 WHERE activity_id = OLD.activity_id;
+        END''',
+    )
+
+
+def create_triggers(conn):
+    for sql in _triggers():
+        conn.execute(sql)
+
+
+def drop_triggers(conn):
+    """Drop the mirror and counter triggers ahead of a bulk load; rebuild() afterwards"""
+    for name in TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def create_activities(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Create the activity tables and copy existing history (migration step).
+
+    The triggers are committed first, so rows written while the history is
+    copied are mirrored by them; each batch is one INSERT ... SELECT in its
+    own transaction and INSERT OR IGNORE makes re-running it harmless.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activities (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            label TEXT NOT NULL,
+            emoji TEXT NOT NULL DEFAULT '✅',
+            color TEXT NOT NULL DEFAULT 'secondary',
+            position INTEGER NOT NULL DEFAULT 0,
+            column_name TEXT,
+            dashboard BOOLEAN NOT NULL DEFAULT 1,
+            active BOOLEAN NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_log (
+            date DATE NOT NULL,
+            activity_id INTEGER NOT NULL REFERENCES activities (id),
+            PRIMARY KEY (date, activity_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_log_activity_date ON activity_log (activity_id, date)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_counts (
+            activity_id INTEGER PRIMARY KEY,
+            days INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.executemany('''
+        INSERT OR IGNORE INTO activities (id, name, label, emoji, color, position, column_name, dashboard)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(BUILTIN_IDS[name], name, label, emoji, color, BUILTIN_IDS[name], name, dashboard)
+          for name, label, emoji, color, dashboard in BUILTIN])
+    create_triggers(conn)
+    conn.commit()
+    copy_history(conn, batch_size)
+
+
+def copy_history(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Mirror existing personal_log rows into activity_log, one short transaction per batch"""
+    last_id = 0
+    while True:
+        row = conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM personal_log WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (last_id, batch_size)).fetchone()
+        if row[0] is None:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        for name, activity_id in BUILTIN_IDS.items():
+            conn.execute(f'''
+                INSERT OR IGNORE INTO activity_log (date, activity_id)
+                SELECT date, ? FROM personal_log WHERE id > ? AND id <= ? AND IFNULL({name}, 0) != 0
+            ''', (activity_id, last_id, row[0]))
+        conn.commit()
+        last_id = row[0]
+
+
+def rebuild(conn):
+    """Re-mirror the built-in columns and recount every activity (after a bulk load)"""
+    conn.execute(f'DELETE FROM activity_log WHERE activity_id IN ({_BUILTIN_ID_LIST})')
+    for name, activity_id in BUILTIN_IDS.items():
+        conn.execute(f'''
+            INSERT INTO activity_log (date, activity_id)
+            SELECT date, ? FROM personal_log WHERE IFNULL({name}, 0) != 0
+        ''', (activity_id,))
+    conn.execute('DELETE FROM activity_counts')
+    conn.execute('''
+        INSERT INTO activity_counts (activity_id, days)
+        SELECT activity_id, COUNT(*) FROM activity_log GROUP BY activity_id
+    ''')
+
+
+# ------------------------------
+# Queries
+# ------------------------------
+def load(conn, dashboard_only=False):
+    """Active activities in display order, as dicts"""
+    sql = 'SELECT * FROM activities WHERE active = 1'
+    if dashboard_only:
+        sql += ' AND dashboard = 1'
+    return [dict(row) for row in conn.execute(sql + ' ORDER BY position, id')]
+
+
+def counts_between(conn, start, end):
+    """{activity_id: days done} between two dates"""
+    return dict(conn.execute('''
+        SELECT activity_id, COUNT(*) FROM activity_log
+        WHERE date >= ? AND date <= ?
+        GROUP BY activity_id
+    ''', (start, end)).fetchall())
+
+
+def all_time_counts(conn):
+    return dict(conn.execute('SELECT activity_id, days FROM activity_counts').fetchall())
+
+
+def done_on(conn, dates):
+    """{date: set of activity ids} for the given dates"""
+    done = {str(day): set() for day in dates}
+    if done:
+        placeholders = ', '.join('?' * len(done))
+        for day, activity_id in conn.execute(
+                f'SELECT date, activity_id FROM activity_log WHERE date IN ({placeholders})', list(done)):
+            done[day].add(activity_id)
+    return done
+
+
+def save_custom(conn, day, checked, definitions):
+    """Replace one day's activities that have no personal_log column; the caller commits"""
+    custom = [activity for activity in definitions if not activity['column_name']]
+    if not custom:
+        return
+    conn.execute(f'''
+        DELETE FROM activity_log WHERE date = ? AND activity_id IN ({', '.join('?' * len(custom))})
+    ''', (day, *[activity['id'] for activity in custom]))
+    conn.executemany('INSERT INTO activity_log (date, activity_id) VALUES (?, ?)',
+                     [(day, activity['id']) for activity in custom if activity['name'] in checked])
+
+
+def add(conn, name, label, emoji='✅', color='secondary'):
+    """Define a new activity; raises ValueError for a bad or taken name"""
+    if not NAME_PATTERN.fullmatch(name):
+        raise ValueError(f'{name!r} is not a valid activity name (lowercase letters, digits and _)')
+    if name in RESERVED_NAMES:
+        raise ValueError(f'{name!r} is reserved for another column')
+    if conn.execute('SELECT IFNULL(MAX(id), 0) FROM activities').fetchone()[0] >= MAX_ACTIVITIES:
+        raise ValueError(f'at most {MAX_ACTIVITIES} activities can be defined')
+    position = conn.execute('SELECT IFNULL(MAX(position), 0) + 1 FROM activities').fetchone()[0]
+    try:
+        conn.execute('INSERT INTO activities (name, label, emoji, color, position) VALUES (?, ?, ?, ?, ?)',
+                     (name, label, emoji, color, position))
+    except sqlite3.IntegrityError:
+        raise ValueError(f'activity {name!r} already exists')
+    # Cached dashboard pages list the activities
+    cache.bump_generation(conn)
+    conn.commit()
+
+
+def set_active(conn, name, active):
+    """Show or hide an activity; returns False if there is no such activity"""
+    updated = conn.execute('UPDATE activities SET active = ? WHERE name = ?', (int(active), name)).rowcount
+    cache.bump_generation(conn)
+    conn.commit()
+    return bool(updated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='finance_tracker.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Show activities and all-time counts')
+    add_parser = sub.add_parser('add', help='Add an activity')
+    add_parser.add_argument('name', help='Identifier, e.g. meditation')
+    add_parser.add_argument('label', help='Display name, e.g. "Meditation"')
+    add_parser.add_argument('--emoji', default='✅')
+    add_parser.add_argument('--color', default='secondary', help='Bootstrap colour (primary, info, ...)')
+    for command, help_text in (('hide', 'Stop offering an activity (its history is kept)'),
+                               ('show', 'Offer a hidden activity again')):
+        sub.add_parser(command, help=help_text).add_argument('name')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    if args.command == 'list':
+        counts = all_time_counts(conn)
+        for row in conn.execute('SELECT * FROM activities ORDER BY position, id'):
+            state = '' if row['active'] else ' (hidden)'
+            print(f"   {row['emoji']} {row['name']:<16} {row['label']:<16} {counts.get(row['id'], 0):>6} days{state}")
+    elif args.command == 'add':
+        try:
+            add(conn, args.name, args.label, args.emoji, args.color)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"✅ Added {args.emoji} {args.label}")
+    else:
+        if not set_active(conn, args.name, args.command == 'show'):
+            parser.error(f'no activity named {args.name!r}')
+        print(f"✅ {args.name} {'shown' if args.command == 'show' else 'hidden'}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Bit-packed activity flags for Finance Tracker
+- personal_log.activity_mask is a virtual generated column: bit i is set when
+  rollups.ACTIVITIES[i] was done that day, so one integer carries every flag
+- Every activity's bit is its id - 1, so the built-ins (ids 1..7) keep their
+  activity_mask bits; DAY_MASK_SQL ORs in the activities added later, which
+  live only in activity_log, and bits_for() maps activities.load() to bits
+- ActivityBits keeps one bitset per activity over a run of days (bit d is
+  day d, stored as a Python int), so day counts, streaks and co-occurrence
+  are popcounts, shifts and ANDs instead of per-day loops
+"""
+
+import numpy as np
+
+import rollups
+
+BITS = {name: 1 << i for i, name in enumerate(rollups.ACTIVITIES)}
+
+MASK_SQL = ' | '.join(f'((IFNULL({name}, 0) != 0) << {i})' for i, name in enumerate(rollups.ACTIVITIES))
+
+# The whole mask for a personal_log row; each (date, activity_id) is unique, so SUM is an OR
+DAY_MASK_SQL = f'''(activity_mask | IFNULL((SELECT SUM(1 << (activity_log.activity_id - 1)) FROM activity_log
+    WHERE activity_log.date = personal_log.date AND activity_log.activity_id > {len(rollups.ACTIVITIES)}), 0))'''
+
+
+def add_activity_mask(conn):
+    """Add the generated activity_mask column (migration step)"""
+    # Generated columns only show up in table_xinfo
+    columns = {row[1] for row in conn.execute('PRAGMA table_xinfo(personal_log)')}
+    if 'activity_mask' not in columns:
+        conn.execute(f'ALTER TABLE personal_log ADD COLUMN activity_mask INTEGER GENERATED ALWAYS AS ({MASK_SQL}) VIRTUAL')
+
+
+def bits_for(definitions):
+    """{name: bit} for activity rows from activities.load()"""
+    return {activity['name']: 1 << (activity['id'] - 1) for activity in definitions}
+
+
+def encode(flags):
+    """Mask for a dict of activity -> truthy"""
+    return sum(bit for name, bit in BITS.items() if flags.get(name))
+
+
+def decode(mask):
+    return {name: int(bool(mask & bit)) for name, bit in BITS.items()}
+
+
+def _pack(flags):
+    """Python int with bit d set where flags[d] is true"""
+    return int.from_bytes(np.packbits(np.asarray(flags, np.uint8), bitorder='little').tobytes(), 'little')
+
+
+class ActivityBits:
+    """Per-activity bitsets over consecutive days.
+
+    masks holds one activity mask per day (0 for days without an entry);
+    logged marks the days that have an entry at all; bits maps each
+    activity to its mask bit (the built-ins by default, or bits_for()).
+    """
+
+    def __init__(self, masks, logged=None, bits=BITS):
+        masks = np.asarray(masks, np.int64)
+        self.days = len(masks)
+        self.bits = {name: _pack(masks & bit) for name, bit in bits.items()}
+        self.logged = _pack(masks != 0 if logged is None else logged)
+
+    def _window(self, value, low, high):
+        return (value >> low) & ((1 << (high - low + 1)) - 1)
+
+    def count(self, name, low=0, high=None):
+        """Days in low..high (inclusive day indexes) with the activity"""
+        high = self.days - 1 if high is None else high
+        return self._window(self.bits[name], low, high).bit_count()
+
+    def current_streak(self, name, end=None):
+        """Run of days ending at `end`, or the day before when `end` isn't done yet"""
+        end = self.days - 1 if end is None else end
+        if end < 0:
+            return 0
+        bits = self.bits[name]
+        if not (bits >> end) & 1:
+            end -= 1
+        if end < 0:
+            return 0
+        # The highest missing day at or below `end` bounds the run
+        missing = ~bits & ((1 << (end + 1)) - 1)
+        return end - (missing.bit_length() - 1)
+
+    def longest_streak(self, name, low=0, high=None):
+        """(length, first day index) of the longest run in low..high; (0, None) if none"""
+        high = self.days - 1 if high is None else high
+        bits = self._window(self.bits[name], low, high)
+        # After k rounds of bits &= bits >> 1, bit d is set only where days
+        # d..d+k are all done; the round before bits empties is the longest run
+        length = 0
+        while bits:
+            previous, bits = bits, bits & (bits >> 1)
+            length += 1
+        if not length:
+            return 0, None
+        return length, low + (previous & -previous).bit_length() - 1
+
+    def co_occurrence(self, low=0, high=None):
+        """Days each pair of activities was done together (the diagonal is each activity's own count)"""
+        high = self.days - 1 if high is None else high
+        windows = {name: self._window(bits, low, high) for name, bits in self.bits.items()}
+        return {a: {b: (windows[a] & windows[b]).bit_count() for b in windows} for a in windows}
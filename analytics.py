@@ -0,0 +1,181 @@
+"""
+Analytics series for Finance Tracker
+- Aggregates spending and activities over any date range at day, week,
+  month or budget-period resolution
+- Gap filling and bucketing happen in SQL: a recursive CTE walks every day in
+  the range and left-joins the daily rollups and personal_log
+- Activity fields are the active activities from activities.load(); those
+  without a personal_log column are counted from activity_log
+- Pages are keyed by bucket (?after=<last bucket>), so each page only touches
+  the days it returns
+- Responses are streamed as JSON one bucket at a time
+"""
+
+import json
+from datetime import date, timedelta
+
+RESOLUTIONS = ('day', 'week', 'month', 'period')
+
+# Bucket key for a day; every bucket's key is its first calendar day
+BUCKETS = {
+    'day': 'days.day',
+    'week': "date(days.day, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', days.day)",
+    'period': '''(SELECT start_date FROM budget_periods
+                  WHERE start_date <= days.day AND end_date >= days.day
+                  ORDER BY start_date DESC LIMIT 1)''',
+}
+
+# Upper bound on days per bucket, used to stop the day walk after one page
+# (budget periods are looked up in budget_periods instead)
+BUCKET_DAYS = {'day': 1, 'week': 7, 'month': 31}
+
+SPENDING_FIELDS = {
+    'spending': 'ROUND(SUM(IFNULL(s.total, 0)), 2)',
+    'entries': 'SUM(IFNULL(s.entries, 0))',
+}
+DEFAULT_DAYS = 30
+DEFAULT_LIMIT = 366
+MAX_LIMIT = 5000
+FETCH_SIZE = 500
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+def activity_fields(definitions):
+    """{field: expression} for activity rows from activities.load()"""
+    fields = {}
+    for activity in definitions:
+        if activity['column_name']:
+            fields[activity['name']] = f"SUM(IFNULL(p.{activity['column_name']}, 0))"
+        else:
+            fields[activity['name']] = ('SUM(EXISTS (SELECT 1 FROM activity_log a '
+                                        f"WHERE a.date = b.day AND a.activity_id = {int(activity['id'])}))")
+    fields['days_logged'] = 'COUNT(p.date)'
+    return fields
+
+
+def parse_args(args, definitions, today=None):
+    """Validate query-string arguments; raises ValueError with a message for the client.
+
+    definitions are the activities offered as fields, from activities.load().
+    """
+    today = today or date.today()
+    end = _parse_date(args['end'], 'end') if args.get('end') else today
+    start = _parse_date(args['start'], 'start') if args.get('start') else end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValueError("start must not be after end")
+
+    resolution = args.get('resolution', 'day')
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+
+    available = {**SPENDING_FIELDS, **activity_fields(definitions)}
+    default = ['spending'] + [activity['name'] for activity in definitions]
+    fields = [field for field in args.get('fields', '').split(',') if field] or default
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}; choose from {', '.join(available)}")
+
+    after = _parse_date(args['after'], 'after') if args.get('after') else None
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    return {
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'fields': fields,
+        'columns': {field: available[field] for field in fields},
+        'after': after,
+        'limit': limit,
+    }
+
+
+def series_sql(resolution, columns):
+    """Build the aggregation query for a resolution and {field: expression} selection"""
+    joins = []
+    if any(field in SPENDING_FIELDS for field in columns):
+        joins.append('LEFT JOIN spending_daily_totals s ON s.date = b.day')
+    if any('p.' in expression for expression in columns.values()):
+        joins.append('LEFT JOIN personal_log p ON p.date = b.day')
+    columns = ''.join(f',\n               {expression} AS "{field}"' for field, expression in columns.items())
+
+    return f'''
+        WITH RECURSIVE days(day) AS (
+            SELECT date(:first_day)
+            UNION ALL
+            SELECT date(day, '+1 day') FROM days WHERE day < :last_day
+        ),
+        buckets AS (
+            SELECT {BUCKETS[resolution]} AS bucket, days.day FROM days
+        )
+        SELECT b.bucket, MIN(b.day) AS start, MAX(b.day) AS "end"{columns}
+        FROM buckets b
+        {' '.join(joins)}
+        WHERE b.bucket IS NOT NULL AND b.bucket > :after
+        GROUP BY b.bucket
+        ORDER BY b.bucket
+        LIMIT :limit
+    '''
+
+
+def series(conn, query):
+    """Cursor over one page of buckets, plus one extra row to detect a next page"""
+    # Every day of a bucket falls on or after its key, so the walk can start at the cursor
+    first_day = max(query['start'], query['after']) if query['after'] else query['start']
+    last_day = query['end']
+    span = BUCKET_DAYS.get(query['resolution'])
+    if span:
+        last_day = min(last_day, first_day + timedelta(days=span * (query['limit'] + 1)))
+    elif query['resolution'] == 'period':
+        # Periods vary in length: stop at the end of the limit + 1-th one after first_day
+        row = conn.execute('SELECT end_date FROM budget_periods WHERE start_date > ? '
+                           'ORDER BY start_date LIMIT 1 OFFSET ?',
+                           (first_day.isoformat(), query['limit'])).fetchone()
+        if row:
+            last_day = min(last_day, date.fromisoformat(row[0]))
+
+    return conn.execute(series_sql(query['resolution'], query['columns']), {
+        'first_day': first_day.isoformat(),
+        'last_day': last_day.isoformat(),
+        'after': query['after'].isoformat() if query['after'] else '',
+        'limit': query['limit'] + 1,
+    })
+
+
+def stream_series(conn, query):
+    """Yield the JSON document for one page, a bucket at a time"""
+    header = {
+        'start': query['start'].isoformat(),
+        'end': query['end'].isoformat(),
+        'resolution': query['resolution'],
+        'fields': query['fields'],
+    }
+    yield json.dumps(header)[:-1] + ', "data": ['
+
+    cursor = series(conn, query)
+    sent = 0
+    last_bucket = None
+    while sent < query['limit']:
+        rows = cursor.fetchmany(min(FETCH_SIZE, query['limit'] - sent))
+        if not rows:
+            break
+        for row in rows:
+            yield (', ' if sent else '') + json.dumps(dict(row))
+            sent += 1
+            last_bucket = row['bucket']
+    more = sent == query['limit'] and cursor.fetchone() is not None
+    cursor.close()
+
+    yield '], "next": ' + json.dumps(last_bucket if more else None) + '}'
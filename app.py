@@ -1,214 +1,171 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Blueprint, Flask, Response, render_template, request, redirect, url_for, jsonify, flash, session, stream_with_context
 from datetime import datetime, timedelta
-import sqlite3
+import logging
+import math
 import os
-from functools import wraps
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # Change this to a secure random key
+import activities
+import activity_bits
+import analytics
+import assets
+import cache
+import csrf
+import db
+import entries
+import export
+import maintenance
+import metrics
+import migrations
+import periods
+import search
+import tenancy
+import trends
+import writebehind
+
+bp = Blueprint('main', __name__)
+
+log = logging.getLogger('finance')
+
+# Anyone can sign a session cookie with this key, so multi-tenant mode refuses it
+DEFAULT_SECRET_KEY = 'your-secret-key-here'
+
+def create_app(config=None):
+    """Application factory"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('FINANCE_SECRET_KEY', DEFAULT_SECRET_KEY)  # Change this to a secure random key
+    app.config['DATABASE'] = os.environ.get('FINANCE_DB', db.DEFAULT_DATABASE)
+    app.config['CACHE_PATH'] = os.environ.get('FINANCE_CACHE_PATH')  # shared cache file for multiple workers
+    app.config['TENANT_DIR'] = os.environ.get('FINANCE_TENANT_DIR')
+    if config:
+        app.config.update(config)
+    if app.config['TENANT_DIR'] and app.secret_key in (None, '', DEFAULT_SECRET_KEY):
+        # Logins live in the signed session cookie; a known key lets anyone forge one
+        raise RuntimeError('Multi-tenant mode needs a secret key: set FINANCE_SECRET_KEY (or SECRET_KEY) '
+                           'to a long random value')
+    csrf.init_app(app)
+    db.init_app(app)
+    cache.init_app(app)
+    metrics.init_app(app)
+    assets.init_app(app)
+    maintenance.init_app(app)
+    tenancy.init_app(app)
+    writebehind.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+def reset_after_fork(app):
+    """Drop handles inherited from a parent process; they are reopened lazily.
+
+    SQLite connections must not be shared across fork(), so each worker
+    process builds its own pool and cache backend on first use.
+    """
+    app.extensions.pop('db_pool', None)
+    app.extensions.pop('cache', None)
+    app.extensions.pop('trends', None)
+    app.extensions.pop('maintenance', None)
+    app.extensions.pop('tenant_directory', None)
+    app.extensions.pop('shards', None)
+    app.extensions.pop('write_queue', None)
+    metrics.reset()
 
 # Database setup
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect('finance_tracker.db')
-    cursor = conn.cursor()
-    
-    # Personal activities table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS personal_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE UNIQUE NOT NULL,
-            gym BOOLEAN DEFAULT 0,
-            jiu_jitsu BOOLEAN DEFAULT 0,
-            skateboarding BOOLEAN DEFAULT 0,
-            work BOOLEAN DEFAULT 0,
-            coitus BOOLEAN DEFAULT 0,
-            sauna BOOLEAN DEFAULT 0,
-            supplements BOOLEAN DEFAULT 0,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Spending entries table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS spending_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            item TEXT NOT NULL,
-            price DECIMAL(10,2) NOT NULL,
-            category TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Budget periods table for tracking biweekly budgets
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS budget_periods (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start_date DATE NOT NULL,
-            end_date DATE NOT NULL,
-            budget_amount DECIMAL(10,2) DEFAULT 500.00,
-            is_current BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+def init_db(flask_app):
+    """Initialize the app's database, applying any pending schema migrations.
+
+    In multi-tenant mode this creates tenants.db; shards are migrated when
+    they are first opened.
+    """
+    if tenancy.enabled(flask_app):
+        tenancy.init_directory(flask_app)
+        return []
+    conn = db.connect(flask_app.config['DATABASE'])
+    try:
+        applied = migrations.migrate(conn)
+        migrations.check(conn)
+    finally:
+        conn.close()
+    return applied
 
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect('finance_tracker.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get the pooled database connection for the current request"""
+    return db.get_db()
 
-def get_current_budget_period():
-    """Get or create the current budget period"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Try to find current period
-    today = datetime.now().date()
-    cursor.execute('''
-        SELECT * FROM budget_periods 
-        WHERE start_date <= ? AND end_date >= ?
-        ORDER BY start_date DESC LIMIT 1
-    ''', (today, today))
-    
-    period = cursor.fetchone()
-    
-    if not period:
-        # Create new budget period (14 days from today)
-        start_date = today
-        end_date = today + timedelta(days=13)  # 14-day period
-        
-        cursor.execute('''
-            INSERT INTO budget_periods (start_date, end_date, budget_amount, is_current)
-            VALUES (?, ?, 500.00, 1)
-        ''', (start_date, end_date))
-        
-        period_id = cursor.lastrowid
-        conn.commit()
-        
-        # Get the newly created period
-        cursor.execute('SELECT * FROM budget_periods WHERE id = ?', (period_id,))
-        period = cursor.fetchone()
-    
-    conn.close()
-    return period
-
-@app.route('/')
+def wants_fragment():
+    """True when the client asked for JSON (static/js/fragments.js) rather than a page"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def get_current_budget_period(today=None):
+    """Get the current budget period along with its period and today spend totals"""
+    return periods.period_summary(get_db_connection(), db.current_database(), today)
+
+@bp.route('/')
 def dashboard():
     """Dashboard with analytics"""
     conn = get_db_connection()
+    today = datetime.now().date()
     
-    # Get current budget period
-    budget_period = get_current_budget_period()
+    # Flashed messages are rendered into the page, so only revalidate without them
+    return cache.cached_response(
+        conn, 'dashboard', [today],
+        lambda: dashboard_context(conn, today),
+        lambda context: render_template('dashboard.html', **context),
+        revalidate='_flashes' not in session,
+    )
+
+def dashboard_context(conn, today):
+    """Compute the dashboard's template context"""
+    # Get current budget period and its spending
+    budget_period = get_current_budget_period(today)
+    total_spent = float(budget_period['period_total'])
     
     # Calculate days left in current period
-    today = datetime.now().date()
     end_date = datetime.strptime(budget_period['end_date'], '%Y-%m-%d').date()
     days_left = (end_date - today).days + 1
     
-    # Get spending for current period
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT SUM(price) as total_spent 
-        FROM spending_log 
-        WHERE date BETWEEN ? AND ?
-    ''', (budget_period['start_date'], budget_period['end_date']))
-    
-    result = cursor.fetchone()
-    total_spent = float(result['total_spent']) if result['total_spent'] else 0.0
     
     # Calculate remaining budget
     budget_amount = float(budget_period['budget_amount'])
     remaining_budget = budget_amount - total_spent
     daily_spend_limit = remaining_budget / max(days_left, 1)
     
-    # Get recent activities (last 30 days)
+    # Activity stats: last 30 days plus all-time frequency, per dashboard activity
     thirty_days_ago = today - timedelta(days=30)
-    cursor.execute('''
-        SELECT 
-            SUM(gym) as gym_count,
-            SUM(jiu_jitsu) as jiu_jitsu_count,
-            SUM(skateboarding) as skateboarding_count,
-            SUM(work) as work_count,
-            SUM(coitus) as coitus_count,
-            SUM(sauna) as sauna_count,
-            SUM(supplements) as supplements_count,
-            COUNT(*) as total_days
-        FROM personal_log 
-        WHERE date >= ?
-    ''', (thirty_days_ago,))
-    
-    activity_stats = cursor.fetchone()
-    
-    # Get ALL-TIME activity percentages
-    cursor.execute('''
-        SELECT 
-            SUM(gym) as total_gym,
-            SUM(jiu_jitsu) as total_jiu_jitsu,
-            SUM(skateboarding) as total_skateboarding,
-            SUM(work) as total_work,
-            SUM(coitus) as total_coitus,
-            SUM(sauna) as total_sauna,
-            SUM(supplements) as total_supplements,
-            COUNT(*) as total_all_days
-        FROM personal_log
-    ''')
+    cursor = conn.cursor()
+    recent_counts = activities.counts_between(conn, thirty_days_ago, today)
+    all_time_counts = activities.all_time_counts(conn)
     
-    all_time_stats = cursor.fetchone()
+    # Days with a personal entry (maintained incrementally by triggers)
+    cursor.execute('SELECT days FROM activity_totals WHERE id = 1')
+    tracked_days = cursor.fetchone()['days'] or 1  # avoid division by zero
     
-    # Calculate percentages (avoid division by zero)
-    total_days = all_time_stats['total_all_days'] if all_time_stats['total_all_days'] else 1
-    
-    activity_percentages = {
-        'gym_percentage': round((all_time_stats['total_gym'] / total_days) * 100, 1) if all_time_stats['total_gym'] else 0,
-        'jiu_jitsu_percentage': round((all_time_stats['total_jiu_jitsu'] / total_days) * 100, 1) if all_time_stats['total_jiu_jitsu'] else 0,
-        'skateboarding_percentage': round((all_time_stats['total_skateboarding'] / total_days) * 100, 1) if all_time_stats['total_skateboarding'] else 0,
-        'work_percentage': round((all_time_stats['total_work'] / total_days) * 100, 1) if all_time_stats['total_work'] else 0,
-        'coitus_percentage': round((all_time_stats['total_coitus'] / total_days) * 100, 1) if all_time_stats['total_coitus'] else 0,
-        'sauna_percentage': round((all_time_stats['total_sauna'] / total_days) * 100, 1) if all_time_stats['total_sauna'] else 0,
-        'supplements_percentage': round((all_time_stats['total_supplements'] / total_days) * 100, 1) if all_time_stats['total_supplements'] else 0,
-        'total_tracked_days': total_days
-    }
+    activity_stats = [
+        dict(activity,
+             count=recent_counts.get(activity['id'], 0),
+             percentage=round(all_time_counts.get(activity['id'], 0) / tracked_days * 100, 1))
+        for activity in activities.load(conn, dashboard_only=True)
+    ]
     
     # Get recent spending by category
     cursor.execute('''
-        SELECT 
-            CASE 
-                WHEN LOWER(item) LIKE '%tim%' OR LOWER(item) LIKE '%coffee%' THEN 'Coffee'
-                WHEN LOWER(item) LIKE '%gas%' OR LOWER(item) LIKE '%fuel%' THEN 'Gas'
-                WHEN LOWER(item) LIKE '%food%' OR LOWER(item) LIKE '%restaurant%' OR LOWER(item) LIKE '%mcdonald%' OR LOWER(item) LIKE '%domino%' THEN 'Food'
-                WHEN LOWER(item) LIKE '%weed%' OR LOWER(item) LIKE '%cannabis%' THEN 'Cannabis'
-                ELSE 'Other'
-            END as category,
-            SUM(price) as total
-        FROM spending_log 
+        SELECT category, SUM(total) as total
+        FROM spending_category_totals 
         WHERE date >= ?
         GROUP BY category
         ORDER BY total DESC
     ''', (thirty_days_ago,))
     
-    spending_by_category = cursor.fetchall()
-    
-    conn.close()
+    spending_by_category = [dict(row) for row in cursor.fetchall()]
     
-    return render_template('dashboard.html', 
-                         budget_period=budget_period,
-                         total_spent=total_spent,
-                         remaining_budget=remaining_budget,
-                         days_left=days_left,
-                         daily_spend_limit=daily_spend_limit,
-                         activity_stats=activity_stats,
-                         activity_percentages=activity_percentages,
-                         spending_by_category=spending_by_category)
-
-@app.route('/personal')
+    return dict(budget_period=budget_period,
+                total_spent=total_spent,
+                remaining_budget=remaining_budget,
+                days_left=days_left,
+                daily_spend_limit=daily_spend_limit,
+                activity_stats=activity_stats,
+                tracked_days=tracked_days,
+                spending_by_category=spending_by_category)
+
+@bp.route('/personal')
 def personal():
     """Personal activities page"""
     today = datetime.now().date()
@@ -227,64 +184,59 @@ def personal():
     ''')
     recent_entries = cursor.fetchall()
     
-    conn.close()
+    # Activities done on each of those days, by activity id
+    done = activities.done_on(conn, [today] + [entry['date'] for entry in recent_entries])
     
     return render_template('personal.html', 
                          today_data=today_data, 
                          recent_entries=recent_entries,
+                         activities=activities.load(conn),
+                         done=done,
                          today=today)
 
-@app.route('/personal/save', methods=['POST'])
+@bp.route('/personal/save', methods=['POST'])
 def save_personal():
     """Save personal activities data"""
     date_str = request.form.get('date')
     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
     
-    # Get form data (checkboxes return 'on' if checked, None if not)
-    gym = 1 if request.form.get('gym') == 'on' else 0
-    jiu_jitsu = 1 if request.form.get('jiu_jitsu') == 'on' else 0
-    skateboarding = 1 if request.form.get('skateboarding') == 'on' else 0
-    work = 1 if request.form.get('work') == 'on' else 0
-    coitus = 1 if request.form.get('coitus') == 'on' else 0
-    sauna = 1 if request.form.get('sauna') == 'on' else 0
-    supplements = 1 if request.form.get('supplements') == 'on' else 0
     notes = request.form.get('notes', '')
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Insert or update
-    cursor.execute('''
-        INSERT OR REPLACE INTO personal_log 
-        (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (date_obj, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes))
-    
-    conn.commit()
-    conn.close()
+    # Checkboxes return 'on' if checked and are missing if not
+    checked = {name for name, value in request.form.items() if value == 'on'}
+    writebehind.write(entries.save_personal, date_obj, checked, notes)
     
-    flash('Personal data saved successfully!', 'success')
-    return redirect(url_for('personal'))
+    message = 'Personal data saved successfully!'
+    if wants_fragment():
+        return personal_fragment(message, date_obj)
+    flash(message, 'success')
+    return redirect(url_for('main.personal'))
 
-@app.route('/spending')
+def personal_fragment(message, day):
+    """The saved day's entry for the recent list, as rendered HTML in JSON"""
+    conn = get_db_connection()
+    entry = conn.execute('SELECT * FROM personal_log WHERE date = ?', (day,)).fetchone()
+    return jsonify({
+        'message': message,
+        'date': day.isoformat(),
+        'entry_html': render_template('_personal_entry.html', entry=entry,
+                                      activities=activities.load(conn),
+                                      done=activities.done_on(conn, [day])),
+    })
+
+@bp.route('/spending')
 def spending():
     """Spending tracking page"""
     today = datetime.now().date()
     
-    # Get current budget period
-    budget_period = get_current_budget_period()
+    # Get current budget period with today's and the period's totals
+    budget_period = get_current_budget_period(today)
+    today_total = budget_period['today_total']
+    period_total = budget_period['period_total']
     
-    # Get today's spending
+    # Get spending for current period; today's entries are a subset of it
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM spending_log 
-        WHERE date = ? 
-        ORDER BY created_at DESC
-    ''', (today,))
-    today_spending = cursor.fetchall()
-    
-    # Get spending for current period
     cursor.execute('''
         SELECT * FROM spending_log 
         WHERE date BETWEEN ? AND ?
@@ -292,23 +244,7 @@ def spending():
     ''', (budget_period['start_date'], budget_period['end_date']))
     
     period_spending = cursor.fetchall()
-    
-    # Calculate totals
-    cursor.execute('''
-        SELECT SUM(price) as total 
-        FROM spending_log 
-        WHERE date = ?
-    ''', (today,))
-    today_total = cursor.fetchone()['total'] or 0
-    
-    cursor.execute('''
-        SELECT SUM(price) as total 
-        FROM spending_log 
-        WHERE date BETWEEN ? AND ?
-    ''', (budget_period['start_date'], budget_period['end_date']))
-    period_total = cursor.fetchone()['total'] or 0
-    
-    conn.close()
+    today_spending = [entry for entry in period_spending if entry['date'] == today.isoformat()]
     
     return render_template('spending.html', 
                          budget_period=budget_period,
@@ -318,102 +254,231 @@ def spending():
                          period_total=period_total,
                          today=today)
 
-@app.route('/spending/add', methods=['POST'])
+@bp.route('/spending/add', methods=['POST'])
 def add_spending():
     """Add spending entry"""
     date_str = request.form.get('date')
     item = request.form.get('item')
     price = float(request.form.get('price'))
     
-    if not item or price <= 0:
+    if not item or not math.isfinite(price) or price <= 0:
+        if wants_fragment():
+            return jsonify({'error': 'Please provide valid item and price'}), 400
         flash('Please provide valid item and price', 'error')
-        return redirect(url_for('spending'))
+        return redirect(url_for('main.spending'))
     
     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO spending_log (date, item, price)
-        VALUES (?, ?, ?)
-    ''', (date_obj, item, price))
+    entry_id = writebehind.write(entries.add_spending, date_obj, item, price)
     
-    conn.commit()
-    conn.close()
-    
-    flash(f'Added {item} for ${price:.2f}', 'success')
-    return redirect(url_for('spending'))
+    message = f'Added {item} for ${price:.2f}'
+    if wants_fragment():
+        return spending_fragment(message, added=entry_id)
+    flash(message, 'success')
+    return redirect(url_for('main.spending'))
 
-@app.route('/spending/delete/<int:entry_id>', methods=['POST'])
+@bp.route('/spending/delete/<int:entry_id>', methods=['POST'])
 def delete_spending(entry_id):
     """Delete spending entry"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM spending_log WHERE id = ?', (entry_id,))
-    conn.commit()
-    conn.close()
+    writebehind.write(entries.delete_spending, entry_id)
     
+    if wants_fragment():
+        return spending_fragment('Spending entry deleted', deleted=entry_id)
     flash('Spending entry deleted', 'success')
-    return redirect(url_for('spending'))
+    return redirect(url_for('main.spending'))
+
+def spending_fragment(message, added=None, deleted=None):
+    """What changed on the spending page, as rendered HTML in JSON.
+
+    The totals come from the period summary, which reads the per-day rollups
+    the write just updated, so this costs a handful of row lookups rather
+    than the period's entries.
+    """
+    today = datetime.now().date()
+    budget_period = get_current_budget_period(today)
+    body = {
+        'message': message,
+        'summary_html': render_template('_spending_summary.html', budget_period=budget_period,
+                                        today_total=budget_period['today_total'],
+                                        period_total=budget_period['period_total']),
+    }
+    if added is not None:
+        entry = get_db_connection().execute('SELECT * FROM spending_log WHERE id = ?', (added,)).fetchone()
+        # Entries dated outside the current period aren't on the page
+        if entry is not None and budget_period['start_date'] <= entry['date'] <= budget_period['end_date']:
+            body['date'] = entry['date']
+            body['day_html'] = render_template('_spending_day.html', day=entry['date'], day_entries=[entry])
+    if deleted is not None:
+        body['deleted'] = deleted
+    return jsonify(body)
+
+@bp.route('/search')
+def search_page():
+    """Search spending items or personal notes"""
+    try:
+        query = search.parse_args(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        query = search.parse_args({'q': request.args.get('q', '')})
+    
+    page = search.search(get_db_connection(), query)
+    return render_template('search.html', page=page, limit=query['limit'])
+
+@bp.route('/api/search')
+def api_search():
+    """One page of search results as JSON; follow 'next' with ?after= for the next page"""
+    try:
+        query = search.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(search.search(get_db_connection(), query))
 
-@app.route('/api/analytics')
+@bp.route('/api/spending/batch', methods=['POST'])
+def api_spending_batch():
+    """Add many spending entries in one transaction"""
+    return batch_response('spending', entries.validate_spending, entries.write_spending)
+
+@bp.route('/api/personal/batch', methods=['POST'])
+def api_personal_batch():
+    """Save many days of personal activities in one transaction"""
+    definitions = activities.load(get_db_connection())
+    return batch_response('personal', lambda batch: entries.validate_personal(batch, definitions),
+                          entries.write_personal)
+
+def batch_response(endpoint, validate, write):
+    """Run a JSON batch request, honouring an Idempotency-Key header"""
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'error': 'expected a JSON body'}), 400
+    
+    try:
+        status, body, replayed = entries.run_batch(
+            get_db_connection(), endpoint, request.headers.get('Idempotency-Key'),
+            payload, validate, write,
+        )
+    except entries.BatchError as e:
+        return jsonify(e.body), e.status
+    
+    response = jsonify(body)
+    response.status_code = status
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+@bp.route('/api/export/<table>.<fmt>')
+def api_export(table, fmt):
+    """Stream a whole table, or a date range of it, as CSV, NDJSON or Parquet"""
+    try:
+        start, end = export.parse_range(request.args.get('start'), request.args.get('end'))
+        chunks = export.export(get_db_connection(), table, fmt, start, end)
+    except export.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(chunks), mimetype=export.FORMATS[fmt][0], headers={
+        'Content-Disposition': f'attachment; filename="{export.filename(table, fmt, start, end)}"',
+    })
+
+@bp.route('/api/analytics')
 def api_analytics():
     """API endpoint for analytics data - FIXED to show actual last 30 days"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     # Calculate the actual last 30 days from today
     today = datetime.now().date()
     thirty_days_ago = today - timedelta(days=29)  # Include today, so 30 days total
     
-    print(f"Analytics: Getting data from {thirty_days_ago} to {today}")
+    return cache.cached_response(
+        conn, 'analytics', [thirty_days_ago, today],
+        lambda: analytics_payload(conn, thirty_days_ago, today),
+        jsonify,
+    )
+
+def analytics_payload(conn, thirty_days_ago, today):
+    """Daily spending and activities between two dates"""
+    cursor = conn.cursor()
     
-    # Daily spending over last 30 days - FIXED with proper date filtering
-    cursor.execute('''
-        SELECT date, SUM(price) as total
-        FROM spending_log 
-        WHERE date >= ? AND date <= ?
-        GROUP BY date
-        ORDER BY date
-    ''', (thirty_days_ago, today))
-    daily_spending = [dict(row) for row in cursor.fetchall()]
-    
-    # Fill in missing days with 0 spending
-    complete_spending = []
-    current_date = thirty_days_ago
-    spending_dict = {row['date']: row['total'] for row in daily_spending}
-    
-    while current_date <= today:
-        date_str = current_date.strftime('%Y-%m-%d')
-        complete_spending.append({
-            'date': date_str,
-            'total': spending_dict.get(date_str, 0)
-        })
-        current_date += timedelta(days=1)
-    
-    # Activity frequency over last 30 days - FIXED with proper date filtering
-    cursor.execute('''
-        SELECT date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements
+    log.info('analytics_window start=%s end=%s', thirty_days_ago, today)
+    
+    # Daily spending over last 30 days, gap-filled in SQL
+    query = {
+        'start': thirty_days_ago,
+        'end': today,
+        'resolution': 'day',
+        'fields': ['spending'],
+        'columns': {'spending': analytics.SPENDING_FIELDS['spending']},
+        'after': None,
+        'limit': (today - thirty_days_ago).days + 1,
+    }
+    complete_spending = [{'date': row['bucket'], 'total': row['spending']}
+                         for row in analytics.series(conn, query).fetchall()]
+    
+    # Activities over last 30 days as one bitmask per day (bit i = activities[i],
+    # null where nothing was logged), aligned with daily_spending
+    definitions = activities.load(conn)
+    bits = activity_bits.bits_for(definitions)
+    cursor.execute(f'''
+        SELECT date, {activity_bits.DAY_MASK_SQL}
         FROM personal_log 
         WHERE date >= ? AND date <= ?
-        ORDER BY date
     ''', (thirty_days_ago, today))
-    daily_activities = [dict(row) for row in cursor.fetchall()]
+    # Renumber from id bits to positions in the active list
+    masks = {day: sum(1 << i for i, bit in enumerate(bits.values()) if mask & bit)
+             for day, mask in cursor.fetchall()}
+    activity_masks = [masks.get(day['date']) for day in complete_spending]
     
-    conn.close()
+    log.info('analytics_payload spending_days=%d activity_days=%d', len(complete_spending), len(masks))
     
-    print(f"Analytics: Found {len(complete_spending)} spending days, {len(daily_activities)} activity days")
-    
-    return jsonify({
+    return {
         'daily_spending': complete_spending,
-        'daily_activities': daily_activities
-    })
+        'activities': list(bits),
+        'labels': {activity['name']: activity['label'] for activity in definitions},
+        'dashboard': [activity['name'] for activity in definitions if activity['dashboard']],
+        'activity_masks': activity_masks
+    }
+
+@bp.route('/api/analytics/series')
+def api_analytics_series():
+    """Spending and activities over any date range, bucketed and paginated"""
+    conn = get_db_connection()
+    try:
+        query = analytics.parse_args(request.args, activities.load(conn))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(analytics.stream_series(conn, query)),
+                    mimetype='application/json')
+
+@bp.route('/api/trends/<report>')
+def api_trends(report):
+    """Long-range trends (rolling, weekdays, streaks, correlations) from the columnar engine"""
+    if report not in trends.REPORTS:
+        return jsonify({'error': f"report must be one of: {', '.join(trends.REPORTS)}"}), 404
+    try:
+        query = trends.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    return cache.cached_response(
+        conn, f'trends-{report}', [query['start'], query['end'], *query['windows']],
+        lambda: trends.get_trends().report(conn, report, query),
+        jsonify,
+    )
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    
+    # Built here rather than at import, so importing the module (wsgi.py,
+    # benchmarks, tests) doesn't create a second app
+    app = create_app()
+    
     # Initialize database
-    init_db()
+    init_db(app)
+
+    # Background maintenance runs in the reloader's child, the process serving requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        maintenance.start(app)
     
-    # Run the app
+    # Run the development server (see gunicorn.conf.py for production)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Static asset pipeline for Finance Tracker
+- Third-party CSS, JS and fonts are vendored into static/vendor/, pinned by
+  version and SRI hash (VENDOR), so pages never load anything from a CDN
+- build strips CSS rules for classes no template uses, names every file
+  after its content hash (bootstrap.min.3f2a9c1e07.css), precompresses text
+  files to .gz and .br and writes static/dist/manifest.json
+- init_app() rewrites url_for('static', filename=...) to the fingerprinted
+  file from the manifest and serves those with Cache-Control: immutable and
+  the best precompressed encoding the client accepts; without a build,
+  static/ is served as it is
+
+Usage: python assets.py build [--prune]   # after changing templates or static files
+       python assets.py check             # vendored files match their pins
+       python assets.py vendor            # (re)download missing or changed vendored files
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+import urllib.request
+
+from flask import current_app, request, send_from_directory
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# (path under static/vendor, upstream URL, SRI hash of the file)
+VENDOR = (
+    ('bootstrap-5.1.3/css/bootstrap.min.css',
+     'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+     'sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3'),
+    ('bootstrap-5.1.3/js/bootstrap.min.js',
+     'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.min.js',
+     'sha384-QJHtvGhmr9XOIpI6YVutG+2QOK9T+ZnN4kzFN1RtK3zEFEIsxhlmWl5/YESvpZ13'),
+    ('popper-2.10.2/popper.min.js',
+     'https://cdn.jsdelivr.net/npm/@popperjs/core@2.10.2/dist/umd/popper.min.js',
+     'sha384-7+zCNj/IqJ95wo16oMtfsKbZ9ccEh31eOz1HGyDuCQ6wgnyJNSYdrPa03rtR1zdB'),
+    ('chart.js-3.7.1/chart.js',
+     'https://cdn.jsdelivr.net/npm/chart.js@3.7.1/dist/chart.js',
+     'sha384-juF5IMH5cYdXtcC75FM1LUvB5CUBcvY6Xc1yeoy6gAhCOaYl63j6imuj+uz8MqN9'),
+    ('fontawesome-free-6.0.0/LICENSE.txt',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/LICENSE.txt',
+     'sha384-dSNruGET10N11s6sDonY6++nJCFk+Q383OKDV3atumRUr7MtItS1Xw8Pg3mSNFwX'),
+    ('fontawesome-free-6.0.0/css/all.min.css',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/css/all.min.css',
+     'sha384-3B6NwesSXE7YJlcLI9RpRqGf2p/EgVH8BgoKTaUrmKNDkHPStTQ3EyoYjCGXaOTS'),
+    ('fontawesome-free-6.0.0/webfonts/fa-brands-400.ttf',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-brands-400.ttf',
+     'sha384-y7y16nC7jZ8a61w+7TUAkRrn2JcLlRfiH8s3d4Bom0Rc24vOFFfHidJJ1u3PSf2+'),
+    ('fontawesome-free-6.0.0/webfonts/fa-brands-400.woff2',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-brands-400.woff2',
+     'sha384-K0oO3lgfzCR21mC2MtrmDvfaePYJ0kObdjG0XBaj9BpbrfNCvP7zfJePDUKYUfNg'),
+    ('fontawesome-free-6.0.0/webfonts/fa-regular-400.ttf',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-regular-400.ttf',
+     'sha384-sOCXV3/bWeJG/yVqjPdYCvrbRww1hfWgsb7TTQdAVu7BbHm2VmhTTPy3N3GGQzr5'),
+    ('fontawesome-free-6.0.0/webfonts/fa-regular-400.woff2',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-regular-400.woff2',
+     'sha384-0oBEwJwxzA2GSAdhmFtu95H/IktlISPyPn1QrPHWkSprdRx/awhNvKXWgsDzYLkF'),
+    ('fontawesome-free-6.0.0/webfonts/fa-solid-900.ttf',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-solid-900.ttf',
+     'sha384-M/hyedEsR1+cg5ImGfJFWBQq038c68dpWtpADWNHYurE2wqI3gRBV6sKiX2Q+6xc'),
+    ('fontawesome-free-6.0.0/webfonts/fa-solid-900.woff2',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-solid-900.woff2',
+     'sha384-S46FmqZ47S5h3fMjlByi6EM1R//zc6OTMQtNCVwEKuk8RoJSUpjViXnIPQuBFZG/'),
+    ('fontawesome-free-6.0.0/webfonts/fa-v4compatibility.ttf',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-v4compatibility.ttf',
+     'sha384-nZitnY/s3LAvyV2jkrGM3TbWWsPikoLZ4rgbprNcn6itbC2iDW7U2aEHEadcZkLU'),
+    ('fontawesome-free-6.0.0/webfonts/fa-v4compatibility.woff2',
+     'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.0.0/webfonts/fa-v4compatibility.woff2',
+     'sha384-pGzeCSsvTxg9ixjxqrpa2CfvXLOfZsbmJhb4ESMzSpVGxbmZT2q7Y8ToQnm1Ge44'),
+)
+
+# Where class names come from; the build keeps CSS rules whose classes all appear here
+CONTENT = ((TEMPLATES_DIR, '.html'), (os.path.join(STATIC_DIR, 'js'), '.js'))
+
+# Classes that never appear literally: Bootstrap colours picked at render time
+# (text-{{ activity.color }}, alert-{{ category }}) and states its JS toggles
+SAFELIST = (
+    re.compile(r'(text|bg|border|btn|btn-outline|alert|badge|link)-'
+               r'(primary|secondary|success|danger|warning|info|light|dark)'),
+    re.compile(r'show|showing|hiding|fade|collapsing|active|disabled|was-validated|is-(in)?valid'),
+)
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ttf', '.json', '.txt', '.map'}
+# Keep a compressed copy only if it saves at least this fraction
+MIN_SAVING = 0.05
+HASH_LENGTH = 10
+MAX_AGE = 365 * 24 * 3600
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+log = logging.getLogger('finance')
+
+
+# ------------------------------
+# Vendoring
+# ------------------------------
+def integrity(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def vendor_path(path):
+    return os.path.join(STATIC_DIR, 'vendor', *path.split('/'))
+
+
+def check_vendor():
+    """Vendored files that are missing or don't match their pinned hash"""
+    bad = []
+    for path, _url, expected in VENDOR:
+        full = vendor_path(path)
+        if not os.path.exists(full):
+            bad.append((path, 'missing'))
+            continue
+        with open(full, 'rb') as f:
+            if integrity(f.read()) != expected:
+                bad.append((path, 'hash mismatch'))
+    return bad
+
+
+def download(path, url, expected):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = response.read()
+    if integrity(data) != expected:
+        raise ValueError(f'{url} does not match the pinned hash for {path}')
+    full = vendor_path(path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, 'wb') as f:
+        f.write(data)
+
+
+# ------------------------------
+# Unused CSS
+# ------------------------------
+COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+# Arguments of :not() name classes an element must *not* have
+NEGATION = re.compile(r':not\([^()]*\)')
+TOKEN = re.compile(r'[\w-]+')
+# At-rules whose blocks hold style rules; other blocks (@font-face, @keyframes) are kept whole
+NESTED_AT_RULES = ('@media', '@supports', '@document', '@layer')
+
+
+def used_classes():
+    """Every word in the templates and app scripts; a superset of the classes in use"""
+    words = set()
+    for directory, extension in CONTENT:
+        if not os.path.isdir(directory):
+            continue
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith(extension):
+                    with open(os.path.join(root, name), encoding='utf-8') as f:
+                        words.update(TOKEN.findall(f.read()))
+    return words
+
+
+def _blocks(css):
+    """Yield (prelude, body) for each top-level statement; body is None for `@charset ...;`"""
+    start = depth = 0
+    i, body_start = 0, None
+    while i < len(css):
+        char = css[i]
+        if char in '"\'':
+            end = css.index(char, i + 1)
+            while css[end - 1] == '\\':
+                end = css.index(char, end + 1)
+            i = end
+        elif char == '{':
+            if depth == 0:
+                body_start = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield css[start:body_start].strip(), css[body_start + 1:i]
+                start = i + 1
+        elif char == ';' and depth == 0:
+            yield css[start:i].strip(), None
+            start = i + 1
+        i += 1
+
+
+def _split_selectors(prelude):
+    """Split a selector list on top-level commas (not the ones inside :is(...))"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(prelude[start:i])
+            start = i + 1
+    parts.append(prelude[start:])
+    return [part.strip() for part in parts]
+
+
+def _is_used(selector, used):
+    for name in CLASS.findall(NEGATION.sub('', selector)):
+        if name not in used and not any(pattern.fullmatch(name) for pattern in SAFELIST):
+            return False
+    return True
+
+
+def purge_css(css, used):
+    """Drop the selectors (and then rules and empty @media blocks) that need an unused class"""
+    # License banners (/*! ... */) stay; other comments and the source map link go
+    css = COMMENT.sub('', css)
+    out = []
+    for prelude, body in _blocks(css):
+        if body is None:
+            out.append(prelude + ';')
+        elif prelude.startswith(NESTED_AT_RULES):
+            inner = purge_css(body, used)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            out.append(f'{prelude}{{{body}}}')
+        else:
+            # Banners are glued to the first rule's prelude
+            banner = ''
+            if prelude.startswith('/*!'):
+                end = prelude.index('*/') + 2
+                banner, prelude = prelude[:end] + '\n', prelude[end:].strip()
+            selectors = [s for s in _split_selectors(prelude) if _is_used(s, used)]
+            if selectors:
+                out.append(f"{banner}{','.join(selectors)}{{{body}}}")
+            elif banner:
+                out.append(banner)
+    return ''.join(out)
+
+
+# ------------------------------
+# Build
+# ------------------------------
+URL = re.compile(r'''url\((['"]?)([^'")]+)\1\)''')
+
+
+def source_files():
+    """Paths (relative to static/, with /) of every file the build publishes"""
+    paths = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = sorted(d for d in dirs if not (root == STATIC_DIR and d == DIST))
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(root, name), STATIC_DIR)
+            paths.append(path.replace(os.sep, '/'))
+    return paths
+
+
+def fingerprint(path, data):
+    stem, extension = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{extension}'
+
+
+def rewrite_urls(path, css, files):
+    """Point relative url()s in a CSS file at the fingerprinted files"""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        clean = target.split('?')[0].split('#')[0]
+        resolved = posixpath.normpath(posixpath.join(directory, clean))
+        if resolved not in files:
+            return match.group(0)
+        built = posixpath.relpath(files[resolved], directory)
+        return f'url({quote}{built}{target[len(clean):]}{quote})'
+
+    return URL.sub(replace, css)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def compress(path, data):
+    """Write .gz (and .br when brotli is installed) next to path if they are worth it"""
+    written = []
+    variants = [('.gz', lambda: gzip.compress(data, 9, mtime=0))]
+    if importlib.util.find_spec('brotli'):
+        import brotli
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, encode in variants:
+        encoded = encode()
+        if len(encoded) <= len(data) * (1 - MIN_SAVING):
+            _write(path + suffix, encoded)
+            written.append(suffix)
+    return written
+
+
+def build(prune=False):
+    """Purge, fingerprint and precompress static/ into static/dist; returns the manifest"""
+    dist = os.path.join(STATIC_DIR, DIST)
+    used = used_classes()
+    files, report = {}, []
+    # CSS goes last so its url()s can point at the fonts' final names
+    for path in sorted(source_files(), key=lambda p: p.endswith('.css')):
+        with open(os.path.join(STATIC_DIR, *path.split('/')), 'rb') as f:
+            data = f.read()
+        size = len(data)
+        if path.endswith('.css'):
+            css = data.decode('utf-8')
+            if path.startswith('vendor/'):
+                css = purge_css(css, used)
+            data = rewrite_urls(path, css, files).encode('utf-8')
+        built = fingerprint(path, data)
+        files[path] = built
+        target = os.path.join(dist, *built.split('/'))
+        _write(target, data)
+        encodings = compress(target, data) if posixpath.splitext(path)[1] in COMPRESSIBLE else []
+        report.append((path, size, len(data), encodings))
+
+    manifest = {'files': {path: f'{DIST}/{built}' for path, built in files.items()}}
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    if prune:
+        keep = {os.path.join(dist, *built.split('/')) for built in files.values()}
+        keep |= {path + suffix for path in keep for _encoding, suffix in ENCODINGS}
+        keep.add(os.path.join(dist, MANIFEST))
+        for root, _dirs, names in os.walk(dist):
+            for name in names:
+                if os.path.join(root, name) not in keep:
+                    os.remove(os.path.join(root, name))
+    return manifest, report
+
+
+# ------------------------------
+# Serving
+# ------------------------------
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['files']
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    """Serve fingerprinted assets when a build exists; static/ as it is otherwise"""
+    app.config.setdefault('ASSET_MANIFEST', os.path.join(app.static_folder, DIST, MANIFEST))
+    files = load_manifest(app.config['ASSET_MANIFEST'])
+    if not files:
+        log.info('assets_unbuilt manifest=%s', app.config['ASSET_MANIFEST'])
+    app.extensions['assets'] = {'files': files, 'built': set(files.values())}
+
+    @app.url_defaults
+    def fingerprinted_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = files.get(values['filename'], values['filename'])
+
+    app.view_functions['static'] = serve_static
+
+
+def serve_static(filename):
+    """Built files: immutable, precompressed when accepted. Anything else: Flask's default"""
+    app = current_app._get_current_object()
+    if filename not in app.extensions['assets']['built']:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    served, encoding = filename, None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+            served, encoding = filename + suffix, name
+            break
+    response = send_from_directory(app.static_folder, served, mimetype=mimetype, max_age=MAX_AGE)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help='Purge, fingerprint and precompress static/ into static/dist')
+    build_parser.add_argument('--prune', action='store_true', help='Delete files from earlier builds')
+    sub.add_parser('check', help='Verify vendored files against their pinned hashes')
+    sub.add_parser('vendor', help='Download vendored files that are missing or changed')
+    args = parser.parse_args()
+
+    if args.command == 'vendor':
+        stale = {path for path, _problem in check_vendor()}
+        for path, url, expected in VENDOR:
+            if path in stale:
+                print(f"⬇️  {path}")
+                download(path, url, expected)
+        print("✅ Vendored files match their pins")
+    elif args.command == 'check':
+        bad = check_vendor()
+        for path, problem in bad:
+            print(f"   ❌ {path}: {problem}")
+        if bad:
+            sys.exit(1)
+        print(f"✅ {len(VENDOR)} vendored files match their pins")
+    else:
+        bad = check_vendor()
+        if bad:
+            sys.exit(f"❌ {bad[0][0]}: {bad[0][1]} (run python assets.py vendor)")
+        if not importlib.util.find_spec('brotli'):
+            print("⚠️  brotli is not installed; writing .gz only (pip install brotli)")
+        manifest, report = build(args.prune)
+        for path, before, after, encodings in report:
+            if path.endswith(('.css', '.js')):
+                purged = f" → {after / 1024:7.1f} KiB" if after != before else ' ' * 13
+                print(f"   {path:<45} {before / 1024:7.1f} KiB{purged}  {' '.join(encodings)}")
+        print(f"✅ Built {len(manifest['files'])} files into static/{DIST}/")
+
+
+if __name__ == '__main__':
+    main()
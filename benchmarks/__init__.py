@@ -0,0 +1 @@
+"""Benchmarks for Finance Tracker. Run each module with `python -m benchmarks.<name>`."""
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Connection pool benchmark
+- Seeds two throwaway databases with the same data
+- "before": a fresh sqlite3.connect() per request in rollback-journal mode
+- "after": the pooled, WAL-mode connection layer from db.py
+- Drives the read routes from several threads and reports requests/sec
+
+Usage: python -m benchmarks.connection_pool [--requests N] [--threads N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import db
+from app import create_app, init_db
+
+ROUTES = ['/', '/spending', '/personal', '/api/analytics']
+
+
+class LegacyPool(db.ConnectionPool):
+    """Mimics the old get_db_connection(): connect on every request, close after"""
+
+    def acquire(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+
+def seed(path, days=365, items_per_day=4):
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    today = date.today()
+    items = ['Tim Hortons', 'Gas', 'Groceries', 'Dominos', 'Coffee', 'Cannabis']
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        conn.execute(
+            'INSERT OR REPLACE INTO personal_log (date, gym, work, sauna) VALUES (?, ?, ?, ?)',
+            (day, rng.randint(0, 1), rng.randint(0, 1), rng.randint(0, 1)),
+        )
+        for _ in range(items_per_day):
+            conn.execute(
+                'INSERT INTO spending_log (date, item, price) VALUES (?, ?, ?)',
+                (day, rng.choice(items), round(rng.uniform(1, 60), 2)),
+            )
+    conn.commit()
+    conn.close()
+
+
+def drive(app, requests, threads):
+    """Issue `requests` GETs spread over `threads` workers; return requests/sec"""
+    def worker(count):
+        client = app.test_client()
+        for i in range(count):
+            response = client.get(ROUTES[i % len(ROUTES)])
+            assert response.status_code == 200, response.status_code
+
+    per_thread = requests // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, [per_thread] * threads))
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+def run(label, path, pool, requests, threads):
+    app = create_app({'DATABASE': path})
+    app.extensions['db_pool'] = pool
+    drive(app, threads * 4, threads)  # warm-up
+    rate = drive(app, requests, threads)
+    pool.close_all()
+    print(f"   {label:<8} {rate:8.1f} req/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        pooled_path = os.path.join(tmp, 'pooled.db')
+        for path in (legacy_path, pooled_path):
+            init_db(create_app({'DATABASE': path}))
+            seed(path)
+        # init_db() switches the file to WAL; put the legacy copy back on the default journal
+        conn = sqlite3.connect(legacy_path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+        print(f"🏁 {args.requests} requests over {args.threads} threads")
+        before = run('before', legacy_path, LegacyPool(legacy_path), args.requests, args.threads)
+        after = run('after', pooled_path, db.ConnectionPool(pooled_path, size=args.threads), args.requests, args.threads)
+        print(f"   speedup  {after / before:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
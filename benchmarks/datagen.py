@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for benchmarks
+- Seeded: the same --rows, --seed and end date always produce the same data
+- Spending items are realistic strings; most hit a category keyword, some don't
+- personal_log covers most days of the span and budget_periods tiles it in
+  14-day blocks ending with the current period
+- Loads through migrate_all.bulk_load(), so indexes and rollups are built once
+
+Usage: python -m benchmarks.datagen --db bench.db [--rows 1000000] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import categories
+import db
+import migrate_all
+import migrations
+
+# (item, weight, price range)
+ITEMS = (
+    ('Tim Hortons', 14, (2, 9)),
+    ('Tim Hortons coffee and donut', 6, (3, 12)),
+    ('Starbucks coffee', 5, (4, 9)),
+    ('Shell gas', 6, (30, 95)),
+    ('Esso gas station', 4, (25, 90)),
+    ('Fuel top-up', 2, (15, 40)),
+    ('Groceries', 10, (20, 180)),
+    ('Restaurant dinner', 5, (25, 120)),
+    ('McDonalds', 6, (6, 18)),
+    ('Dominos pizza', 4, (15, 40)),
+    ('Food truck', 3, (8, 20)),
+    ('Weed', 4, (10, 60)),
+    ('Cannabis store', 3, (15, 80)),
+    ('Slushie', 3, (2, 5)),
+    ('Books', 2, (10, 45)),
+    ('Movie tickets', 2, (12, 35)),
+    ('Phone bill', 1, (40, 90)),
+    ('Parking', 3, (2, 20)),
+)
+
+# Probability that an activity is ticked on a logged day
+ACTIVITY_RATES = {
+    'gym': 0.45, 'jiu_jitsu': 0.2, 'skateboarding': 0.15, 'work': 0.7,
+    'coitus': 0.25, 'sauna': 0.3, 'supplements': 0.8,
+}
+LOGGED_DAY_RATE = 0.85
+NOTE_RATE = 0.3
+NOTES = (
+    'Rolled with the morning class, worked on guard passes',
+    'Leg day, new squat PR',
+    'Long shift at work, skipped the gym',
+    'Skated the new park downtown with friends',
+    'Sauna and cold plunge after training',
+    'Rest day, meal prep for the week',
+    'Felt tired, slept early',
+    'Open mat, drilled takedowns and sweeps',
+)
+ITEMS_PER_DAY = 20
+INSERT_CHUNK = 50_000
+
+
+def spending_rows(rng, rows, first_day, days):
+    """Yield (date, item, price, category) tuples"""
+    classifier = categories.Classifier(categories.DEFAULT_RULES)
+    names = [item for item, _, _ in ITEMS]
+    weights = [weight for _, weight, _ in ITEMS]
+    prices = {item: bounds for item, _, bounds in ITEMS}
+    category = {item: classifier.classify(item) for item in names}
+    for _ in range(rows):
+        item = rng.choices(names, weights)[0]
+        low, high = prices[item]
+        day = first_day + timedelta(days=rng.randrange(days))
+        yield day.isoformat(), item, round(rng.uniform(low, high), 2), category[item]
+
+
+def personal_rows(rng, first_day, days):
+    activities = list(ACTIVITY_RATES)
+    for offset in range(days):
+        if rng.random() < LOGGED_DAY_RATE:
+            flags = [int(rng.random() < ACTIVITY_RATES[name]) for name in activities]
+            notes = rng.choice(NOTES) if rng.random() < NOTE_RATE else ''
+            yield ((first_day + timedelta(days=offset)).isoformat(), *flags, notes)
+
+
+def period_rows(first_day, last_day):
+    start = last_day - timedelta(days=13)
+    while start + timedelta(days=13) >= first_day:
+        yield start.isoformat(), (start + timedelta(days=13)).isoformat()
+        start -= timedelta(days=14)
+
+
+def executemany_chunked(conn, sql, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK:
+            conn.executemany(sql, chunk)
+            chunk.clear()
+    if chunk:
+        conn.executemany(sql, chunk)
+
+
+def generate(path, rows, seed=7, end=None, items_per_day=ITEMS_PER_DAY):
+    """Create a database at path with `rows` spending entries ending on `end` (today)"""
+    rng = random.Random(seed)
+    last_day = end or date.today()
+    days = max(rows // items_per_day, 60)
+    first_day = last_day - timedelta(days=days - 1)
+
+    conn = db.connect(path)
+    migrations.migrate(conn)
+    with migrate_all.bulk_load(conn):
+        executemany_chunked(
+            conn,
+            'INSERT INTO spending_log (date, item, price, category) VALUES (?, ?, ?, ?)',
+            spending_rows(rng, rows, first_day, days),
+        )
+        columns = ', '.join(ACTIVITY_RATES)
+        executemany_chunked(
+            conn,
+            f'INSERT INTO personal_log (date, {columns}, notes) VALUES (?, {", ".join("?" * len(ACTIVITY_RATES))}, ?)',
+            personal_rows(rng, first_day, days),
+        )
+        conn.executemany(
+            'INSERT INTO budget_periods (start_date, end_date, budget_amount) VALUES (?, ?, 500.00)',
+            period_rows(first_day, last_day),
+        )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='Database file to create')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Spending entries (1k to 10M)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    print(f"🏗️  Generating {args.rows:,} spending rows into {args.db}...")
+    start = time.perf_counter()
+    generate(args.db, args.rows, args.seed)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Streaming export memory check
+- Generates a synthetic database, then runs export.py for each format in a
+  child process, writing to /dev/null
+- Generation also runs in a child: a forked child's peak RSS starts at the
+  parent's, so this process is kept small
+- Checks the exported row count and the child's peak RSS against a fixed
+  ceiling; exits 1 if any export goes over it
+- tests/test_export_memory.py is the quick version, run under pytest
+
+Usage: python -m benchmarks.export_memory [--rows 5000000] [--ceiling-mb 256] [--formats csv,ndjson,parquet]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate(path, rows):
+    """Build the database in a child process with datagen's bulk loader"""
+    subprocess.run(
+        [sys.executable, '-c',
+         'import sys; from benchmarks import datagen; '
+         # More entries per day keeps the generated dates within a sane span at 5M rows
+         'datagen.generate(sys.argv[1], int(sys.argv[2]), items_per_day=500)',
+         path, str(rows)],
+        cwd=ROOT, check=True,
+    )
+
+
+def run_export(path, fmt, out):
+    """Run one export in a fresh child; returns (seconds, peak RSS in MB)"""
+    started = time.perf_counter()
+    with subprocess.Popen(
+        [sys.executable, 'export.py', 'spending', '--format', fmt, '--db', path, '--out', out],
+        cwd=ROOT,
+    ) as child:
+        _, status, usage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+    if child.returncode:
+        raise RuntimeError(f'{fmt} export exited with status {child.returncode}')
+    # ru_maxrss is in kilobytes on Linux
+    return time.perf_counter() - started, usage.ru_maxrss / 1024
+
+
+def count_rows(out, fmt):
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(out).metadata.num_rows
+    with open(out, 'rb') as f:
+        lines = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+    return lines - 1 if fmt == 'csv' else lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--ceiling-mb', type=float, default=256)
+    parser.add_argument('--formats', default='csv,ndjson,parquet')
+    parser.add_argument('--check-rows', action='store_true',
+                        help='Write to a temporary file instead of /dev/null and count the exported rows')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.db')
+        print(f"🏗️  Generating {args.rows:,} spending rows...")
+        generate(path, args.rows)
+
+        print(f"\n📦 Exporting spending_log (ceiling {args.ceiling_mb:.0f} MB)")
+        print(f"   {'format':<8} {'seconds':>8} {'peak MB':>8}")
+        for fmt in args.formats.split(','):
+            out = os.path.join(tmp, f'export.{fmt}') if args.check_rows else os.devnull
+            seconds, peak = run_export(path, fmt, out)
+            status = '✅' if peak <= args.ceiling_mb else '❌'
+            failed |= peak > args.ceiling_mb
+            print(f"   {fmt:<8} {seconds:8.1f} {peak:8.1f} {status}")
+            if args.check_rows:
+                exported = count_rows(out, fmt)
+                if exported != args.rows:
+                    print(f"      ❌ exported {exported:,} rows, expected {args.rows:,}")
+                    failed = True
+                os.remove(out)
+
+    if failed:
+        print("\n❌ Export memory check failed")
+        sys.exit(1)
+    print("\n✅ All exports stayed under the memory ceiling")
+
+
+if __name__ == '__main__':
+    main()
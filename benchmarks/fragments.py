@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Fragment vs. full-page form actions
+- Seeds a database with benchmarks.datagen, then adds spending entries,
+  deletes them and saves the personal form --repeat times each, two ways:
+  the no-JS flow (POST, 302, GET the whole page) and the fragment flow
+  static/js/fragments.js uses (one POST answered with JSON)
+- Reports response bytes (uncompressed) and server time per action, with the
+  ratio between the two flows
+
+Usage: python -m benchmarks.fragments [--rows 100000] [--repeat 50]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+from app import create_app
+from benchmarks import datagen, results
+
+JSON = {'Accept': 'application/json'}
+
+
+def make_app(path):
+    return create_app({'DATABASE': path, 'MAINTENANCE_ENABLED': False, 'METRICS_ENABLED': False,
+                       'CSRF_ENABLED': False})
+
+
+def newest_ids(path, day, limit):
+    """Ids of the newest benchmark entries on day, oldest first so pop() takes the newest"""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT id FROM spending_log WHERE date = ? AND item = 'Tim Hortons' "
+                            'ORDER BY id DESC LIMIT ?', (day, limit)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in reversed(rows)]
+
+
+def timed(client, method, url, **kwargs):
+    """Returns (seconds, bytes, response)"""
+    started = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    body = response.get_data()
+    return time.perf_counter() - started, len(body), response
+
+
+def run_action(client, post, fragment):
+    """One action; the full flow follows the redirect like a browser would. Returns (seconds, bytes)"""
+    url, form = post()
+    if fragment:
+        seconds, size, response = timed(client, 'post', url, data=form, headers=JSON)
+        assert response.status_code == 200 and response.is_json, (url, response.status_code)
+        return seconds, size
+    seconds, size, response = timed(client, 'post', url, data=form)
+    assert response.status_code == 302, (url, response.status_code)
+    page_seconds, page_size, page = timed(client, 'get', response.headers['Location'])
+    assert page.status_code == 200, (url, page.status_code)
+    return seconds + page_seconds, size + page_size
+
+
+def measure(client, post, repeat, fragment):
+    samples, sizes = [], []
+    for _ in range(repeat):
+        seconds, size = run_action(client, post, fragment)
+        samples.append(seconds)
+        sizes.append(size)
+    return results.summarize(samples), sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='Spending entries to seed')
+    parser.add_argument('--repeat', type=int, default=50, help='Actions per flow')
+    args = parser.parse_args()
+
+    today = date.today().isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print(f"🏗️  Seeding {args.rows:,} spending rows...")
+        datagen.generate(path, args.rows)
+        app = make_app(path)
+        client = app.test_client()
+        client.get('/spending').get_data()  # warm-up
+
+        added = []
+
+        def add():
+            return '/spending/add', {'date': today, 'item': 'Tim Hortons', 'price': '2.75'}
+
+        def delete():
+            return f'/spending/delete/{added.pop()}', {}
+
+        def save():
+            return '/personal/save', {'date': today, 'gym': 'on', 'notes': 'Leg day'}
+
+        print(f"\n🏁 {args.repeat} actions per flow")
+        print(f"   {'action':<16} {'flow':<9} {'KB/action':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, post in (('add spending', add), ('delete spending', delete), ('save personal', save)):
+            measured = {}
+            for fragment in (False, True):
+                if post is delete:
+                    # Both flows delete entries the add runs created
+                    added[:] = newest_ids(path, today, args.repeat)
+                measured[fragment] = measure(client, post, args.repeat, fragment)
+                summary, size = measured[fragment]
+                flow = 'fragment' if fragment else 'full page'
+                print(f"   {name:<16} {flow:<9} {size / 1024:9.1f} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f}")
+            (full, full_size), (partial, partial_size) = measured[False], measured[True]
+            print(f"   {'':<16} {'ratio':<9} {full_size / partial_size:8.1f}x "
+                  f"{full['p50_ms'] / partial['p50_ms']:7.1f}x {full['p95_ms'] / partial['p95_ms']:7.1f}x")
+
+        if 'db_pool' in app.extensions:
+            app.extensions['db_pool'].close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Write-behind group commit benchmark
+- Writer threads POST /spending/add (the quick-add form) as fast as they can
+  for --duration seconds, once committing on each request's connection and
+  once through the write-behind queue (writebehind.py)
+- Reports writes/sec, commits/sec, writes per commit and p50/p95 latency for
+  each writer count: a lone writer pays the flush window, concurrent writers
+  share commits
+
+Usage: python -m benchmarks.group_commit [--writers 1,4,16] [--duration 5] [--window-ms 5]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+from app import create_app, init_db
+from benchmarks import results
+
+
+def make_app(path, write_behind, window_ms):
+    app = create_app({'DATABASE': path, 'WRITE_BEHIND': write_behind, 'WRITE_BEHIND_WINDOW_MS': window_ms,
+                      'DB_POOL_SIZE': 32, 'MAINTENANCE_ENABLED': False, 'METRICS_ENABLED': False,
+                      'CSRF_ENABLED': False})
+    init_db(app)
+    return app
+
+
+def drive(app, writers, duration):
+    """Returns (samples, errors, elapsed)"""
+    samples, errors = [], []
+    lock = threading.Lock()
+    form = {'date': date.today().isoformat(), 'item': 'Tim Hortons', 'price': '2.75'}
+    start_line = threading.Barrier(writers + 1)
+    deadline = [0.0]
+
+    def worker():
+        client = app.test_client()
+        local, failed = [], []
+        start_line.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            response = client.post('/spending/add', data=form)
+            local.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                failed.append(response.status_code)
+        with lock:
+            samples.extend(local)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    start = time.perf_counter()
+    start_line.wait()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', default='1,4,16', help='Comma-separated writer thread counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    parser.add_argument('--window-ms', type=float, default=5.0, help='Write-behind flush window')
+    args = parser.parse_args()
+
+    print(f"🏁 POST /spending/add for {args.duration:.0f}s per run, {args.window_ms:g} ms flush window")
+    print(f"   {'mode':<12} {'writers':>7} {'writes/s':>9} {'commits/s':>9} {'per commit':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for writers in [int(n) for n in args.writers.split(',')]:
+        for write_behind in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                app = make_app(os.path.join(tmp, 'bench.db'), write_behind, args.window_ms)
+                samples, errors, elapsed = drive(app, writers, args.duration)
+                write_queue = app.extensions.get('write_queue')
+                commits = write_queue.stats()['groups'] if write_queue else len(samples)
+                if write_queue:
+                    write_queue.close()
+                if 'db_pool' in app.extensions:
+                    app.extensions['db_pool'].close_all()
+            summary = results.summarize(samples)
+            mode = 'write-behind' if write_behind else 'direct'
+            print(f"   {mode:<12} {writers:>7} {len(samples) / elapsed:9.1f} {commits / elapsed:9.1f} "
+                  f"{len(samples) / max(commits, 1):10.1f} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f}")
+            if errors:
+                print(f"      ❌ {len(errors)} failed requests, e.g. status {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Workbook import memory check
+- Writes synthetic Personal Log.xlsx and Spending.xlsx pairs of growing size:
+  each scale step multiplies the Life sheet's days and every spending
+  sheet's rows
+- Runs migrate_all's full import (as a dry run, rolled back) for each pair in
+  a fresh child process and reports its time and peak RSS
+- Generation also runs in a child, so this process stays small
+- Exits 1 if any import's peak RSS goes over the ceiling
+
+Usage: python -m benchmarks.import_memory [--scales 1,10,100] [--days 2000] [--sheets 50] [--ceiling-mb 160]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GENERATE = '''
+import random, sys
+from datetime import date, timedelta
+from openpyxl import Workbook
+from benchmarks import import_sheets
+
+directory, days, sheets, rows = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+rng = random.Random(5)
+workbook = Workbook(write_only=True)
+life = workbook.create_sheet('Life')
+life.append(['Date', 'Gym', 'Jiu Jitsu', 'Skateboard', 'Work', 'Coitus', 'Sauna', 'Supplements', 'What '])
+start = date(2000, 1, 1)
+for day in range(days):
+    life.append([start + timedelta(days=day)] + [rng.choice(['Yes', None]) for _ in range(7)]
+                + [rng.choice(['Rest day', 'Long run', 'Groceries', None])])
+workbook.save(f'{directory}/Personal Log.xlsx')
+import_sheets.write_workbook(f'{directory}/Spending.xlsx', sheets, rows=rows)
+'''
+
+IMPORT = '''
+import sqlite3
+import migrate_all
+
+migrate_all.setup_database()
+conn = sqlite3.connect(migrate_all.DATABASE)
+with migrate_all.bulk_load(conn):
+    migrate_all.migrate_personal_data(conn)
+    migrate_all.migrate_spending_data(conn, workers=1)
+conn.rollback()
+'''
+
+
+def generate(directory, days, sheets, rows):
+    subprocess.run([sys.executable, '-c', GENERATE, directory, str(days), str(sheets), str(rows)],
+                   cwd=ROOT, check=True)
+
+
+def run_import(directory):
+    """Import the workbooks in directory in a fresh child; returns (seconds, peak RSS in MB)"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    started = time.perf_counter()
+    with subprocess.Popen([sys.executable, '-c', IMPORT], cwd=directory, env=env,
+                          stdout=subprocess.DEVNULL) as child:
+        _, status, usage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+    if child.returncode:
+        raise RuntimeError(f'import exited with status {child.returncode}')
+    # ru_maxrss is in kilobytes on Linux
+    return time.perf_counter() - started, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1,10,100', help='Comma-separated size multipliers')
+    parser.add_argument('--days', type=int, default=2000, help='Life sheet days at scale 1')
+    parser.add_argument('--sheets', type=int, default=50, help='Spending sheets (every scale)')
+    parser.add_argument('--rows', type=int, default=40, help='Rows per spending sheet at scale 1')
+    parser.add_argument('--ceiling-mb', type=float, default=160)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"📥 Importing workbooks, {args.sheets} spending sheets (ceiling {args.ceiling_mb:.0f} MB)")
+    print(f"   {'scale':>5} {'life days':>10} {'sheet rows':>10} {'MB on disk':>10} {'seconds':>8} {'peak MB':>8}")
+    for scale in [int(n) for n in args.scales.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            days, rows = args.days * scale, args.rows * scale
+            generate(tmp, days, args.sheets, rows)
+            size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp)) / 1024 / 1024
+            seconds, peak = run_import(tmp)
+        status = '✅' if peak <= args.ceiling_mb else '❌'
+        failed |= peak > args.ceiling_mb
+        print(f"   {scale:>5} {days:>10,} {rows:>10,} {size:10.1f} {seconds:8.1f} {peak:8.1f} {status}")
+
+    if failed:
+        print("\n❌ Import memory check failed")
+        sys.exit(1)
+    print("\n✅ Every import stayed under the memory ceiling")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Spending workbook parsing benchmark
+- Writes a synthetic Spending.xlsx with N dated sheets laid out like the real one
+- Times migrate_all.iter_sheet_totals() serially and with a process pool
+
+Usage: python -m benchmarks.import_sheets [--sheets 200] [--workers N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+
+import migrate_all
+
+
+def sheet_name(start, end):
+    if start.month == end.month:
+        return f"{start:%b} {start.day} - {end.day}"
+    return f"{start:%b} {start.day} - {end:%b} {end.day}"
+
+
+def write_workbook(path, sheets, seed=3, rows=40):
+    """Write a workbook with `sheets` 14-day sheets of `rows` rows; daily totals sit in row 17"""
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    workbook.create_sheet('General').append(['Budget', 500])
+    start = date(2018, 1, 1)
+    used = set()
+    for index in range(sheets):
+        period_start = start + timedelta(days=14 * index)
+        period_end = period_start + timedelta(days=13)
+        # Sheet names carry no year, so the same range can recur; suffix repeats
+        name = sheet_name(period_start, period_end)
+        if name in used:
+            name = f"{name} ({index})"
+        used.add(name)
+        sheet = workbook.create_sheet(name)
+        sheet.append([f'Day {day + 1}' for day in range(14)])
+        for row in range(rows):
+            if row == 15:
+                sheet.append([round(rng.uniform(1, 120), 2) for _ in range(14)])
+            else:
+                sheet.append([rng.choice(['Coffee', 'Gas', None, None]) for _ in range(14)])
+    workbook.save(path)
+
+
+def time_parse(path, names, workers):
+    start = time.perf_counter()
+    rows = sum(len(entries) for _, entries in migrate_all.iter_sheet_totals(names, path=path, workers=workers))
+    return time.perf_counter() - start, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sheets', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'Spending.xlsx')
+        print(f"🏗️  Writing synthetic workbook with {args.sheets} sheets...")
+        write_workbook(path, args.sheets)
+        names = migrate_all.spending_sheet_names(path)
+
+        serial, rows = time_parse(path, names, 1)
+        print(f"   serial        {serial:7.2f}s  ({rows} rows)")
+        parallel, rows = time_parse(path, names, args.workers)
+        print(f"   {args.workers:>2} workers    {parallel:7.2f}s  ({rows} rows)")
+        print(f"   speedup       {serial / parallel:7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Concurrent load driver
+- Worker threads issue a weighted mix of page views, API reads and writes
+  for a fixed duration
+- Reports p50/p95/p99 latency per route and overall requests/sec
+- Runs in-process through the Flask test client by default, or against a
+  live server with --url (e.g. a gunicorn deployment)
+
+Usage: python -m benchmarks.load --db bench.db [--threads 8] [--duration 10]
+       python -m benchmarks.load --url http://127.0.0.1:5000 [--threads 8]
+"""
+
+import argparse
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date
+
+from app import create_app
+from benchmarks import results
+
+# (weight, method, path, form)
+MIX = (
+    (30, 'GET', '/', None),
+    (20, 'GET', '/spending', None),
+    (10, 'GET', '/personal', None),
+    (20, 'GET', '/api/analytics', None),
+    (8, 'GET', '/api/analytics/series?resolution=month&start=2020-01-01', None),
+    (8, 'POST', '/spending/add', {'item': 'Tim Hortons', 'price': '2.75'}),
+    (4, 'POST', '/personal/save', {'gym': 'on', 'notes': 'load test'}),
+)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Just enough of the test client's interface to drive a live server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def request(self, method, path, form=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=data, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        response.get_data()
+        return response.status_code
+
+
+def drive(make_client, threads, duration, seed=11):
+    """Run the mix for `duration` seconds; returns ({label: [seconds]}, errors, elapsed)"""
+    samples = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    weights = [weight for weight, _, _, _ in MIX]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = make_client()
+        local = defaultdict(list)
+        today = date.today().isoformat()
+        while time.perf_counter() < deadline:
+            _, method, path, form = rng.choices(MIX, weights)[0]
+            if form is not None:
+                form = dict(form, date=today)
+            start = time.perf_counter()
+            status = client.request(method, path, form)
+            local[f'{method} {path}'].append(time.perf_counter() - start)
+            if status >= 400:
+                with lock:
+                    errors.append((method, path, status))
+        with lock:
+            for label, values in local.items():
+                samples[label].extend(values)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def run(threads, duration, url=None, app=None):
+    """Drive the mix against `url`, or in-process against `app`, and summarize it as benchmark results"""
+    make_client = (lambda: HttpClient(url)) if url else (lambda: InProcessClient(app))
+    samples, errors, elapsed = drive(make_client, threads, duration)
+    summary = {f'load {label}': results.summarize(values) for label, values in samples.items()}
+    everything = [value for values in samples.values() for value in values]
+    summary['load total'] = dict(results.summarize(everything), rps=round(len(everything) / elapsed, 1))
+    return summary, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--db', help='Database built by benchmarks.datagen (in-process run)')
+    target.add_argument('--url', help='Base URL of a running server')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds')
+    args = parser.parse_args()
+
+    # The mix posts forms without a session, so the in-process app skips CSRF checks
+    app = create_app({'DATABASE': args.db, 'CSRF_ENABLED': False}) if args.db else None
+    print(f"🏁 {args.threads} threads for {args.duration:.0f}s against {args.url or args.db}")
+    summary, errors = run(args.threads, args.duration, args.url, app)
+    results.print_table(summary)
+    if errors:
+        print(f"\n❌ {len(errors)} failed requests, e.g. {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
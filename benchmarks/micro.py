@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Route and query micro-benchmarks
+- Routes: repeated GETs of every read route through the Flask test client.
+  The response cache is dropped before each request unless --cached is given,
+  so the timings reflect the queries behind the page
+- Queries: every distinct SELECT those routes issue, replayed on its own
+  connection
+
+Usage: python -m benchmarks.micro --db bench.db [--repeat 50] [--cached]
+"""
+
+import argparse
+import hashlib
+import re
+import time
+
+import db
+from app import create_app
+from benchmarks import results
+from benchmarks.query_plans import TracingPool
+
+ROUTES = (
+    '/',
+    '/spending',
+    '/personal',
+    '/api/analytics',
+    '/api/analytics/series?resolution=week',
+    '/api/analytics/series?resolution=month&limit=120&start=2000-01-01',
+    '/api/analytics/series?resolution=period&limit=120&start=2000-01-01',
+    '/api/trends/rolling?start=2020-01-01',
+    '/api/trends/weekdays',
+    '/api/trends/streaks',
+    '/api/trends/correlations',
+    '/search?q=tim',
+    '/api/search?q=gas&start=2020-01-01&end=2020-12-31',
+    '/api/search?q=leg+day&type=notes',
+)
+
+# Literals are replaced so a query keeps its name from one day to the next
+LITERALS = re.compile(r"'[^']*'|\b\d+(?:\.\d+)?\b")
+
+
+def statement_name(sql):
+    """Stable, readable name: the normalized statement's prefix plus a digest of all of it"""
+    normalized = LITERALS.sub('?', ' '.join(sql.split()))
+    return f"query {normalized[:80]} [{hashlib.sha1(normalized.encode()).hexdigest()[:6]}]"
+
+
+def time_route(app, client, url, repeat, cached):
+    samples = []
+    client.get(url).get_data()  # warm-up
+    for _ in range(repeat):
+        if not cached:
+            app.extensions.pop('cache', None)
+        start = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return samples
+
+
+def bench_routes(app, repeat, cached=False):
+    client = app.test_client()
+    return {f'route GET {url}': results.summarize(time_route(app, client, url, repeat, cached)) for url in ROUTES}
+
+
+def route_statements(app):
+    """Distinct SELECTs issued by the read routes, with literal parameters"""
+    statements = []
+    pool = TracingPool(app.config['DATABASE'], statements)
+    previous = app.extensions.get('db_pool')
+    app.extensions['db_pool'] = pool
+    app.extensions.pop('cache', None)
+    try:
+        client = app.test_client()
+        for url in ROUTES:
+            client.get(url).get_data()
+    finally:
+        pool.close_all()
+        app.extensions['db_pool'] = previous
+    seen = []
+    for sql in statements:
+        sql = ' '.join(sql.split())
+        if sql.split(' ', 1)[0].upper() in ('SELECT', 'WITH') and sql not in seen:
+            seen.append(sql)
+    return seen
+
+
+def bench_queries(app, repeat):
+    conn = db.connect(app.config['DATABASE'])
+    timings = {}
+    for sql in route_statements(app):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append(time.perf_counter() - start)
+        timings[statement_name(sql)] = results.summarize(samples)
+    conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='Database built by benchmarks.datagen')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--cached', action='store_true', help='Keep the response cache between requests')
+    args = parser.parse_args()
+
+    app = create_app({'DATABASE': args.db})
+    print(f"⏱️  Routes ({args.repeat} requests each)")
+    results.print_table(bench_routes(app, args.repeat, args.cached))
+    print(f"\n⏱️  Queries ({args.repeat} runs each)")
+    results.print_table(bench_queries(app, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
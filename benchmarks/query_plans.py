@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check
+- Builds a synthetic database with millions of spending rows
+- Drives every route in app.py through the Flask test client while tracing
+  each SQL statement the app issues
+- Runs EXPLAIN QUERY PLAN on every distinct statement and fails (exit 1) if
+  any of them falls back to a full table scan
+- tests/test_query_plans.py runs the same check on a small database under pytest
+
+Usage: python -m benchmarks.query_plans [--rows 2000000] [--keep PATH]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+
+import db
+import maintenance
+import migrations
+import trends
+from app import create_app
+from benchmarks import datagen
+
+# A bare "SCAN <table>" (no index) is a full table scan
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# Tables that stay tiny no matter how much history there is, plus the
+# analytics day walk, which is bounded by the requested range
+SMALL_TABLES = {'category_rules', 'activity_totals', 'activities', 'activity_counts', 'days'}
+
+# Statements that read whole tables on purpose (the trends engine's full load)
+INTENTIONAL_SCANS = {' '.join(sql.split()) for sql in trends.LOAD_QUERIES}
+
+
+class TracingPool(db.ConnectionPool):
+    """Pool whose connections record every statement they execute"""
+
+    def __init__(self, path, statements):
+        super().__init__(path, size=1)
+        self.statements = statements
+
+    def acquire(self):
+        conn = super().acquire()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def build(path, rows, seed=7):
+    """Create a synthetic database with `rows` spending entries"""
+    datagen.generate(path, rows, seed)
+
+
+def make_app(path):
+    # The form posts below carry no CSRF token
+    return create_app({'DATABASE': path, 'MAINTENANCE_ENABLED': False, 'CSRF_ENABLED': False})
+
+
+def exercise_routes(app):
+    """Hit every route once; returns the distinct statements issued"""
+    statements = []
+    pool = TracingPool(app.config['DATABASE'], statements)
+    app.extensions['db_pool'] = pool
+    client = app.test_client()
+    today = date.today().isoformat()
+
+    for url in ['/', '/spending', '/personal', '/api/analytics',
+                '/api/analytics/series?resolution=week&fields=spending,entries,gym,days_logged',
+                '/api/analytics/series?resolution=period&limit=5',
+                f'/api/export/spending.csv?start={today}', f'/api/export/personal.ndjson?end={today}',
+                '/api/trends/rolling', '/api/trends/correlations',
+                '/search?q=tim+hor', f'/api/search?q=gas&end={today}&after=1:{today}:99',
+                '/api/search?q=leg+day&type=notes&after=20']:
+        response = client.get(url)
+        assert response.status_code == 200, url
+        response.get_data()  # drain streamed responses so their queries run
+    client.post('/spending/add', data={'date': today, 'item': 'Coffee', 'price': '2.50'})
+    client.post('/personal/save', data={'date': today, 'gym': 'on', 'notes': 'plan check'})
+    client.post('/spending/delete/1')
+    client.post('/api/spending/batch', json=[{'date': today, 'item': 'Gas', 'price': 40}],
+                headers={'Idempotency-Key': 'plan-check'})
+    client.post('/api/personal/batch', json=[{'date': today, 'sauna': True}],
+                headers={'Idempotency-Key': 'plan-check'})
+    client.get('/api/trends/streaks')  # incremental refresh after the writes
+    # A closed pool can't be reused; the app opens a fresh one on its next request
+    app.extensions.pop('db_pool', None)
+    pool.close_all()
+
+    seen = []
+    for sql in statements:
+        sql = ' '.join(sql.split())
+        keyword = sql.split(' ', 1)[0].upper()
+        if keyword in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH') and sql not in seen:
+            seen.append(sql)
+    return seen
+
+
+def full_scans(conn, sql):
+    """Return the large tables that sql would scan in full"""
+    tables = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+        match = FULL_SCAN.match(row[3])
+        if match and match.group(1) not in SMALL_TABLES:
+            tables.append(match.group(1))
+    return tables
+
+
+def check_plans(conn, statements):
+    """Returns [(sql, scanned tables)] for every statement, skipping the intentional scans"""
+    return [(sql, [] if sql in INTENTIONAL_SCANS else full_scans(conn, sql)) for sql in statements]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--keep', help='Build (or reuse) the synthetic database at this path')
+    parser.add_argument('--analyze', action='store_true', help='Collect planner statistics (as the maintenance job does) before checking plans')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.keep or os.path.join(tmp, 'plans.db')
+        if not os.path.exists(path):
+            print(f"🏗️  Building synthetic database with {args.rows:,} spending rows...")
+            start = time.perf_counter()
+            build(path, args.rows)
+            print(f"   built in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        migrations.migrate(conn)
+        if args.analyze:
+            maintenance.analyze(conn)
+        statements = exercise_routes(make_app(path))
+
+        failures = 0
+        print(f"\n🔍 Checking {len(statements)} statements")
+        for sql, scans in check_plans(conn, statements):
+            status = '❌' if scans else '✅'
+            print(f"   {status} {sql[:100]}")
+            if scans:
+                failures += 1
+                print(f"      full scan of: {', '.join(scans)}")
+        conn.close()
+
+    if failures:
+        print(f"\n❌ {failures} statement(s) regressed to a full table scan")
+        sys.exit(1)
+    print("\n✅ No full table scans")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark results and baselines
+- summarize() turns raw latency samples into p50/p95/p99/mean
+- Results are a flat {name: {metric: value}} dict written as JSON
+- compare() flags latencies that grew (or throughput that fell) past a tolerance
+"""
+
+import json
+import statistics
+
+# Latency changes smaller than this (in ms) are treated as noise
+NOISE_FLOOR_MS = 0.5
+DEFAULT_TOLERANCE = 0.2
+
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+THROUGHPUT_METRICS = ('rps',)
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples):
+    """Latency summary (in ms) for a list of durations in seconds"""
+    ordered = sorted(sample * 1000 for sample in samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50), 3),
+        'p95_ms': round(percentile(ordered, 0.95), 3),
+        'p99_ms': round(percentile(ordered, 0.99), 3),
+    }
+
+
+def save(path, results, meta=None):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta or {}, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """Return (name, metric, before, after) for every regression"""
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if metric in metrics and metric in before:
+                grew = metrics[metric] - before[metric]
+                if grew > NOISE_FLOOR_MS and metrics[metric] > before[metric] * (1 + tolerance):
+                    regressions.append((name, metric, before[metric], metrics[metric]))
+        for metric in THROUGHPUT_METRICS:
+            if metric in metrics and metric in before:
+                if metrics[metric] < before[metric] * (1 - tolerance):
+                    regressions.append((name, metric, before[metric], metrics[metric]))
+    return regressions
+
+
+def print_table(results):
+    width = max((len(name) for name in results), default=10)
+    print(f"   {'':<{width}}  {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for name, metrics in sorted(results.items()):
+        rps = f"{metrics['rps']:9.1f}" if 'rps' in metrics else f"{'':>9}"
+        print(f"   {name:<{width}}  {metrics.get('p50_ms', 0):9.2f} {metrics.get('p95_ms', 0):9.2f} "
+              f"{metrics.get('p99_ms', 0):9.2f} {rps}")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Multi-worker scaling benchmark
+- Generates a synthetic database, then starts gunicorn with gunicorn.conf.py
+  at increasing worker counts
+- Drives each deployment over HTTP with the load driver's request mix and
+  reports requests/sec, p95 latency and scaling relative to one worker
+
+The load driver runs in this process, so leave it enough cores (or use
+several machines) when measuring large worker counts.
+
+Usage: python -m benchmarks.scaling [--workers 1,2,4] [--rows 100000] [--duration 10]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks import datagen, load
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(server, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'Server exited with status {server.returncode}; see the gunicorn log')
+        try:
+            with urllib.request.urlopen(url + '/personal') as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {url} did not start within {timeout}s')
+
+
+def serve(path, workers, threads, port, log):
+    env = dict(os.environ, FINANCE_DB=path, FINANCE_BIND=f'127.0.0.1:{port}',
+               FINANCE_WORKERS=str(workers), FINANCE_THREADS=str(threads), FINANCE_MAINTENANCE='0')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull, 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, 8) if n <= 2 * (os.cpu_count() or 1)),
+                        help='Comma-separated worker counts')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.workers.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'scaling.db')
+        print(f"🏗️  Generating {args.rows:,} spending rows...")
+        datagen.generate(path, args.rows)
+
+        print(f"\n🏁 {args.clients} clients, {args.duration:.0f}s per run, {os.cpu_count()} CPUs")
+        print(f"   {'workers':>7} {'req/s':>9} {'p95 ms':>9} {'scaling':>8}")
+        baseline = None
+        with open(os.path.join(tmp, 'gunicorn.log'), 'w') as log:
+            for workers in counts:
+                port = free_port()
+                url = f'http://127.0.0.1:{port}'
+                server = serve(path, workers, args.threads, port, log)
+                try:
+                    wait_until_ready(server, url)
+                    summary, errors = load.run(args.clients, args.duration, url)
+                finally:
+                    server.terminate()
+                    server.wait()
+                total = summary['load total']
+                baseline = baseline or total['rps']
+                print(f"   {workers:>7} {total['rps']:9.1f} {total['p95_ms']:9.2f} {total['rps'] / baseline:7.2f}x")
+                if errors:
+                    print(f"      ❌ {len(errors)} failed requests, e.g. {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Full-text search benchmark
+- Builds (or reuses) a synthetic database with millions of spending rows
+- Times search.search() for prefix, multi-word, rare and missing terms, with
+  and without date ranges, for spending items and personal notes; "deep"
+  cases follow the next cursor a few pages in first
+- Fails (exit 1) if any case's p95 is over --budget-ms
+
+Usage: python -m benchmarks.search [--rows 2000000] [--db PATH] [--repeat 50] [--budget-ms 10]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import db
+import search
+from benchmarks import datagen, results
+
+DEEP_PAGES = 5
+
+
+def cases(today):
+    year_ago = (today - timedelta(days=365)).isoformat()
+    last_week = (today - timedelta(days=7)).isoformat()
+    return {
+        'spending prefix "ti"': {'q': 'ti'},
+        'spending word "tim"': {'q': 'tim'},
+        'spending words "tim hor"': {'q': 'tim hor'},
+        'spending rare "phone"': {'q': 'phone'},
+        'spending missing "zzz"': {'q': 'zzz'},
+        'spending "gas" last year': {'q': 'gas', 'start': year_ago},
+        'spending "coffee" last week': {'q': 'coffee', 'start': last_week},
+        'spending "tim" deep page': {'q': 'tim', 'deep': True},
+        'notes word "gym"': {'q': 'gym', 'type': 'notes'},
+        'notes common "the"': {'q': 'the', 'type': 'notes'},
+        'notes "leg day" last year': {'q': 'leg day', 'type': 'notes', 'start': year_ago},
+        'notes "rolled" deep page': {'q': 'rolled', 'type': 'notes', 'deep': True},
+    }
+
+
+def start_query(conn, args):
+    """Parsed query for a case; deep cases start from the cursor DEEP_PAGES pages in"""
+    args = dict(args)
+    deep = args.pop('deep', False)
+    query = search.parse_args(args)
+    for _ in range(DEEP_PAGES if deep else 0):
+        page = search.search(conn, query)
+        if not page['next']:
+            break
+        query = search.parse_args({**args, 'after': page['next']})
+    return query
+
+
+def run(path, repeat, today=None):
+    conn = db.connect(path)
+    timings = {}
+    for name, args in cases(today or date.today()).items():
+        query = start_query(conn, args)
+        search.search(conn, query)  # warm-up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search.search(conn, query)
+            samples.append(time.perf_counter() - start)
+        timings[f'search {name}'] = results.summarize(samples)
+    conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--db', help='Build (or reuse) the synthetic database at this path')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=10.0, help='Highest acceptable p95 per case')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'search.db')
+        if not os.path.exists(path):
+            print(f"🏗️  Building synthetic database with {args.rows:,} spending rows...")
+            start = time.perf_counter()
+            datagen.generate(path, args.rows, args.seed)
+            print(f"   built in {time.perf_counter() - start:.1f}s")
+
+        print(f"\n⏱️  Search ({args.repeat} runs each)")
+        timings = run(path, args.repeat)
+        results.print_table(timings)
+
+    slow = [name for name, metrics in timings.items() if metrics['p95_ms'] > args.budget_ms]
+    if slow:
+        print(f"\n❌ {len(slow)} case(s) over {args.budget_ms:g} ms at p95: {', '.join(slow)}")
+        sys.exit(1)
+    print(f"\n✅ Every case under {args.budget_ms:g} ms at p95")
+
+
+if __name__ == '__main__':
+    main()
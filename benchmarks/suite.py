@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite with baselines
+- Generates (or reuses) a synthetic database at the requested scale
+- Runs the route and query micro-benchmarks, then the concurrent load driver
+- Writes every result to a JSON file; with --baseline, compares against an
+  earlier run and exits 1 if anything regressed past --tolerance
+
+Usage: python -m benchmarks.suite [--rows 100000] [--out results.json]
+                                  [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from app import create_app
+from benchmarks import datagen, load, micro, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='Spending entries (1k to 10M)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--db', help='Reuse (or keep) the generated database at this path')
+    parser.add_argument('--repeat', type=int, default=30, help='Runs per route and per query')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load')
+    parser.add_argument('--out', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=results.DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = args.db or os.path.join(tmp, 'bench.db')
+        if not os.path.exists(path):
+            print(f"🏗️  Generating {args.rows:,} spending rows...")
+            start = time.perf_counter()
+            datagen.generate(path, args.rows, args.seed)
+            print(f"   built in {time.perf_counter() - start:.1f}s")
+        app = create_app({'DATABASE': path, 'CSRF_ENABLED': False})
+
+        print("\n⏱️  Routes")
+        route_results = micro.bench_routes(app, args.repeat)
+        results.print_table(route_results)
+        print("\n⏱️  Queries")
+        query_results = micro.bench_queries(app, args.repeat)
+        results.print_table(query_results)
+        print(f"\n🏁 Load: {args.threads} threads for {args.duration:.0f}s")
+        load_results, errors = load.run(args.threads, args.duration, app=app)
+        results.print_table(load_results)
+        if errors:
+            print(f"   ❌ {len(errors)} failed requests, e.g. {errors[0]}")
+
+        app.extensions['db_pool'].close_all()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    combined = {**route_results, **query_results, **load_results}
+    meta = {'rows': args.rows, 'seed': args.seed, 'threads': args.threads,
+            'duration': args.duration, 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count()}
+    results.save(args.out, combined, meta)
+    print(f"\n💾 Results written to {args.out}")
+
+    if args.baseline:
+        regressions = results.compare(results.load(args.baseline), combined, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for name, metric, before, after in regressions:
+                print(f"   {name}  {metric}: {before:.2f} → {after:.2f}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
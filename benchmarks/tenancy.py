@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant write scaling benchmark
+- Runs the app in multi-tenant mode (tenancy.py) in a fixed number of writer
+  processes (like gunicorn workers, so the GIL doesn't hide lock waits) spread
+  round-robin over 1, 2, 4, ... tenants, each tenant on its own shard
+- Every writer POSTs small batches to /api/spending/batch as its tenant for
+  --duration seconds
+- Reports writes/sec, p50/p95 latency and scaling relative to one tenant:
+  writers sharing a shard queue on its write lock, writers on different
+  shards don't. Parallel shards need parallel CPUs: on one core expect a
+  flat line
+
+Usage: python -m benchmarks.tenancy [--tenants 1,2,4,8] [--writers 8] [--duration 5] [--batch 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import tenancy
+from app import create_app, init_db
+from benchmarks import results
+
+PASSWORD = 'benchmark-password'
+CONFIG = {'MAINTENANCE_ENABLED': False, 'METRICS_ENABLED': False, 'SECRET_KEY': 'benchmark-secret-key'}
+WARMUP_SECONDS = 5  # process start-up, imports and shard creation happen before the clock starts
+
+
+def make_directory(tenant_dir, tenants):
+    """Create tenants.db with `tenants` accounts; returns their user ids"""
+    init_db(create_app({'TENANT_DIR': tenant_dir, **CONFIG}))
+    conn = sqlite3.connect(os.path.join(tenant_dir, tenancy.DIRECTORY))
+    conn.row_factory = sqlite3.Row
+    user_ids = [tenancy.create_user(conn, f'tenant{index}', PASSWORD) for index in range(tenants)]
+    conn.close()
+    return user_ids
+
+
+def writer(tenant_dir, user_id, start_at, duration, batch):
+    """One worker process posting batches as user_id from start_at; returns (latencies, failed statuses)"""
+    client = create_app({'TENANT_DIR': tenant_dir, **CONFIG}).test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    client.get('/api/analytics')  # opens (and creates) the shard outside the timed run
+    entries = [{'date': date.today().isoformat(), 'item': 'Tim Hortons', 'price': 2.75}] * batch
+    samples, failed = [], []
+    time.sleep(max(0.0, start_at - time.time()))
+    while time.time() < start_at + duration:
+        started = time.perf_counter()
+        response = client.post('/api/spending/batch', json=entries)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 201:
+            failed.append(response.status_code)
+    return samples, failed
+
+
+def drive(tenant_dir, user_ids, writers, duration, batch):
+    """Writer processes (like gunicorn workers) post as user_ids[writer % tenants]; returns (samples, errors)"""
+    start_at = time.time() + WARMUP_SECONDS
+    with ProcessPoolExecutor(writers) as pool:
+        futures = [pool.submit(writer, tenant_dir, user_ids[index % len(user_ids)], start_at, duration, batch)
+                   for index in range(writers)]
+        runs = [future.result() for future in futures]
+    return [s for samples, _ in runs for s in samples], [e for _, failed in runs for e in failed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', default='1,2,4,8', help='Comma-separated tenant counts')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writer processes')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    parser.add_argument('--batch', type=int, default=5, help='Entries per request')
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.tenants.split(',')]
+    print(f"🏁 {args.writers} writers, {args.batch} entries per request, {args.duration:.0f}s per run, "
+          f"{os.cpu_count()} CPUs")
+    print(f"   {'tenants':>7} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'scaling':>8}")
+    baseline = None
+    for tenants in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            user_ids = make_directory(tmp, tenants)
+            samples, errors = drive(tmp, user_ids, args.writers, args.duration, args.batch)
+        summary = results.summarize(samples)
+        writes = len(samples) * args.batch / args.duration
+        baseline = baseline or writes
+        print(f"   {tenants:>7} {writes:9.1f} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} "
+              f"{writes / baseline:7.2f}x")
+        if errors:
+            print(f"      ❌ {len(errors)} failed requests, e.g. status {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Versioned response cache for Finance Tracker
+- data_generation is a single-row counter bumped by triggers on every write to
+  spending_log, personal_log and budget_periods
+- Cache keys combine the database, a payload name, its date window and the
+  generation, so a write invalidates everything computed before it without
+  explicit purges, and tenants on different shards never share entries
+- An in-process LRU sits in front of an optional shared SQLite backend that
+  lets several worker processes reuse each other's results
+- Keys double as ETags, so unchanged payloads are answered with 304
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import Response, current_app, make_response, request
+
+import db
+
+DEFAULT_CACHE_SIZE = 256
+
+GENERATION_TABLES = ('spending_log', 'personal_log', 'budget_periods')
+
+
+def create_generation(conn):
+    """Create the generation counter and the triggers that bump it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_generation (id) VALUES (1)')
+    for table in GENERATION_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_generation_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN UPDATE data_generation SET value = value + 1 WHERE id = 1; END
+            ''')
+
+
+def drop_generation_triggers(conn):
+    """Drop the counter triggers ahead of a bulk load; bump_generation() once afterwards"""
+    for table in GENERATION_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {table}_generation_{event}')
+
+
+def bump_generation(conn):
+    conn.execute('UPDATE data_generation SET value = value + 1 WHERE id = 1')
+
+
+def current_generation(conn):
+    row = conn.execute('SELECT value FROM data_generation WHERE id = 1').fetchone()
+    return row[0] if row else 0
+
+
+class LRUCache:
+    """Thread-safe in-process LRU"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (hit, value)"""
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Cache shared between processes through a separate SQLite file.
+
+    Values are stored as JSON. Entries from older generations are pruned
+    whenever a newer generation is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=1.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                value TEXT NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key, value, generation):
+        payload = json.dumps(value)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute('DELETE FROM cache_entries WHERE generation < ?', (generation,))
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (key, generation, value) VALUES (?, ?, ?)',
+                    (key, generation, payload),
+                )
+        except sqlite3.OperationalError:
+            # Another worker holds the cache file; the local LRU still has the value
+            pass
+
+
+class Cache:
+    """Two-tier cache: local LRU, then the optional shared backend"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, shared=None):
+        self.local = LRUCache(maxsize)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get_or_compute(self, key, generation, compute):
+        hit, value = self.local.get(key)
+        if hit:
+            self._count('hits')
+            return value
+        if self.shared is not None:
+            hit, value = self.shared.get(key)
+            if hit:
+                self._count('shared_hits')
+                self.local.set(key, value)
+                return value
+        self._count('misses')
+        value = compute()
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, generation)
+        return value
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'entries': len(self.local),
+                'shared_backend': self.shared is not None,
+            }
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def init_app(app):
+    app.config.setdefault('CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    app.config.setdefault('CACHE_PATH', None)
+
+    @app.route('/api/cache/stats')
+    def cache_stats():
+        """Hit/miss counters for monitoring"""
+        return get_cache().stats()
+
+
+def get_cache(app=None):
+    """Get (or lazily create) the app's cache"""
+    app = app or current_app
+    cache = app.extensions.get('cache')
+    if cache is None:
+        path = app.config.get('CACHE_PATH')
+        shared = SQLiteCacheBackend(path) if path else None
+        cache = Cache(app.config.get('CACHE_SIZE', DEFAULT_CACHE_SIZE), shared)
+        app.extensions['cache'] = cache
+    return cache
+
+
+def cached_response(conn, name, window, compute, render, revalidate=True):
+    """Serve a payload over a date window from the cache.
+
+    compute() builds the payload on a miss and must return something
+    JSON-serializable; render(payload) turns it into a response. With
+    revalidate, the response carries an ETag and a matching If-None-Match
+    is answered with 304 before anything is computed or rendered.
+    """
+    generation = current_generation(conn)
+    key = ':'.join([db.current_database(), name, *map(str, window), str(generation)])
+    etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    if revalidate and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        payload = get_cache().get_or_compute(key, generation, compute)
+        response = make_response(render(payload))
+    if revalidate:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Spending categories
+- Rules live in the user-editable category_rules table (keyword -> category)
+- Rules are compiled into a single case-insensitive regex and applied once,
+  when a spending entry is written, instead of on every dashboard query
+- A batched backfill classifies rows that predate the rules (or all rows
+  after the rules change)
+
+Usage:
+    python categories.py rules [--db finance_tracker.db]
+    python categories.py add KEYWORD CATEGORY [--priority N]
+    python categories.py backfill [--all] [--batch-size N]
+"""
+
+import argparse
+import re
+import sqlite3
+import threading
+
+DEFAULT_CATEGORY = 'Other'
+
+# Seed rules. Lower priority wins when several keywords match an item.
+DEFAULT_RULES = (
+    ('tim', 'Coffee', 10),
+    ('coffee', 'Coffee', 10),
+    ('gas', 'Gas', 20),
+    ('fuel', 'Gas', 20),
+    ('food', 'Food', 30),
+    ('restaurant', 'Food', 30),
+    ('mcdonald', 'Food', 30),
+    ('domino', 'Food', 30),
+    ('weed', 'Cannabis', 40),
+    ('cannabis', 'Cannabis', 40),
+)
+
+BACKFILL_BATCH_SIZE = 500
+
+
+class Classifier:
+    """Compiled rule set: one regex with a named group per rule"""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self._categories = {}
+        alternatives = []
+        # Alternatives are tried in priority order at each position, and the
+        # lookahead lets overlapping keywords all be seen
+        for index, (keyword, category, priority) in enumerate(self.rules):
+            group = f'r{index}'
+            self._categories[group] = (priority, index, category)
+            alternatives.append(f'(?P<{group}>{re.escape(keyword.lower())})')
+        self._pattern = re.compile(f"(?=(?:{'|'.join(alternatives)}))") if alternatives else None
+
+    def classify(self, item):
+        """Return the category for an item description"""
+        if not item or self._pattern is None:
+            return DEFAULT_CATEGORY
+        best = None
+        for match in self._pattern.finditer(item.lower()):
+            candidate = self._categories[match.lastgroup]
+            if best is None or candidate < best:
+                best = candidate
+        return best[2] if best else DEFAULT_CATEGORY
+
+
+_cache_lock = threading.Lock()
+_cached = None
+
+
+def create_rules(conn):
+    """Create the rules table, seeding it with DEFAULT_RULES when new.
+
+    Returns True if the table was created by this call.
+    """
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'category_rules'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keyword TEXT NOT NULL,
+            category TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 100,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if existed:
+        return False
+    conn.executemany(
+        'INSERT INTO category_rules (keyword, category, priority) VALUES (?, ?, ?)',
+        DEFAULT_RULES,
+    )
+    return True
+
+
+def get_classifier(conn):
+    """Get a compiled classifier for the rules currently in the database.
+
+    The rules table is tiny, so it is re-read on each call; the regex is only
+    recompiled when the rules have actually changed.
+    """
+    global _cached
+    rules = tuple(tuple(row) for row in conn.execute(
+        'SELECT keyword, category, priority FROM category_rules ORDER BY priority, id'
+    ))
+    with _cache_lock:
+        if _cached is None or _cached.rules != rules:
+            _cached = Classifier(rules)
+        return _cached
+
+
+def classify(conn, item):
+    """Classify a single item using the database's rules"""
+    return get_classifier(conn).classify(item)
+
+
+def backfill_categories(conn, reclassify=False, batch_size=BACKFILL_BATCH_SIZE):
+    """Classify spending_log rows in id-ordered batches, committing each batch.
+
+    Only rows without a category are touched unless reclassify is set.
+    Returns the number of rows updated.
+    """
+    classifier = get_classifier(conn)
+    condition = '' if reclassify else 'AND category IS NULL'
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(f'''
+            SELECT id, item, category FROM spending_log
+            WHERE id > ? {condition}
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        changes = []
+        for row_id, item, current in rows:
+            category = classifier.classify(item)
+            if category != current:
+                changes.append((category, row_id))
+        conn.executemany('UPDATE spending_log SET category = ? WHERE id = ?', changes)
+        conn.commit()
+        updated += len(changes)
+        last_id = rows[-1][0]
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage spending categories')
+    parser.add_argument('--db', default='finance_tracker.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rules', help='List the classification rules')
+    add = commands.add_parser('add', help='Add a keyword rule')
+    add.add_argument('keyword')
+    add.add_argument('category')
+    add.add_argument('--priority', type=int, default=100)
+    backfill = commands.add_parser('backfill', help='Classify existing spending entries')
+    backfill.add_argument('--all', action='store_true', help='Reclassify rows that already have a category')
+    backfill.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    create_rules(conn)
+    conn.commit()
+
+    if args.command == 'rules':
+        for keyword, category, priority in get_classifier(conn).rules:
+            print(f"   {priority:>4}  {keyword:<20} → {category}")
+    elif args.command == 'add':
+        conn.execute(
+            'INSERT INTO category_rules (keyword, category, priority) VALUES (?, ?, ?)',
+            (args.keyword, args.category, args.priority),
+        )
+        conn.commit()
+        print(f"✅ Added rule: {args.keyword} → {args.category}")
+        print("   Run `python categories.py backfill --all` to apply it to existing entries")
+    elif args.command == 'backfill':
+        updated = backfill_categories(conn, reclassify=args.all, batch_size=args.batch_size)
+        print(f"✅ Classified {updated} spending entries")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+CSRF protection for Finance Tracker's forms
+- Each session gets a random token; templates put it in a hidden csrf_token
+  field with {{ csrf_field() }}
+- Every POST carrying a form (the page forms, login, register and logout)
+  must echo the token back, or in the X-CSRF-Token header; otherwise it is
+  refused with 400 before the route runs
+- JSON requests (the batch API) are exempt: a browser can't send an
+  application/json body to another site without a CORS preflight, which the
+  app never grants
+- CSRF_ENABLED (default on) lets benchmarks post forms without a session
+"""
+
+import hmac
+import secrets
+
+from flask import abort, current_app, jsonify, request, session
+from markupsafe import Markup, escape
+
+SESSION_KEY = 'csrf_token'
+FIELD = 'csrf_token'
+HEADER = 'X-CSRF-Token'
+
+UNSAFE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def token():
+    """The session's token, created on first use"""
+    value = session.get(SESSION_KEY)
+    if value is None:
+        value = session[SESSION_KEY] = secrets.token_urlsafe(32)
+    return value
+
+
+def field():
+    return Markup(f'<input type="hidden" name="{FIELD}" value="{escape(token())}">')
+
+
+def _check():
+    if request.method not in UNSAFE_METHODS or request.is_json or not current_app.config['CSRF_ENABLED']:
+        return None
+    expected = session.get(SESSION_KEY)
+    sent = request.form.get(FIELD) or request.headers.get(HEADER)
+    if expected and sent and hmac.compare_digest(expected, sent):
+        return None
+    message = 'The form expired or came from another site; reload the page and try again'
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return jsonify({'error': message}), 400
+    abort(400, message)
+
+
+def init_app(app):
+    app.config.setdefault('CSRF_ENABLED', True)
+    app.jinja_env.globals.update(csrf_token=token, csrf_field=field)
+    app.before_request(_check)
@@ -0,0 +1,180 @@
+"""
+Database connection management for Finance Tracker
+- Connections are bound to the Flask app context (g) and reused across a request
+- A bounded, thread-safe pool hands connections out and takes them back on teardown
+- Every connection runs in WAL mode with tuned pragmas and a prepared-statement cache
+- A request can be pointed at another database (a tenant's shard, see tenancy.py)
+  through g.database, g.db_pool and g.db_extensions
+"""
+
+import queue
+import sqlite3
+import threading
+
+from flask import current_app, g, has_request_context
+
+DEFAULT_DATABASE = 'finance_tracker.db'
+DEFAULT_POOL_SIZE = 8
+DEFAULT_POOL_TIMEOUT = 10.0
+
+# Number of compiled statements sqlite3 keeps per connection (default is 128)
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+# Applied to every new connection. auto_vacuum and journal_mode=WAL are
+# persistent in the database file (auto_vacuum only takes on a new file, so it
+# goes first); the rest are per-connection settings.
+PRAGMAS = (
+    ('auto_vacuum', 'INCREMENTAL'),  # free pages are released by maintenance.py
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),       # negative = KiB, so ~16 MB of page cache
+    ('mmap_size', 268435456),     # 256 MB of memory-mapped reads
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('recursive_triggers', 'ON'),  # so INSERT OR REPLACE fires delete triggers too
+    ('journal_size_limit', 67108864),  # WAL is truncated back to 64 MB after a checkpoint
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class PoolClosed(Exception):
+    """Raised when a connection is requested from a pool after close_all()"""
+
+
+def connect(path=DEFAULT_DATABASE, factory=sqlite3.Connection):
+    """Open a tuned connection to the database at path"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=factory,
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+class ConnectionPool:
+    """Bounded pool of connections to a single database file.
+
+    Connections are created lazily up to `size`. When all of them are
+    checked out, acquire() blocks for up to `timeout` seconds.
+    """
+
+    def __init__(self, path=DEFAULT_DATABASE, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT,
+                 factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.factory = factory
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def acquire(self):
+        """Check a connection out of the pool"""
+        if self._closed:
+            raise PoolClosed(f'The connection pool for {self.path} is closed')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return connect(self.path, self.factory)
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f'No free connection to {self.path} after {self.timeout}s')
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction; closes it once the pool is closed"""
+        if conn.in_transaction:
+            conn.rollback()
+        # Under the lock, so close_all() can't drain the queue between the check and the put
+        with self._lock:
+            if not self._closed:
+                self._idle.put_nowait(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        """Close every idle connection now and each checked-out one when it is released.
+
+        The pool can't hand out connections afterwards.
+        """
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def get_pool(app=None):
+    """Get (or lazily create) the connection pool for an app"""
+    app = app or current_app
+    pool = app.extensions.get('db_pool')
+    if pool is None:
+        pool = ConnectionPool(
+            app.config.get('DATABASE', DEFAULT_DATABASE),
+            size=app.config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+            timeout=app.config.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+            factory=app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection),
+        )
+        app.extensions['db_pool'] = pool
+    return pool
+
+
+def current_database(app=None):
+    """Path of the database the current request works on"""
+    if has_request_context() and 'database' in g:
+        return g.database
+    return (app or current_app).config['DATABASE']
+
+
+def database_extensions(app=None):
+    """Where per-database singletons (the trends engine) live for the current request"""
+    if has_request_context() and 'db_extensions' in g:
+        return g.db_extensions
+    return (app or current_app).extensions
+
+
+def get_db():
+    """Get the connection bound to the current app context"""
+    if 'db' not in g:
+        g.db = (g.get('db_pool') or get_pool()).acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    """Hand the app context's connection back to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        (g.get('db_pool') or get_pool()).release(conn)
+
+
+def init_app(app):
+    """Register connection teardown on a Flask app"""
+    app.config.setdefault('DATABASE', DEFAULT_DATABASE)
+    app.config.setdefault('DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+    app.config.setdefault('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,272 @@
+"""
+Spending and personal entry writes for Finance Tracker
+- Shared by the form routes and the JSON batch API
+- validate_*() check a whole batch in one pass and return per-item errors
+- Batches are written inside a single transaction: spending rows one
+  execute() each, so every new row's id comes from its own cursor.lastrowid,
+  personal rows with executemany()
+- The form routes' single-entry writes go through writebehind.write(), which
+  may commit several requests' writes together
+- Idempotency keys store the response of a successful batch, so a retried
+  request replays it instead of writing the rows again
+"""
+
+import hashlib
+import json
+import math
+from datetime import date
+
+import activities
+import categories
+import rollups
+
+MAX_BATCH = 1000
+IDEMPOTENCY_TTL_HOURS = 24
+MAX_ITEM_LENGTH = 200
+
+PERSONAL_FIELDS = ('date',) + rollups.ACTIVITIES + ('notes',)
+
+INSERT_SPENDING = '''
+    INSERT INTO spending_log (date, item, price, category)
+    VALUES (?, ?, ?, ?)
+'''
+
+# An upsert, so the rollup triggers see an UPDATE. Clearing import_hash marks
+# the day as app-owned so re-imports leave it alone.
+UPSERT_PERSONAL = '''
+    INSERT INTO personal_log
+    (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(date) DO UPDATE SET
+        gym = excluded.gym,
+        jiu_jitsu = excluded.jiu_jitsu,
+        skateboarding = excluded.skateboarding,
+        work = excluded.work,
+        coitus = excluded.coitus,
+        sauna = excluded.sauna,
+        supplements = excluded.supplements,
+        notes = excluded.notes,
+        updated_at = excluded.updated_at,
+        import_hash = NULL
+'''
+
+
+class BatchError(Exception):
+    """A batch request that can't be processed; carries the HTTP status and body"""
+
+    def __init__(self, status, body):
+        super().__init__(body.get('error'))
+        self.status = status
+        self.body = body
+
+
+# ------------------------------
+# Validation
+# ------------------------------
+def _date(value, errors):
+    if not isinstance(value, str):
+        errors.append('date is required (YYYY-MM-DD)')
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        errors.append(f'invalid date: {value!r}')
+        return None
+
+
+def _flag(name, value, errors):
+    if value in (True, False, 0, 1, None):
+        return int(bool(value))
+    errors.append(f'{name} must be true or false')
+    return 0
+
+
+def validate_spending(entries):
+    """Return (rows, results); rows is None if any entry is invalid"""
+    rows, results = [], []
+    for index, entry in enumerate(entries):
+        errors = []
+        if not isinstance(entry, dict):
+            results.append({'index': index, 'status': 'invalid', 'errors': ['entry must be an object']})
+            continue
+        unknown = set(entry) - {'date', 'item', 'price'}
+        if unknown:
+            errors.append(f"unknown fields: {', '.join(sorted(unknown))}")
+        day = _date(entry.get('date'), errors)
+        item = entry.get('item')
+        if not isinstance(item, str) or not item.strip():
+            errors.append('item is required')
+        elif len(item) > MAX_ITEM_LENGTH:
+            errors.append(f'item is longer than {MAX_ITEM_LENGTH} characters')
+        price = entry.get('price')
+        if isinstance(price, bool) or not isinstance(price, (int, float)) or not math.isfinite(price) or price <= 0:
+            errors.append('price must be a positive number')
+        if errors:
+            results.append({'index': index, 'status': 'invalid', 'errors': errors})
+        else:
+            rows.append((day, item.strip(), round(float(price), 2)))
+            results.append({'index': index, 'status': 'ok'})
+    return (rows if len(rows) == len(results) else None), results
+
+
+def validate_personal(entries, definitions):
+    """Return (rows, results); rows is None if any entry is invalid.
+
+    definitions are the active activities from activities.load(); rows are
+    (date, *built-in flags, notes, set of checked activity_log-only activities).
+    """
+    custom = [activity['name'] for activity in definitions if not activity['column_name']]
+    rows, results, seen = [], [], set()
+    for index, entry in enumerate(entries):
+        errors = []
+        if not isinstance(entry, dict):
+            results.append({'index': index, 'status': 'invalid', 'errors': ['entry must be an object']})
+            continue
+        unknown = set(entry) - set(PERSONAL_FIELDS) - set(custom)
+        if unknown:
+            errors.append(f"unknown fields: {', '.join(sorted(unknown))}")
+        day = _date(entry.get('date'), errors)
+        if day is not None:
+            if day in seen:
+                errors.append(f'duplicate date in batch: {day}')
+            seen.add(day)
+        flags = [_flag(name, entry.get(name), errors) for name in rollups.ACTIVITIES]
+        checked = {name for name in custom if _flag(name, entry.get(name), errors)}
+        notes = entry.get('notes') or ''
+        if not isinstance(notes, str):
+            errors.append('notes must be a string')
+        if errors:
+            results.append({'index': index, 'status': 'invalid', 'errors': errors})
+        else:
+            rows.append((day, *flags, notes, checked))
+            results.append({'index': index, 'status': 'ok'})
+    return (rows if len(rows) == len(results) else None), results
+
+
+# ------------------------------
+# Writes (the caller commits)
+# ------------------------------
+def insert_spending(conn, rows):
+    """Insert (date, item, price) rows, classifying each item; returns the new ids"""
+    classifier = categories.get_classifier(conn)
+    cursor = conn.cursor()
+    ids = []
+    for day, item, price in rows:
+        # lastrowid is this row's id even though the insert triggers write other tables
+        cursor.execute(INSERT_SPENDING, (day, item, price, classifier.classify(item)))
+        ids.append(cursor.lastrowid)
+    return ids
+
+
+def upsert_personal(conn, rows):
+    """Insert or update (date, *activities, notes) rows"""
+    conn.executemany(UPSERT_PERSONAL, rows)
+
+
+def add_spending(conn, day, item, price):
+    """Insert one spending entry from the form; returns its id"""
+    return insert_spending(conn, [(day, item, price)])[0]
+
+
+def delete_spending(conn, entry_id):
+    conn.execute('DELETE FROM spending_log WHERE id = ?', (entry_id,))
+
+
+def save_personal(conn, day, checked, notes):
+    """Save one day from the personal form; checked holds the names of the ticked activities.
+
+    Hidden activities aren't on the form, so their stored value is kept.
+    """
+    definitions = activities.load(conn)
+    shown = {activity['name'] for activity in definitions}
+    checked = checked & shown
+    existing = conn.execute('SELECT * FROM personal_log WHERE date = ?', (day,)).fetchone()
+    flags = [int(name in checked) if name in shown else (existing[name] if existing else 0)
+             for name in rollups.ACTIVITIES]
+    conn.execute(UPSERT_PERSONAL, (day, *flags, notes))
+    activities.save_custom(conn, day, checked, definitions)
+
+
+# ------------------------------
+# Idempotency keys
+# ------------------------------
+def create_idempotency_keys(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            request_hash TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            response TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (endpoint, key)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at)')
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def run_batch(conn, endpoint, key, payload, validate, write):
+    """Validate and write one batch atomically; returns (status, body, replayed).
+
+    payload is the decoded JSON body: a list of entries or {"entries": [...]}.
+    write(conn, rows, results) performs the writes and fills in the results.
+    """
+    entries = payload.get('entries') if isinstance(payload, dict) else payload
+    if not isinstance(entries, list) or not entries:
+        raise BatchError(400, {'error': 'expected a non-empty JSON array of entries (or {"entries": [...]})'})
+    if len(entries) > MAX_BATCH:
+        raise BatchError(413, {'error': f'at most {MAX_BATCH} entries per batch'})
+
+    rows, results = validate(entries)
+    if rows is None:
+        raise BatchError(422, {'error': 'validation failed; nothing was written', 'results': results})
+
+    digest = request_hash(entries)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if key:
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                (f'-{IDEMPOTENCY_TTL_HOURS} hours',),
+            )
+            stored = conn.execute(
+                'SELECT request_hash, status, response FROM idempotency_keys WHERE endpoint = ? AND key = ?',
+                (endpoint, key),
+            ).fetchone()
+            if stored is not None:
+                conn.rollback()
+                if stored['request_hash'] != digest:
+                    raise BatchError(422, {'error': 'Idempotency-Key was already used with a different request'})
+                return stored['status'], json.loads(stored['response']), True
+
+        write(conn, rows, results)
+        body = {'count': len(results), 'results': results}
+        if key:
+            conn.execute(
+                'INSERT INTO idempotency_keys (endpoint, key, request_hash, status, response) VALUES (?, ?, ?, ?, ?)',
+                (endpoint, key, digest, 201, json.dumps(body)),
+            )
+        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    return 201, body, False
+
+
+def write_spending(conn, rows, results):
+    for result, entry_id in zip(results, insert_spending(conn, rows)):
+        result.update(status='created', id=entry_id)
+
+
+def write_personal(conn, rows, results):
+    upsert_personal(conn, [row[:-1] for row in rows])
+    definitions = activities.load(conn)
+    for row in rows:
+        activities.save_custom(conn, row[0], row[-1], definitions)
+    for result, row in zip(results, rows):
+        result.update(status='saved', date=row[0].isoformat())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Streaming export for Finance Tracker
+- Exports spending_log or personal_log (optionally a date range) as CSV,
+  NDJSON or Parquet
+- Personal exports add a 0/1 column for each active activity that lives only
+  in activity_log (activities added after the personal_log columns)
+- Rows are read from one cursor in fixed-size chunks and each chunk is
+  encoded and handed on before the next is read, so memory use doesn't grow
+  with the table
+- Parquet goes through pandas and pyarrow (in requirements.txt); each chunk
+  becomes one row group. Without pyarrow, parquet requests raise ExportError
+
+Usage: python export.py spending --format csv [--start 2024-01-01] [--end 2024-12-31]
+                        [--db finance_tracker.db] [--out spending.csv]
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import sys
+from datetime import date
+
+import activities
+import db
+import rollups
+
+CHUNK_SIZE = 5000
+
+TABLES = {
+    'spending': ('spending_log', ('id', 'date', 'item', 'price', 'category', 'created_at', 'updated_at')),
+    'personal': ('personal_log', ('id', 'date') + rollups.ACTIVITIES + ('notes', 'created_at', 'updated_at')),
+}
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class ExportError(ValueError):
+    """Bad export arguments, or a format whose dependency is missing"""
+
+
+def parse_range(start, end):
+    try:
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise ExportError('start and end must be YYYY-MM-DD dates')
+    if start and end and start > end:
+        raise ExportError('start must not be after end')
+    return start, end
+
+
+def select_columns(conn, table):
+    """[(column, SQL expression)] for one export, custom activities included"""
+    name, columns = TABLES[table]
+    selected = [(column, column) for column in columns]
+    if table == 'personal':
+        custom = [(activity['name'], 'EXISTS (SELECT 1 FROM activity_log a WHERE a.date = personal_log.date '
+                                     f"AND a.activity_id = {int(activity['id'])})")
+                  for activity in activities.load(conn) if not activity['column_name']]
+        # Next to the built-in activities, ahead of notes and the timestamps
+        selected[-3:-3] = custom
+    return selected
+
+
+def iter_chunks(conn, table, selected, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of row tuples in (date, id) order"""
+    name = TABLES[table][0]
+    expressions = ', '.join(expression if expression == column else f'{expression} AS "{column}"'
+                            for column, expression in selected)
+    sql = f'SELECT {expressions} FROM {name} WHERE date >= ? AND date <= ? ORDER BY date, id'
+    cursor = conn.execute(sql, (start.isoformat() if start else '', end.isoformat() if end else '9999-12-31'))
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        cursor.close()
+
+
+def write_csv(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def write_ndjson(chunks, columns):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows).encode()
+
+
+class _Sink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def parquet_schema(table, columns):
+    import pyarrow as pa
+
+    types = {'id': pa.int64(), 'date': pa.date32(), 'price': pa.float64()}
+    if table == 'personal':
+        # Every column between date and notes is a 0/1 activity flag
+        types.update({column: pa.int8() for column in columns[2:-3]})
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def write_parquet(chunks, columns, table):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(table, columns)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in chunks:
+            frame = pd.DataFrame.from_records(rows, columns=columns)
+            frame['date'] = pd.to_datetime(frame['date']).dt.date
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(conn, table, fmt, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Generator of encoded byte chunks for one export"""
+    if table not in TABLES:
+        raise ExportError(f"table must be one of: {', '.join(TABLES)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+    # Fail before streaming starts if pyarrow is missing
+    if fmt == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise ExportError('Parquet export needs pyarrow: pip install pyarrow')
+
+    selected = select_columns(conn, table)
+    columns = [column for column, _ in selected]
+    chunks = iter_chunks(conn, table, selected, start, end, chunk_size)
+    if fmt == 'csv':
+        return write_csv(chunks, columns)
+    if fmt == 'ndjson':
+        return write_ndjson(chunks, columns)
+    return write_parquet(chunks, columns, table)
+
+
+def filename(table, fmt, start=None, end=None):
+    span = f"_{start or 'start'}_{end or 'end'}" if start or end else ''
+    return f'{table}{span}.{FORMATS[fmt][1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('table', choices=list(TABLES))
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--start', help='First date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Last date (YYYY-MM-DD)')
+    parser.add_argument('--db', default=db.DEFAULT_DATABASE)
+    parser.add_argument('--out', default='-', help='Output file (default: stdout)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    try:
+        start, end = parse_range(args.start, args.end)
+        conn = db.connect(args.db)
+        # A single pass over the table gains nothing from mmap, and mapped
+        # pages would count the whole file against this process's RSS
+        conn.execute('PRAGMA mmap_size=0')
+        chunks = export(conn, args.table, args.format, start, end, args.chunk_size)
+        out = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+        with out:
+            for data in chunks:
+                out.write(data)
+        conn.close()
+    except ExportError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for Finance Tracker
+- Several worker processes, each with a few threads (gthread)
+- preload_app imports wsgi.py once in the master, so migrations and schema
+  checks run before any worker forks; each worker then opens its own
+  database pool and cache handles and starts a maintenance scheduler
+  (maintenance.py; the workers share one job log, so jobs run once)
+- SIGHUP gracefully replaces workers; max_requests recycles them periodically
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+Environment: FINANCE_BIND, FINANCE_WORKERS, FINANCE_THREADS, FINANCE_MAINTENANCE, FINANCE_BACKUP_DIR,
+             FINANCE_WRITE_BEHIND
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('FINANCE_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('FINANCE_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('FINANCE_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Give each worker its own SQLite handles, with a pool big enough for its threads, and a maintenance scheduler"""
+    import db
+    import maintenance
+    import wsgi
+    from app import reset_after_fork
+
+    reset_after_fork(wsgi.app)
+    wsgi.app.config['DB_POOL_SIZE'] = max(threads, db.DEFAULT_POOL_SIZE)
+    maintenance.start(wsgi.app)
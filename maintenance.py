@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Background database maintenance for Finance Tracker
+- A scheduler thread next to the app runs each job once its interval has
+  passed, and only while the process has served no request for IDLE_SECONDS:
+    checkpoint  WAL checkpoint (PASSIVE, never blocks readers or writers)
+    analyze     planner statistics (ANALYZE, sampling ANALYSIS_LIMIT rows per index)
+    vacuum      returns free pages to the filesystem in VACUUM_STEP_PAGES steps
+                (needs auto_vacuum=INCREMENTAL: new databases have it, older
+                ones are switched once with `python maintenance.py auto-vacuum`)
+    backup      hot copy through the sqlite3 backup API, BACKUP_STEP_PAGES at a
+                time from one read snapshot, pausing while requests are in flight;
+                the latest BACKUP_KEEP copies are kept
+- maintenance_jobs records each job's last run; a run is claimed with a single
+  UPDATE, so with several gunicorn workers each job still runs once per interval
+- In multi-tenant mode (tenancy.py) tenants.db and every shard are maintained,
+  each opened only when one of its jobs is due
+- Job timings: GET /api/maintenance and finance_maintenance_duration_seconds on /metrics
+
+Usage: python maintenance.py status [--db finance_tracker.db]
+       python maintenance.py run [checkpoint analyze vacuum backup] [--db ...] [--backup-dir backups]
+       python maintenance.py auto-vacuum [--db ...]   # one full VACUUM; stop the app first
+"""
+
+import argparse
+import glob
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g
+
+import db
+import metrics
+
+# Seconds between runs of each job
+INTERVALS = {
+    'checkpoint': 5 * 60,
+    'analyze': 60 * 60,
+    'vacuum': 60 * 60,
+    'backup': 24 * 60 * 60,
+}
+
+# The scheduler looks for due jobs every TICK_SECONDS, and runs them once the
+# process has been without requests for IDLE_SECONDS
+TICK_SECONDS = 5.0
+IDLE_SECONDS = 5.0
+
+# Rows sampled per index by ANALYZE; enough for the planner, milliseconds on millions of rows
+ANALYSIS_LIMIT = 1000
+# Tables whose size swings between runs (the trends change journal goes from
+# empty to trends.JOURNAL_SIZE rows); they keep the planner's defaults
+VOLATILE_TABLES = ('trend_changes',)
+
+INCREMENTAL = 2  # PRAGMA auto_vacuum value
+VACUUM_MIN_FREE_PAGES = 256
+VACUUM_STEP_PAGES = 512
+
+BACKUP_STEP_PAGES = 1024   # 4 MB at the default page size
+BACKUP_STEP_SLEEP = 0.005
+# Longest a backup step waits for in-flight requests before copying anyway
+BACKUP_MAX_WAIT = 1.0
+BACKUP_KEEP = 7
+
+log = logging.getLogger('finance')
+
+
+# ------------------------------
+# Schema
+# ------------------------------
+def create_maintenance(conn):
+    """Job bookkeeping table (migration step)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_jobs (
+            job TEXT PRIMARY KEY,
+            claimed_at REAL,
+            finished_at REAL,
+            duration_ms REAL,
+            status TEXT,
+            detail TEXT,
+            runs INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def enable_incremental_vacuum(conn, path):
+    """Switch an older database to auto_vacuum=INCREMENTAL; returns False if it already was.
+
+    New databases get it from db.PRAGMAS. An existing file only changes with
+    a full VACUUM, which rewrites the whole database under an exclusive lock
+    and needs room for a copy of it, so this is a command rather than a
+    migration step or a scheduled job.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == INCREMENTAL:
+        return False
+    needed = os.path.getsize(path)
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(path))).free
+    if free < needed:
+        raise RuntimeError(f'VACUUM needs about {needed / 1024 / 1024:.0f} MB free next to {path}, '
+                           f'only {free / 1024 / 1024:.0f} MB available')
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+# ------------------------------
+# Jobs
+# ------------------------------
+# Each job takes a connection and an idle() callable and returns (status, detail)
+def checkpoint(conn, idle):
+    """Copy WAL frames into the database without waiting on anyone"""
+    busy, frames, copied = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    if frames < 0:
+        return 'skipped', 'not in WAL mode'
+    detail = f'{copied}/{frames} frames checkpointed'
+    return 'ok', detail + (', readers still on older frames' if copied < frames else '')
+
+
+def analyze(conn, idle=None):
+    """Refresh sqlite_stat1 for every table that has rows.
+
+    Empty and volatile tables lose their statistics instead: "0 rows" would
+    make the planner scan them however much they grow before the next run.
+    """
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    tables = [row[0] for row in conn.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL TABLE%'
+    ''')]
+    analyzed, empty = [], []
+    for table in tables:
+        if table not in VOLATILE_TABLES and conn.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone():
+            analyzed.append(table)
+        else:
+            empty.append(table)
+    # Stale rows go first: ANALYZE is what makes other connections reload statistics
+    if empty and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute(f"DELETE FROM sqlite_stat1 WHERE tbl IN ({', '.join('?' * len(empty))})", empty)
+        conn.commit()
+    for table in analyzed:
+        conn.execute(f'ANALYZE "{table}"')
+    conn.commit()
+    return 'ok', f'{len(analyzed)} tables analyzed, {len(empty)} empty or volatile'
+
+
+def free_pages(conn):
+    return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def vacuum(conn, idle):
+    """Release free pages a step at a time, stopping as soon as requests arrive"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL:
+        return 'skipped', 'auto_vacuum is not INCREMENTAL (python maintenance.py auto-vacuum)'
+    free = before = free_pages(conn)
+    if free < VACUUM_MIN_FREE_PAGES:
+        return 'skipped', f'{free} free pages'
+    while free and idle():
+        # Each fetched row is one page moved; the pragma is its own short write transaction
+        conn.execute(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})').fetchall()
+        conn.commit()
+        free = free_pages(conn)
+    return 'ok', f'{before - free} pages released, {free} still free'
+
+
+def backup(conn, idle, directory, keep=BACKUP_KEEP):
+    """Copy the live database into directory and drop all but the newest `keep` copies.
+
+    The copy is read from one snapshot (an open read transaction), so writes
+    during the backup neither restart it nor end up half in it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    source = conn.execute('PRAGMA database_list').fetchone()['file']
+    stem = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(directory, f'{stem}-{datetime.now():%Y%m%d-%H%M%S}.db')
+    partial = path + '.partial'
+
+    def pause(_status, _remaining, _total):
+        waited = 0.0
+        time.sleep(BACKUP_STEP_SLEEP)
+        while not idle() and waited < BACKUP_MAX_WAIT:
+            time.sleep(0.05)
+            waited += 0.05
+
+    target = sqlite3.connect(partial)
+    try:
+        conn.execute('BEGIN')
+        try:
+            conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            conn.backup(target, pages=BACKUP_STEP_PAGES, progress=pause)
+        finally:
+            conn.rollback()
+        pages = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+    os.replace(partial, path)
+
+    copies = sorted(glob.glob(os.path.join(directory, f'{stem}-*.db')))
+    for old in copies[:-keep]:
+        os.remove(old)
+    return 'ok', f'{os.path.basename(path)} ({pages} pages)'
+
+
+JOBS = {
+    'checkpoint': checkpoint,
+    'analyze': analyze,
+    'vacuum': vacuum,
+    'backup': backup,
+}
+
+
+# ------------------------------
+# Bookkeeping
+# ------------------------------
+def claim(conn, job, interval, now):
+    """Mark job as started if it is due; False if it isn't or another process got it first"""
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO maintenance_jobs (job) VALUES (?)', (job,))
+        return conn.execute('''
+            UPDATE maintenance_jobs SET claimed_at = ?
+            WHERE job = ? AND IFNULL(claimed_at, 0) <= ?
+        ''', (now, job, now - interval)).rowcount == 1
+
+
+def due_jobs(conn, intervals, now):
+    claimed = dict(conn.execute('SELECT job, claimed_at FROM maintenance_jobs').fetchall())
+    return [job for job in JOBS if job in intervals and (claimed.get(job) or 0) <= now - intervals[job]]
+
+
+def run_job(conn, job, idle, backup_dir):
+    """Run one job, record the outcome and its timing; returns (status, detail)"""
+    started = time.perf_counter()
+    try:
+        if job == 'backup':
+            status, detail = backup(conn, idle, backup_dir)
+        else:
+            status, detail = JOBS[job](conn, idle)
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        status, detail = 'error', f'{type(e).__name__}: {e}'
+        log.exception('maintenance_failed job=%s', job)
+    seconds = time.perf_counter() - started
+
+    metrics.MAINTENANCE_SECONDS.observe((job, status), seconds)
+    log.info('maintenance job=%s status=%s duration_ms=%.1f detail="%s"', job, status, seconds * 1000, detail)
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO maintenance_jobs (job) VALUES (?)', (job,))
+        conn.execute('''
+            UPDATE maintenance_jobs
+            SET finished_at = ?, duration_ms = ?, status = ?, detail = ?, runs = runs + 1
+            WHERE job = ?
+        ''', (time.time(), seconds * 1000, status, detail, job))
+    return status, detail
+
+
+def job_status(conn, intervals=INTERVALS):
+    """Last run of every job and when it is next due (unix times)"""
+    rows = {row['job']: dict(row) for row in conn.execute('SELECT * FROM maintenance_jobs')}
+    status = []
+    for job in JOBS:
+        row = rows.get(job, {'job': job, 'claimed_at': None, 'finished_at': None, 'duration_ms': None,
+                             'status': None, 'detail': None, 'runs': 0})
+        interval = intervals.get(job)
+        row['interval_seconds'] = interval
+        row['next_due'] = (row['claimed_at'] or 0) + interval if interval else None
+        status.append(row)
+    return status
+
+
+def default_backup_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), 'backups')
+
+
+# ------------------------------
+# Scheduler
+# ------------------------------
+class Scheduler:
+    """Thread that runs due jobs while the process is idle.
+
+    databases() lists the files to look after (one, or tenants.db and every
+    shard); a database is only opened when one of its jobs is due. The app
+    reports requests through request_started()/request_finished(); idle() is
+    what jobs check between steps.
+    """
+
+    def __init__(self, databases, backup_dir=None, intervals=None, idle_seconds=IDLE_SECONDS, tick=TICK_SECONDS):
+        self.databases = databases
+        self.backup_dir = backup_dir
+        self.intervals = dict(INTERVALS if intervals is None else intervals)
+        self.idle_seconds = idle_seconds
+        self.tick = tick
+        self._next_due = {}
+        self._active = 0
+        self._last_request = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def request_started(self):
+        with self._lock:
+            self._active += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._active -= 1
+            self._last_request = time.monotonic()
+
+    def idle(self):
+        with self._lock:
+            return (not self._stop.is_set() and self._active == 0
+                    and time.monotonic() - self._last_request >= self.idle_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='finance-maintenance', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_due(self, conn, path):
+        """Run every due job this process manages to claim, while it stays idle"""
+        now = time.time()
+        for job in due_jobs(conn, self.intervals, now):
+            if not self.idle():
+                break
+            if claim(conn, job, self.intervals[job], now):
+                run_job(conn, job, self.idle, self.backup_dir or default_backup_dir(path))
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            if not self.idle():
+                continue
+            try:
+                paths = self.databases()
+            except Exception:
+                log.exception('maintenance_scheduler_failed')
+                continue
+            for path in paths:
+                if not self.idle():
+                    break
+                if self._next_due.get(path, 0) > time.time():
+                    continue
+                conn = None
+                try:
+                    conn = db.connect(path)
+                    self.run_due(conn, path)
+                    # Whoever ran them (this or another worker), the log says when they're due next
+                    claimed = dict(conn.execute('SELECT job, claimed_at FROM maintenance_jobs').fetchall())
+                    self._next_due[path] = min((claimed.get(job) or 0) + interval
+                                               for job, interval in self.intervals.items())
+                except Exception:
+                    log.exception('maintenance_scheduler_failed database=%s', path)
+                    self._next_due[path] = time.time() + self.tick * 12
+                finally:
+                    if conn is not None:
+                        conn.close()
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def _request_started():
+    scheduler = current_app.extensions.get('maintenance')
+    if scheduler is not None:
+        scheduler.request_started()
+        g.maintenance = scheduler
+
+
+def _request_finished(exception=None):
+    scheduler = g.pop('maintenance', None)
+    if scheduler is not None:
+        scheduler.request_finished()
+
+
+def init_app(app):
+    """Track requests for the scheduler and serve /api/maintenance"""
+    app.config.setdefault('MAINTENANCE_ENABLED', os.environ.get('FINANCE_MAINTENANCE', '1') != '0')
+    app.config.setdefault('MAINTENANCE_BACKUP_DIR', os.environ.get('FINANCE_BACKUP_DIR'))
+    app.config.setdefault('MAINTENANCE_INTERVALS', dict(INTERVALS))
+    app.before_request(_request_started)
+    app.teardown_request(_request_finished)
+
+    @app.route('/api/maintenance')
+    def maintenance_status():
+        """Last run, timing and next due time of each maintenance job"""
+        scheduler = app.extensions.get('maintenance')
+        return {
+            'scheduler_running': scheduler is not None and scheduler.is_alive(),
+            'jobs': job_status(db.get_db(), app.config['MAINTENANCE_INTERVALS']),
+        }
+
+
+def start(app):
+    """Start this process's scheduler (call after forking); None when disabled"""
+    if not app.config['MAINTENANCE_ENABLED']:
+        return None
+    databases = app.config.get('MAINTENANCE_DATABASES') or (lambda: [app.config['DATABASE']])
+    scheduler = Scheduler(
+        databases,
+        backup_dir=app.config['MAINTENANCE_BACKUP_DIR'],
+        intervals=app.config['MAINTENANCE_INTERVALS'],
+    )
+    app.extensions['maintenance'] = scheduler
+    return scheduler.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=db.DEFAULT_DATABASE)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Show the last run of each job')
+    run_parser = sub.add_parser('run', help='Run jobs now, whether or not they are due')
+    run_parser.add_argument('jobs', nargs='*', help=f"Any of: {', '.join(JOBS)} (default: all)")
+    run_parser.add_argument('--backup-dir', help='Default: backups/ next to the database')
+    sub.add_parser('auto-vacuum', help='Switch an older database to incremental auto-vacuum (one full VACUUM)')
+    args = parser.parse_args()
+    unknown = set(getattr(args, 'jobs', ())) - set(JOBS)
+    if unknown:
+        parser.error(f"unknown job(s): {', '.join(sorted(unknown))}")
+
+    conn = db.connect(args.db)
+    if args.command == 'auto-vacuum':
+        start = time.perf_counter()
+        try:
+            switched = enable_incremental_vacuum(conn, args.db)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        finally:
+            conn.close()
+        if switched:
+            print(f"✅ {args.db} now uses incremental auto-vacuum ({time.perf_counter() - start:.1f}s)")
+        else:
+            print(f"⏭️  {args.db} already uses incremental auto-vacuum")
+        return
+    if args.command == 'run':
+        backup_dir = args.backup_dir or default_backup_dir(args.db)
+        for job in args.jobs or JOBS:
+            claim(conn, job, 0, time.time())
+            status, detail = run_job(conn, job, lambda: True, backup_dir)
+            icon = {'ok': '✅', 'skipped': '⏭️ '}.get(status, '❌')
+            print(f"{icon} {job}: {detail}")
+    else:
+        for row in job_status(conn):
+            if row['finished_at'] is None:
+                print(f"   {row['job']:<11} never run")
+                continue
+            finished = datetime.fromtimestamp(row['finished_at']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"   {row['job']:<11} {row['status']:<8} {finished} {row['duration_ms']:9.1f} ms  {row['detail']}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""
+Request and SQL instrumentation for Finance Tracker
+- InstrumentedConnection hands out cursors that time every statement from
+  execute() until its rows are consumed and count the rows
+- Statement series are keyed by the normalized statement (literals become ?
+  and placeholder lists collapse to one), capped at MAX_STATEMENTS labels so
+  /metrics stays small; later statements share the "other" series
+- before/after request hooks time every route
+- /metrics serves both as Prometheus histograms, plus the response cache counters
+- Statements slower than SLOW_QUERY_MS are logged to "finance.sql" with the
+  function that issued them (off by default; the call site is only looked up
+  while the log is on)
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, request
+
+import cache
+
+log = logging.getLogger('finance.sql')
+
+# Route latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Coarser statement buckets: there is one histogram per statement
+QUERY_BUCKETS = (0.0005, 0.0025, 0.01, 0.05, 0.25, 1.0, 5.0)
+
+# Statement labels are truncated (with a digest of the whole statement) so one
+# long query can't bloat the exposition, and capped in number
+STATEMENT_LABEL_LENGTH = 60
+MAX_STATEMENTS = 50
+OTHER = 'other'
+LABEL_CACHE_SIZE = 1024
+
+# Literals become ?, and parenthesized placeholder lists such as IN (?, ?, ?) become (?)
+LITERALS = re.compile(r"'[^']*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# Modules whose frames are skipped when looking for a statement's call site
+INTERNAL_MODULES = ('metrics', 'sqlite3')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _bounded(known, values, max_series, labels):
+    """values, or the all-"other" key once max_series distinct keys exist"""
+    if max_series is None or values in known or len(known) < max_series:
+        return values
+    return (OTHER,) * len(labels)
+
+
+class Histogram:
+    """Prometheus-style histogram keyed by a tuple of label values, with at most max_series keys (plus "other")"""
+
+    def __init__(self, name, description, labels, buckets=BUCKETS, max_series=None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values, amount):
+        with self._lock:
+            values = _bounded(self._series, values, self.max_series, self.labels)
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    counts[index] += 1
+            series[1] += 1
+            series[2] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, (counts, count, total) in series:
+            labels = _labels(self.labels, values)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Prometheus-style counter keyed by a tuple of label values, with at most max_series keys (plus "other")"""
+
+    def __init__(self, name, description, labels, max_series=None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.max_series = max_series
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, values, amount=1):
+        with self._lock:
+            self._values[_bounded(self._values, values, self.max_series, self.labels)] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    'finance_request_duration_seconds', 'Time spent handling a request',
+    ('route', 'method', 'status'),
+)
+QUERY_SECONDS = Histogram(
+    'finance_query_duration_seconds', 'Time from execute() until a statement\'s rows were consumed',
+    ('statement',), QUERY_BUCKETS, MAX_STATEMENTS,
+)
+QUERY_ROWS = Counter(
+    'finance_query_rows_total', 'Rows returned (or changed) by statements',
+    ('statement',), MAX_STATEMENTS,
+)
+# Maintenance jobs take from milliseconds (checkpoints) to minutes (backups)
+MAINTENANCE_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0, 300.0, 1800.0)
+MAINTENANCE_SECONDS = Histogram(
+    'finance_maintenance_duration_seconds', 'Time spent running a background maintenance job',
+    ('job', 'status'), MAINTENANCE_BUCKETS,
+)
+# Writes committed together by the write-behind queue
+WRITE_GROUP_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WRITE_GROUP_SIZE = Histogram(
+    'finance_write_group_size', 'Writes per write-behind group commit',
+    ('status',), WRITE_GROUP_BUCKETS,
+)
+METRICS = (REQUEST_SECONDS, QUERY_SECONDS, QUERY_ROWS, MAINTENANCE_SECONDS, WRITE_GROUP_SIZE)
+
+# Slow-query threshold in milliseconds; None disables the log
+slow_query_ms = None
+
+
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE)
+def statement_label(sql):
+    """The normalized statement, truncated with a digest of the whole of it when long"""
+    normalized = PLACEHOLDER_LISTS.sub('(?)', LITERALS.sub('?', ' '.join(sql.split())))
+    if len(normalized) <= STATEMENT_LABEL_LENGTH:
+        return normalized
+    digest = hashlib.sha1(normalized.encode()).hexdigest()[:6]
+    return f'{normalized[:STATEMENT_LABEL_LENGTH]}… [{digest}]'
+
+
+def call_site():
+    """(module.function, line) of the nearest caller outside the sqlite3 layer"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.split('.')[0] not in INTERNAL_MODULES:
+            return f'{module}.{frame.f_code.co_name}', frame.f_lineno
+        frame = frame.f_back
+    return 'unknown', 0
+
+
+def record_statement(sql, site, seconds, rows):
+    labels = (statement_label(sql),)
+    QUERY_SECONDS.observe(labels, seconds)
+    QUERY_ROWS.inc(labels, rows)
+    if slow_query_ms is not None and seconds * 1000 >= slow_query_ms:
+        site, line = site or ('unknown', 0)
+        log.warning('slow_query duration_ms=%.1f rows=%d site=%s:%d sql="%s"',
+                    seconds * 1000, rows, site, line, ' '.join(sql.split()))
+
+
+def _site():
+    """The caller of execute(), only while the slow-query log is on; walking the stack isn't free"""
+    return call_site() if slow_query_ms is not None else None
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement once its rows are consumed.
+
+    A statement is finished when a fetch runs dry, when the cursor executes
+    something else, or when it is closed or garbage collected.
+    """
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        site = _site()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, site, time.perf_counter() - start, 0]
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        site = _site()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending = [sql, site, time.perf_counter() - start, 0]
+            self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - start, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(time.perf_counter() - start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(time.perf_counter() - start, 0, True)
+            raise
+        self._fetched(time.perf_counter() - start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _fetched(self, seconds, rows, exhausted):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += seconds
+            pending[3] += rows
+            if exhausted:
+                self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, site, seconds, rows = pending
+            if not rows and self.rowcount > 0:
+                rows = self.rowcount  # INSERT/UPDATE/DELETE
+            record_statement(sql, site, seconds, rows)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including execute() shortcuts, are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe((route, request.method, str(response.status_code)),
+                                time.perf_counter() - started)
+    return response
+
+
+def init_app(app):
+    """Instrument pooled connections and routes, and serve /metrics"""
+    global slow_query_ms
+
+    app.config.setdefault('METRICS_ENABLED', True)
+    threshold = os.environ.get('FINANCE_SLOW_QUERY_MS')
+    app.config.setdefault('SLOW_QUERY_MS', float(threshold) if threshold else None)
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+
+    if app.config['METRICS_ENABLED']:
+        app.config['DB_CONNECTION_FACTORY'] = InstrumentedConnection
+        app.before_request(_start_timer)
+        app.after_request(_record_request)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        body = render()
+        stats = cache.get_cache(app).stats()
+        for counter in ('hits', 'shared_hits', 'misses'):
+            body += (f'# TYPE finance_cache_{counter}_total counter\n'
+                     f'finance_cache_{counter}_total {stats[counter]}\n')
+        return Response(body, mimetype='text/plain; version=0.0.4')
@@ -4,16 +4,42 @@ All-in-One Migration Script for Finance Tracker
 - Installs dependencies if missing
 - Imports both Personal Log.xlsx and Spending.xlsx
 - Sets up database and budget periods
+- Streams workbooks in openpyxl's read-only mode: rows are parsed lazily, only
+  the cells an import uses are read, and records are inserted in batches, so
+  memory stays flat however large the workbooks grow
 """
 
+import argparse
+import hashlib
 import subprocess
 import sys
 import os
 import sqlite3
+import time
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from openpyxl import load_workbook
+from datetime import date, datetime, timedelta
 import re
 
+import activities
+import cache
+import categories
+import migrations
+import periods
+import rollups
+import search
+import trends
+
+DATABASE = 'finance_tracker.db'
+PERSONAL_WORKBOOK = 'Personal Log.xlsx'
+SPENDING_WORKBOOK = "Spending.xlsx"
+
+# Rows handed to executemany per write while streaming sheets into the database
+WRITE_BATCH_SIZE = 1000
+
 # ------------------------------
 # Dependency Installer
 # ------------------------------
@@ -36,11 +62,11 @@ def check_files():
     """Check if Excel files exist"""
     files_missing = []
     
-    if not os.path.exists("Personal Log.xlsx"):
-        files_missing.append("Personal Log.xlsx")
+    if not os.path.exists(PERSONAL_WORKBOOK):
+        files_missing.append(PERSONAL_WORKBOOK)
     
-    if not os.path.exists("Spending.xlsx"):
-        files_missing.append("Spending.xlsx")
+    if not os.path.exists(SPENDING_WORKBOOK):
+        files_missing.append(SPENDING_WORKBOOK)
     
     if files_missing:
         print("❌ Missing Excel files:")
@@ -56,96 +82,247 @@ def check_files():
 # Database Setup
 # ------------------------------
 def setup_database():
-    conn = sqlite3.connect('finance_tracker.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS personal_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE UNIQUE NOT NULL,
-            gym BOOLEAN DEFAULT 0,
-            jiu_jitsu BOOLEAN DEFAULT 0,
-            skateboarding BOOLEAN DEFAULT 0,
-            work BOOLEAN DEFAULT 0,
-            coitus BOOLEAN DEFAULT 0,
-            sauna BOOLEAN DEFAULT 0,
-            supplements BOOLEAN DEFAULT 0,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS spending_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date DATE NOT NULL,
-            item TEXT NOT NULL,
-            price DECIMAL(10,2) NOT NULL,
-            category TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS budget_periods (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start_date DATE NOT NULL,
-            end_date DATE NOT NULL,
-            budget_amount DECIMAL(10,2) DEFAULT 500.00,
-            is_current BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
+    conn = sqlite3.connect(DATABASE)
+    migrations.migrate(conn)
     conn.close()
     print("✅ Database setup complete")
 
+@contextmanager
+def bulk_load(conn):
+    """Run an import as one transaction, deferring index and rollup upkeep.
+
+    Secondary indexes, rollup triggers, cache generation triggers, trends
+    journal triggers, activity mirror triggers and search index triggers are
+    dropped for the load and rebuilt once at the end. The caller commits (or
+    rolls back for a dry run).
+    """
+    conn.execute('BEGIN')
+    try:
+        rollups.drop_triggers(conn)
+        cache.drop_generation_triggers(conn)
+        trends.drop_journal_triggers(conn)
+        activities.drop_triggers(conn)
+        search.drop_triggers(conn)
+        migrations.drop_date_indexes(conn)
+        search.drop_indexes(conn)
+        yield conn
+        print("\n🧮 Rebuilding indexes and dashboard rollups...")
+        migrations.create_date_indexes(conn)
+        search.create_indexes(conn)
+        rollups.create_triggers(conn)
+        rollups.rebuild_rollups(conn)
+        activities.rebuild(conn)
+        activities.create_triggers(conn)
+        search.rebuild(conn)
+        search.create_triggers(conn)
+        cache.create_generation(conn)
+        cache.bump_generation(conn)
+        trends.create_journal_triggers(conn)
+        trends.mark_reset(conn)
+    except Exception:
+        conn.rollback()
+        raise
+
+@contextmanager
+def sync_transaction(conn):
+    """Transaction for an incremental sync; row triggers keep rollups current.
+
+    BEGIN IMMEDIATE takes the write lock up front, so rows read to decide what
+    changed can't be modified by the app before the sync writes.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+
+# ------------------------------
+# Import Fingerprints
+# ------------------------------
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_fingerprint(values):
+    return hashlib.sha256(repr(values).encode()).hexdigest()[:16]
+
+def get_fingerprint(conn, source, key):
+    row = conn.execute('SELECT fingerprint FROM import_state WHERE source = ? AND key = ?', (source, key)).fetchone()
+    return row[0] if row else None
+
+def set_fingerprint(conn, source, key, fingerprint):
+    conn.execute('''
+        INSERT INTO import_state (source, key, fingerprint) VALUES (?, ?, ?)
+        ON CONFLICT(source, key) DO UPDATE SET
+            fingerprint = excluded.fingerprint,
+            imported_at = CURRENT_TIMESTAMP
+    ''', (source, key, fingerprint))
+
+# ------------------------------
+# Workbook Readers
+# ------------------------------
+def open_workbook(path):
+    """Open a workbook for streaming; formulas read as their last calculated values"""
+    return load_workbook(path, read_only=True, data_only=True, keep_links=False)
+
+def batched(records, size=WRITE_BATCH_SIZE):
+    """Yield lists of up to size records from an iterator"""
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+def _cell(row, index):
+    return row[index] if index is not None and index < len(row) else None
+
 # ------------------------------
 # Personal Data Migration
 # ------------------------------
-def migrate_personal_data():
+TRUE_VALUES = ['yes', 'y', '1', 'true']
+
+# personal_log column -> Life sheet header
+PERSONAL_COLUMNS = (
+    ('gym', 'Gym'),
+    ('jiu_jitsu', 'Jiu Jitsu'),
+    ('skateboarding', 'Skateboard'),
+    ('work', 'Work'),
+    ('coitus', 'Coitus'),
+    ('sauna', 'Sauna'),
+    ('supplements', 'Supplements'),
+)
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+def personal_records(rows):
+    """Yield personal_log rows from the Life sheet's rows (header row first)"""
+    rows = iter(rows)
+    columns = {}
+    for index, name in enumerate(next(rows, ())):
+        columns.setdefault(name, index)
+    if 'Date' not in columns:
+        return
+    flag_columns = [columns.get(header) for _column, header in PERSONAL_COLUMNS]
+    for row in rows:
+        value = _cell(row, columns['Date'])
+        if value is None:
+            continue
+        flags = []
+        for index in flag_columns:
+            flag = _cell(row, index)
+            flags.append(int(flag is not None and str(flag).lower().strip() in TRUE_VALUES))
+        notes = _cell(row, columns.get('What '))
+        notes = '' if notes is None else str(notes).strip()
+        yield (_day(value), *flags, '' if notes == 'nan' else notes)
+
+def life_rows(workbook):
+    return workbook['Life'].iter_rows(values_only=True)
+
+def migrate_personal_data(conn):
+    """Replace personal_log with the Life sheet.
+
+    The sheet is streamed into a temp table first, so a row that fails to
+    parse leaves the existing days untouched instead of half-replaced.
+    """
     print("\n📊 Migrating personal data...")
     try:
-        df = pd.read_excel('Personal Log.xlsx', sheet_name='Life')
-        conn = sqlite3.connect('finance_tracker.db')
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM personal_log')
-        
-        def to_bool(value):
-            if pd.isna(value):
-                return 0
-            return 1 if str(value).lower().strip() in ['yes', 'y', '1', 'true'] else 0
-        
-        migrated_count = 0
-        for _, row in df.iterrows():
-            if pd.isna(row.get('Date')):
-                continue
-            date_obj = pd.to_datetime(row['Date']).date()
-            gym = to_bool(row.get('Gym'))
-            jiu_jitsu = to_bool(row.get('Jiu Jitsu'))
-            skateboarding = to_bool(row.get('Skateboard'))
-            work = to_bool(row.get('Work'))
-            coitus = to_bool(row.get('Coitus'))
-            sauna = to_bool(row.get('Sauna'))
-            supplements = to_bool(row.get('Supplements'))
-            notes = str(row.get('What ', '')) if not pd.isna(row.get('What ')) else ''
-            notes = notes.strip() if notes != 'nan' else ''
-            
-            cursor.execute('''
+        fingerprint = file_fingerprint(PERSONAL_WORKBOOK)
+        conn.execute('DROP TABLE IF EXISTS temp.personal_import')
+        conn.execute('''
+            CREATE TEMP TABLE personal_import (
+                date DATE, gym INTEGER, jiu_jitsu INTEGER, skateboarding INTEGER, work INTEGER,
+                coitus INTEGER, sauna INTEGER, supplements INTEGER, notes TEXT, import_hash TEXT
+            )
+        ''')
+        try:
+            workbook = open_workbook(PERSONAL_WORKBOOK)
+            try:
+                count = 0
+                for batch in batched(personal_records(life_rows(workbook))):
+                    conn.executemany('''
+                        INSERT INTO temp.personal_import
+                        (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, import_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [record + (content_fingerprint(record),) for record in batch])
+                    count += len(batch)
+            finally:
+                workbook.close()
+            # The whole sheet parsed; swap it in. Later rows for a date win, as before.
+            conn.execute('DELETE FROM personal_log')
+            conn.execute('''
                 INSERT OR REPLACE INTO personal_log 
-                (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (date_obj, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes))
-            migrated_count += 1
-        
-        conn.commit()
-        conn.close()
-        print(f"   ✅ Migrated {migrated_count} personal records")
+                (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, import_hash)
+                SELECT date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, import_hash
+                FROM temp.personal_import ORDER BY rowid
+            ''')
+        finally:
+            conn.execute('DROP TABLE IF EXISTS temp.personal_import')
+        set_fingerprint(conn, 'workbook', PERSONAL_WORKBOOK, fingerprint)
+        print(f"   ✅ Migrated {count} personal records")
+        return count
     except Exception as e:
         print(f"   ❌ Error migrating personal data: {e}")
+        print("      Existing personal data was kept")
+        return 0
+
+def sync_personal_data(conn):
+    """Upsert only new or changed days; days edited in the app are left alone"""
+    print("\n📊 Syncing personal data...")
+    fingerprint = file_fingerprint(PERSONAL_WORKBOOK)
+    if get_fingerprint(conn, 'workbook', PERSONAL_WORKBOOK) == fingerprint:
+        print(f"   ⏭️  {PERSONAL_WORKBOOK} unchanged")
+        return 0
+
+    # date -> import_hash; NULL means the day is owned by the app
+    existing = dict(conn.execute('SELECT date, import_hash FROM personal_log'))
+    seen = set()
+    upserted = 0
+    workbook = open_workbook(PERSONAL_WORKBOOK)
+    try:
+        for batch in batched(personal_records(life_rows(workbook))):
+            changes = []
+            for record in batch:
+                day = record[0].isoformat()
+                seen.add(day)
+                digest = content_fingerprint(record)
+                if day in existing and (existing[day] is None or existing[day] == digest):
+                    continue
+                changes.append(record + (digest,))
+            conn.executemany('''
+                INSERT INTO personal_log 
+                (date, gym, jiu_jitsu, skateboarding, work, coitus, sauna, supplements, notes, import_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(date) DO UPDATE SET
+                    gym = excluded.gym,
+                    jiu_jitsu = excluded.jiu_jitsu,
+                    skateboarding = excluded.skateboarding,
+                    work = excluded.work,
+                    coitus = excluded.coitus,
+                    sauna = excluded.sauna,
+                    supplements = excluded.supplements,
+                    notes = excluded.notes,
+                    import_hash = excluded.import_hash,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE personal_log.import_hash IS NOT NULL
+            ''', changes)
+            upserted += len(changes)
+    finally:
+        workbook.close()
+
+    # Imported days that have disappeared from the sheet
+    removed = [(day,) for day, digest in existing.items() if digest is not None and day not in seen]
+    conn.executemany('DELETE FROM personal_log WHERE date = ? AND import_hash IS NOT NULL', removed)
+
+    set_fingerprint(conn, 'workbook', PERSONAL_WORKBOOK, fingerprint)
+    print(f"   ✅ {upserted} days upserted, {len(removed)} removed")
+    return upserted + len(removed)
 
 # ------------------------------
 # Spending Data Migration
@@ -186,91 +363,198 @@ def parse_dates_from_sheet_name(sheet_name):
                 continue
     return None, None
 
-def extract_daily_totals_from_sheet(sheet_name):
+# Daily totals sit somewhere in sheet rows 16-21 (rows 14-19 below the header row),
+# one column per day of the period
+TOTALS_FIRST_ROW = 16
+TOTALS_LAST_ROW = 21
+MAX_PERIOD_DAYS = 14
+MIN_DAYS_WITH_TOTALS = 5
+MIN_DAILY_TOTAL = 0.50
+MAX_DAILY_TOTAL = 300.00
+
+def daily_total(value):
+    """A cell as a daily total ("$1,234.50", 12.5, ...), or None if it isn't a plausible one"""
+    if isinstance(value, str):
+        try:
+            value = float(value.replace('$', '').replace(',', '').strip())
+        except ValueError:
+            return None
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if MIN_DAILY_TOTAL <= value <= MAX_DAILY_TOTAL else None
+
+def extract_daily_totals_from_sheet(sheet_name, workbook):
+    """Read only the totals block of a sheet from a read-only workbook"""
     start_date, end_date = parse_dates_from_sheet_name(sheet_name)
     if not start_date:
         print(f"   ❌ Could not parse dates from: {sheet_name}")
         return []
-    df = pd.read_excel("Spending.xlsx", sheet_name=sheet_name)
-    daily_entries = []
-    for row_idx in range(14, min(20, len(df))):
-        row = df.iloc[row_idx]
-        daily_amounts = []
-        for col_idx in range(min(14, len(row))):
-            cell_value = row.iloc[col_idx]
-            if pd.notna(cell_value):
-                try:
-                    if isinstance(cell_value, str):
-                        cell_value = cell_value.replace('$', '').replace(',', '').strip()
-                    amount = float(cell_value)
-                    if 0.50 <= amount <= 300.00:
-                        expense_date = start_date + timedelta(days=col_idx)
-                        if expense_date <= end_date:
-                            daily_amounts.append((expense_date, amount))
-                except:
-                    continue
-        if len(daily_amounts) >= 5:
-            daily_entries.extend(daily_amounts)
-            break
-    return daily_entries
-
-def migrate_spending_data():
-    print("\n💰 Migrating spending data...")
-    excel_file = pd.ExcelFile("Spending.xlsx")
-    sheet_names = [name for name in excel_file.sheet_names if name.lower() != 'general' and ' - ' in name]
-    conn = sqlite3.connect('finance_tracker.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM spending_log')
+    days_in_period = (end_date - start_date).days + 1
+    if days_in_period < 1:
+        return []
+    rows = workbook[sheet_name].iter_rows(
+        min_row=TOTALS_FIRST_ROW, max_row=TOTALS_LAST_ROW,
+        max_col=min(MAX_PERIOD_DAYS, days_in_period), values_only=True,
+    )
+    for row in rows:
+        totals = [(start_date + timedelta(days=day), amount)
+                  for day, amount in enumerate(map(daily_total, row)) if amount is not None]
+        if len(totals) >= MIN_DAYS_WITH_TOTALS:
+            return totals
+    return []
+
+_worker_workbook = None
+
+def _open_workbook(path):
+    """Open the workbook once per process (also the process-pool initializer)"""
+    global _worker_workbook
+    _worker_workbook = open_workbook(path)
+
+def _parse_sheet(sheet_name):
+    return sheet_name, extract_daily_totals_from_sheet(sheet_name, _worker_workbook)
+
+def spending_sheet_names(path=SPENDING_WORKBOOK):
+    workbook = open_workbook(path)
+    names = workbook.sheetnames
+    workbook.close()
+    return [name for name in names if name.lower() != 'general' and ' - ' in name]
+
+def iter_sheet_totals(sheet_names, path=SPENDING_WORKBOOK, workers=1):
+    """Yield (sheet_name, daily_entries) per sheet, in sheet order.
+
+    With more than one worker the sheets are parsed in a process pool; each
+    worker opens the workbook once and results stream back as they finish.
+    """
+    global _worker_workbook
+    if workers <= 1:
+        _open_workbook(path)
+        try:
+            for sheet_name in sheet_names:
+                yield _parse_sheet(sheet_name)
+        finally:
+            _worker_workbook.close()
+            _worker_workbook = None
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_workbook, initargs=(path,)) as executor:
+        yield from executor.map(_parse_sheet, sheet_names)
+
+SPENDING_ITEM = "Daily Total"
+
+def migrate_spending_data(conn, workers=1):
+    print(f"\n💰 Migrating spending data ({workers} worker{'s' if workers != 1 else ''})...")
+    fingerprint = file_fingerprint(SPENDING_WORKBOOK)
+    sheet_names = spending_sheet_names()
+    category = categories.classify(conn, SPENDING_ITEM)
+    conn.execute('DELETE FROM spending_log')
+    conn.execute("DELETE FROM import_state WHERE source = 'spending_sheet'")
+
+    # This process is the only writer; parsed sheets are flushed in batches
+    insert = '''
+        INSERT INTO spending_log (date, item, price, category, import_key)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    batch = []
     total_migrated = 0
-    for sheet_name in sheet_names:
-        print(f"\n   📊 Processing: {sheet_name}")
-        daily_entries = extract_daily_totals_from_sheet(sheet_name)
-        for expense_date, amount in daily_entries:
-            cursor.execute('''
-                INSERT INTO spending_log (date, item, price)
-                VALUES (?, ?, ?)
-            ''', (expense_date, "Daily Total", amount))
-            total_migrated += 1
-            print(f"     {expense_date}: ${amount:.2f}")
-    conn.commit()
-    conn.close()
+    for sheet_name, daily_entries in iter_sheet_totals(sheet_names, workers=workers):
+        print(f"   📊 {sheet_name}: {len(daily_entries)} days")
+        set_fingerprint(conn, 'spending_sheet', sheet_name, content_fingerprint(daily_entries))
+        batch.extend((expense_date, SPENDING_ITEM, amount, category, sheet_name)
+                     for expense_date, amount in daily_entries)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            conn.executemany(insert, batch)
+            total_migrated += len(batch)
+            batch = []
+    conn.executemany(insert, batch)
+    total_migrated += len(batch)
+    set_fingerprint(conn, 'workbook', SPENDING_WORKBOOK, fingerprint)
     print(f"\n   ✅ Migrated {total_migrated} spending records")
+    return total_migrated
+
+def sync_spending_data(conn, workers=1):
+    """Re-import only sheets whose content changed, touching only changed days.
+
+    Imported rows carry their sheet name in import_key; entries added in the
+    app have no import_key and are never touched.
+    """
+    print(f"\n💰 Syncing spending data ({workers} worker{'s' if workers != 1 else ''})...")
+    fingerprint = file_fingerprint(SPENDING_WORKBOOK)
+    if get_fingerprint(conn, 'workbook', SPENDING_WORKBOOK) == fingerprint:
+        print(f"   ⏭️  {SPENDING_WORKBOOK} unchanged")
+        return 0
+
+    # Rows from imports that predate per-sheet tracking are re-imported below
+    changed = conn.execute("DELETE FROM spending_log WHERE import_key = ''").rowcount
+    category = categories.classify(conn, SPENDING_ITEM)
+    known = dict(conn.execute("SELECT key, fingerprint FROM import_state WHERE source = 'spending_sheet'"))
+    sheet_names = spending_sheet_names()
+    skipped = 0
+
+    for sheet_name, daily_entries in iter_sheet_totals(sheet_names, workers=workers):
+        digest = content_fingerprint(daily_entries)
+        if known.get(sheet_name) == digest:
+            skipped += 1
+            continue
+        existing = {
+            row[1]: (row[0], row[2]) for row in conn.execute(
+                'SELECT id, date, price FROM spending_log WHERE import_key = ?', (sheet_name,)
+            )
+        }
+        latest = {expense_date.isoformat(): amount for expense_date, amount in daily_entries}
+        inserts = [(day, SPENDING_ITEM, amount, category, sheet_name)
+                   for day, amount in latest.items() if day not in existing]
+        updates = [(amount, existing[day][0])
+                   for day, amount in latest.items() if day in existing and existing[day][1] != amount]
+        deletes = [(row_id,) for day, (row_id, _price) in existing.items() if day not in latest]
+        conn.executemany('''
+            INSERT INTO spending_log (date, item, price, category, import_key)
+            VALUES (?, ?, ?, ?, ?)
+        ''', inserts)
+        conn.executemany('UPDATE spending_log SET price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', updates)
+        conn.executemany('DELETE FROM spending_log WHERE id = ?', deletes)
+        set_fingerprint(conn, 'spending_sheet', sheet_name, digest)
+        changed += len(inserts) + len(updates) + len(deletes)
+        print(f"   📊 {sheet_name}: +{len(inserts)} ~{len(updates)} -{len(deletes)}")
+
+    # Sheets removed from the workbook take their rows with them
+    for sheet_name in set(known) - set(sheet_names):
+        changed += conn.execute('DELETE FROM spending_log WHERE import_key = ?', (sheet_name,)).rowcount
+        conn.execute("DELETE FROM import_state WHERE source = 'spending_sheet' AND key = ?", (sheet_name,))
+
+    set_fingerprint(conn, 'workbook', SPENDING_WORKBOOK, fingerprint)
+    print(f"\n   ✅ {changed} spending rows changed, {skipped} sheets unchanged")
+    return changed
 
 # ------------------------------
 # Budget Periods
 # ------------------------------
-def create_budget_periods():
+def create_budget_periods(conn):
+    """Rebuild the period calendar from the first spending day through the horizon"""
     print("\n📅 Creating budget periods...")
-    conn = sqlite3.connect('finance_tracker.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM budget_periods')
-    cursor.execute('SELECT MIN(date), MAX(date) FROM spending_log')
-    result = cursor.fetchone()
-    if result[0] and result[1]:
-        start_date = datetime.strptime(result[0], '%Y-%m-%d').date()
-        end_date = datetime.strptime(result[1], '%Y-%m-%d').date()
-        current_date = start_date
-        today = datetime.now().date()
-        period_count = 0
-        while current_date <= end_date:
-            period_end = current_date + timedelta(days=13)
-            is_current = 1 if current_date <= today <= period_end else 0
-            cursor.execute('''
-                INSERT INTO budget_periods (start_date, end_date, budget_amount, is_current)
-                VALUES (?, ?, 500.00, ?)
-            ''', (current_date, period_end, is_current))
-            period_count += 1
-            current_date = period_end + timedelta(days=1)
-        conn.commit()
-        print(f"   ✅ Created {period_count} budget periods")
-    conn.close()
+    conn.execute('DELETE FROM budget_periods')
+    first_day = conn.execute('SELECT MIN(date) FROM spending_log').fetchone()[0]
+    if first_day:
+        horizon = datetime.now().date() + timedelta(days=periods.CALENDAR_HORIZON_DAYS)
+        added = periods.extend_calendar(conn, horizon, anchor=datetime.strptime(first_day, '%Y-%m-%d').date())
+        print(f"   ✅ Created {added} budget periods")
+
+def extend_budget_periods(conn):
+    """Append 14-day periods after the last one until spending and the horizon are covered"""
+    print("\n📅 Extending budget periods...")
+    if not conn.execute('SELECT MAX(end_date) FROM budget_periods').fetchone()[0]:
+        return create_budget_periods(conn)
+    last_spending = conn.execute('SELECT MAX(date) FROM spending_log').fetchone()[0]
+    through = datetime.now().date() + timedelta(days=periods.CALENDAR_HORIZON_DAYS)
+    if last_spending:
+        through = max(through, datetime.strptime(last_spending, '%Y-%m-%d').date())
+    added = periods.extend_calendar(conn, through)
+    print(f"   ✅ Added {added} budget periods")
 
 # ------------------------------
 # Verification
 # ------------------------------
 def verify_migration():
     print("\n🔍 Verifying migration...")
-    conn = sqlite3.connect('finance_tracker.db')
+    conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM personal_log')
     personal_count = cursor.fetchone()[0]
@@ -287,6 +571,16 @@ def verify_migration():
 # Main
 # ------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Import Personal Log.xlsx and Spending.xlsx")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Run the whole import and report rows/sec, then roll it back")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Processes used to parse spending sheets (1 = serial)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only apply rows and sheets changed since the last import, "
+                             "keeping entries made in the app")
+    args = parser.parse_args()
+
     print("🚀 Finance Tracker Migration")
     print("=" * 55)
     if not check_files():
@@ -294,9 +588,29 @@ def main():
     if not install_requirements():
         return
     setup_database()
-    migrate_personal_data()
-    migrate_spending_data()
-    create_budget_periods()
+
+    conn = sqlite3.connect(DATABASE)
+    start = time.perf_counter()
+    if args.incremental:
+        with sync_transaction(conn):
+            row_count = sync_personal_data(conn)
+            row_count += sync_spending_data(conn, workers=args.workers)
+            extend_budget_periods(conn)
+    else:
+        with bulk_load(conn):
+            row_count = migrate_personal_data(conn)
+            row_count += migrate_spending_data(conn, workers=args.workers)
+            create_budget_periods(conn)
+    elapsed = time.perf_counter() - start
+    print(f"\n⏱️  Loaded {row_count} rows in {elapsed:.2f}s ({row_count / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+    if args.dry_run:
+        conn.rollback()
+        conn.close()
+        print("🧪 Dry run: rolled back, database unchanged")
+        return
+    conn.commit()
+    conn.close()
     verify_migration()
     print("\n🎉 Migration Completed! Run: python app.py")
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Schema migrations for Finance Tracker
+- The schema version lives in PRAGMA user_version
+- MIGRATIONS is an ordered list; migrate() applies every step newer than the
+  database's version and records the new version after each one
+- Steps are idempotent (IF NOT EXISTS, existence checks), so databases created
+  before versioning existed upgrade cleanly from version 0
+
+Usage: python migrations.py [--db finance_tracker.db]
+"""
+
+import argparse
+import sqlite3
+
+import activities
+import activity_bits
+import cache
+import categories
+import entries
+import maintenance
+import periods
+import rollups
+import search
+import trends
+
+
+def create_base_tables(conn):
+    # Personal activities table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS personal_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE UNIQUE NOT NULL,
+            gym BOOLEAN DEFAULT 0,
+            jiu_jitsu BOOLEAN DEFAULT 0,
+            skateboarding BOOLEAN DEFAULT 0,
+            work BOOLEAN DEFAULT 0,
+            coitus BOOLEAN DEFAULT 0,
+            sauna BOOLEAN DEFAULT 0,
+            supplements BOOLEAN DEFAULT 0,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Spending entries table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS spending_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE NOT NULL,
+            item TEXT NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            category TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Budget periods table for tracking biweekly budgets
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS budget_periods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            budget_amount DECIMAL(10,2) DEFAULT 500.00,
+            is_current BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def create_rollup_tables(conn):
+    rollups.create_rollups(conn)
+
+
+def create_category_rules(conn):
+    # Classify existing entries the first time the rules appear
+    if categories.create_rules(conn):
+        conn.commit()
+        categories.backfill_categories(conn)
+        rollups.rebuild_rollups(conn)
+
+
+DATE_INDEXES = (
+    # Covers SUM(price) over a date range without touching the table
+    ('idx_spending_log_date_price', 'spending_log (date, price)'),
+    # Serves date = ? / BETWEEN filters ordered by date, created_at
+    ('idx_spending_log_date_created', 'spending_log (date, created_at)'),
+    # Current-period lookup by start_date <= ? AND end_date >= ?
+    ('idx_budget_periods_start_end', 'budget_periods (start_date, end_date)'),
+)
+
+
+def create_date_indexes(conn):
+    for name, target in DATE_INDEXES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def drop_date_indexes(conn):
+    """Drop the secondary indexes (e.g. during a bulk load); recreate with create_date_indexes()"""
+    for name, _target in DATE_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def add_import_tracking(conn):
+    # import_key / import_hash mark rows owned by the spreadsheet import; NULL
+    # means the row was entered (or last edited) in the app. Rows that predate
+    # this step are treated as imported, as every re-import used to replace them.
+    spending_columns = {row[1] for row in conn.execute('PRAGMA table_info(spending_log)')}
+    if 'import_key' not in spending_columns:
+        conn.execute('ALTER TABLE spending_log ADD COLUMN import_key TEXT')
+        conn.execute("UPDATE spending_log SET import_key = '' WHERE item = 'Daily Total'")
+    personal_columns = {row[1] for row in conn.execute('PRAGMA table_info(personal_log)')}
+    if 'import_hash' not in personal_columns:
+        conn.execute('ALTER TABLE personal_log ADD COLUMN import_hash TEXT')
+        conn.execute("UPDATE personal_log SET import_hash = ''")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_spending_log_import_key
+            ON spending_log (import_key, date) WHERE import_key IS NOT NULL
+    ''')
+    # Content fingerprints of the last import, per workbook and per sheet
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_state (
+            source TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, key)
+        )
+    ''')
+
+
+# (version, description, step) -- append only, never renumber
+MIGRATIONS = [
+    (1, 'base tables', create_base_tables),
+    (2, 'dashboard rollups', create_rollup_tables),
+    (3, 'spending category rules', create_category_rules),
+    (4, 'date and period indexes', create_date_indexes),
+    (5, 'import provenance and fingerprints', add_import_tracking),
+    (6, 'cache generation counter', cache.create_generation),
+    (7, 'gap-free budget period calendar', periods.build_calendar),
+    (8, 'batch API idempotency keys', entries.create_idempotency_keys),
+    (9, 'trends change journal', trends.create_change_journal),
+    (10, 'activity bitmask column', activity_bits.add_activity_mask),
+    (11, 'activity definitions and event table', activities.create_activities),
+    (12, 'full-text search indexes', search.create_search),
+    (13, 'maintenance job log', maintenance.create_maintenance),
+]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the list of versions applied"""
+    applied = []
+    version = current_version(conn)
+    for target, _description, step in MIGRATIONS:
+        if target <= version:
+            continue
+        step(conn)
+        conn.execute(f'PRAGMA user_version = {target}')
+        conn.commit()
+        applied.append(target)
+    return applied
+
+
+def check(conn):
+    """Raise if the database isn't at the schema version this code expects"""
+    version, latest = current_version(conn), MIGRATIONS[-1][0]
+    if version != latest:
+        raise RuntimeError(f'Database schema is at version {version}, this code expects {latest}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bring the database schema up to date')
+    parser.add_argument('--db', default='finance_tracker.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    before = current_version(conn)
+    applied = migrate(conn)
+    conn.close()
+    descriptions = {version: description for version, description, _ in MIGRATIONS}
+    for version in applied:
+        print(f"   ✅ {version}: {descriptions[version]}")
+    print(f"✅ Schema at version {applied[-1] if applied else before}")
+
+
+if __name__ == '__main__':
+    main()
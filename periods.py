@@ -0,0 +1,140 @@
+"""
+Budget period engine for Finance Tracker
+- budget_periods is kept as a gap-free calendar of 14-day periods, extended
+  ahead of today so looking up a date never has to create a period
+- The active period is cached in memory per database and rolls over once
+  today passes its end date
+- period_summary() returns the period and its spend totals in one query
+"""
+
+import threading
+from datetime import date, timedelta
+
+PERIOD_DAYS = 14
+DEFAULT_BUDGET = 500.00
+
+# How far past today the calendar is kept filled
+CALENDAR_HORIZON_DAYS = 366
+
+_active_lock = threading.Lock()
+_active = {}
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def extend_calendar(conn, through, anchor=None):
+    """Append periods after the last one until `through` is covered.
+
+    An empty calendar starts at `anchor` (default: `through`). The caller commits.
+    Returns the number of periods added.
+    """
+    last_end = conn.execute('SELECT MAX(end_date) FROM budget_periods').fetchone()[0]
+    start = _as_date(last_end) + timedelta(days=1) if last_end else (anchor or through)
+    periods = []
+    while start <= through:
+        periods.append((start.isoformat(), (start + timedelta(days=PERIOD_DAYS - 1)).isoformat(), DEFAULT_BUDGET))
+        start += timedelta(days=PERIOD_DAYS)
+    conn.executemany('''
+        INSERT INTO budget_periods (start_date, end_date, budget_amount, is_current)
+        VALUES (?, ?, ?, 0)
+    ''', periods)
+    return len(periods)
+
+
+def fill_gaps(conn):
+    """Insert periods into any holes between existing ones; returns the number added.
+
+    Gaps come from the old behaviour of starting a new period on the day of the
+    first visit after the calendar ran out. Each hole is filled with 14-day
+    periods, the last one shortened to end the day before the next period.
+    """
+    rows = conn.execute('SELECT start_date, end_date FROM budget_periods ORDER BY start_date').fetchall()
+    periods = []
+    covered_until = None
+    for start_date, end_date in rows:
+        start, end = _as_date(start_date), _as_date(end_date)
+        if covered_until is not None:
+            gap_start = covered_until + timedelta(days=1)
+            while gap_start < start:
+                gap_end = min(gap_start + timedelta(days=PERIOD_DAYS - 1), start - timedelta(days=1))
+                periods.append((gap_start.isoformat(), gap_end.isoformat(), DEFAULT_BUDGET))
+                gap_start = gap_end + timedelta(days=1)
+        covered_until = end if covered_until is None else max(covered_until, end)
+    conn.executemany('''
+        INSERT INTO budget_periods (start_date, end_date, budget_amount, is_current)
+        VALUES (?, ?, ?, 0)
+    ''', periods)
+    return len(periods)
+
+
+def build_calendar(conn, today=None):
+    """Make the calendar gap-free and extend it past today (migration step)"""
+    today = today or date.today()
+    fill_gaps(conn)
+    extend_calendar(conn, today + timedelta(days=CALENDAR_HORIZON_DAYS), anchor=today)
+
+
+def find_period(conn, day):
+    """The period containing day, or None"""
+    return conn.execute('''
+        SELECT id, start_date, end_date, budget_amount FROM budget_periods
+        WHERE start_date <= ? AND end_date >= ?
+        ORDER BY start_date DESC LIMIT 1
+    ''', (day.isoformat(), day.isoformat())).fetchone()
+
+
+def resolve_period(conn, day):
+    """The period containing day, extending the calendar first if it has run out"""
+    period = find_period(conn, day)
+    if period is None:
+        extend_calendar(conn, day + timedelta(days=CALENDAR_HORIZON_DAYS), anchor=day)
+        conn.commit()
+        period = find_period(conn, day)
+    return period
+
+
+def active_period_id(conn, key, today):
+    """Id of today's period, from the in-memory cache while today is inside it"""
+    with _active_lock:
+        cached = _active.get(key)
+    if cached is not None and cached[1] <= today <= cached[2]:
+        return cached[0]
+    period = resolve_period(conn, today)
+    with _active_lock:
+        _active[key] = (period['id'], _as_date(period['start_date']), _as_date(period['end_date']))
+    return period['id']
+
+
+def forget(key=None):
+    """Drop the cached active period for one database (or all of them)"""
+    with _active_lock:
+        if key is None:
+            _active.clear()
+        else:
+            _active.pop(key, None)
+
+
+def period_summary(conn, key, today=None):
+    """Today's period with its spend totals, in one query.
+
+    Returns a dict with id, start_date, end_date, budget_amount, period_total
+    and today_total. If the cached period was replaced (for example by a
+    re-import), the cache is refreshed and the query retried.
+    """
+    today = today or date.today()
+    for _attempt in range(2):
+        period_id = active_period_id(conn, key, today)
+        row = conn.execute('''
+            SELECT p.id, p.start_date, p.end_date, p.budget_amount,
+                   IFNULL((SELECT SUM(total) FROM spending_daily_totals
+                           WHERE date BETWEEN p.start_date AND p.end_date), 0) AS period_total,
+                   IFNULL((SELECT total FROM spending_daily_totals WHERE date = :today), 0) AS today_total
+            FROM budget_periods p
+            WHERE p.id = :id AND p.start_date <= :today AND p.end_date >= :today
+        ''', {'id': period_id, 'today': today.isoformat()}).fetchone()
+        if row is not None:
+            return dict(row)
+        forget(key)
+    raise LookupError(f'No budget period covers {today}')
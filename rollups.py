@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Materialized rollups for the dashboard
+- spending_daily_totals: one row per day with the summed price and entry count
+- spending_category_totals: the same, split by the persisted spending category
+- activity_totals: a single row of all-time activity counters
+
+Triggers on spending_log and personal_log keep the rollups current on every
+write, so the dashboard reads O(days) rows instead of scanning history.
+
+Usage: python rollups.py rebuild [--db finance_tracker.db]
+"""
+
+import argparse
+import sqlite3
+
+from categories import DEFAULT_CATEGORY
+
+ACTIVITIES = ('gym', 'jiu_jitsu', 'skateboarding', 'work', 'coitus', 'sauna', 'supplements')
+
+TRIGGERS = (
+    'spending_log_rollup_insert', 'spending_log_rollup_delete', 'spending_log_rollup_update',
+    'personal_log_rollup_insert', 'personal_log_rollup_delete', 'personal_log_rollup_update',
+)
+
+
+def _category(row):
+    return f"IFNULL({row}.category, '{DEFAULT_CATEGORY}')"
+
+
+def _spending_add(row):
+    return f'''
+        INSERT INTO spending_daily_totals (date, total, entries)
+        VALUES ({row}.date, ROUND({row}.price, 2), 1)
+        ON CONFLICT(date) DO UPDATE SET
+            total = ROUND(total + excluded.total, 2),
+            entries = entries + 1;
+        INSERT INTO spending_category_totals (date, category, total, entries)
+        VALUES ({row}.date, {_category(row)}, ROUND({row}.price, 2), 1)
+        ON CONFLICT(date, category) DO UPDATE SET
+            total = ROUND(total + excluded.total, 2),
+            entries = entries + 1;
+    '''
+
+
+def _spending_remove(row):
+    return f'''
+        UPDATE spending_daily_totals
+        SET total = ROUND(total - {row}.price, 2), entries = entries - 1
+        WHERE date = {row}.date;
+        DELETE FROM spending_daily_totals WHERE date = {row}.date AND entries <= 0;
+        UPDATE spending_category_totals
+        SET total = ROUND(total - {row}.price, 2), entries = entries - 1
+        WHERE date = {row}.date AND category = {_category(row)};
+        DELETE FROM spending_category_totals WHERE date = {row}.date AND entries <= 0;
+    '''
+
+
+def _activity_delta(sign, row):
+    counters = ', '.join(f'{name} = {name} {sign} IFNULL({row}.{name}, 0)' for name in ACTIVITIES)
+    return f'UPDATE activity_totals SET days = days {sign} 1, {counters} WHERE id = 1;'
+
+
+def _tables():
+    activity_columns = ',\n'.join(f'    {name} INTEGER NOT NULL DEFAULT 0' for name in ACTIVITIES)
+    return f'''
+        CREATE TABLE IF NOT EXISTS spending_daily_totals (
+            date DATE PRIMARY KEY,
+            total DECIMAL(10,2) NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS spending_category_totals (
+            date DATE NOT NULL,
+            category TEXT NOT NULL,
+            total DECIMAL(10,2) NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, category)
+        );
+
+        CREATE TABLE IF NOT EXISTS activity_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            days INTEGER NOT NULL DEFAULT 0,
+        {activity_columns}
+        );
+        INSERT OR IGNORE INTO activity_totals (id) VALUES (1);
+    '''
+
+
+def _triggers():
+    return [
+        f'''CREATE TRIGGER spending_log_rollup_insert
+        AFTER INSERT ON spending_log BEGIN {_spending_add('NEW')} END''',
+
+        f'''CREATE TRIGGER spending_log_rollup_delete
+        AFTER DELETE ON spending_log BEGIN {_spending_remove('OLD')} END''',
+
+        f'''CREATE TRIGGER spending_log_rollup_update
+        AFTER UPDATE OF date, category, price ON spending_log
+        BEGIN {_spending_remove('OLD')} {_spending_add('NEW')} END''',
+
+        f'''CREATE TRIGGER personal_log_rollup_insert
+        AFTER INSERT ON personal_log BEGIN {_activity_delta('+', 'NEW')} END''',
+
+        f'''CREATE TRIGGER personal_log_rollup_delete
+        AFTER DELETE ON personal_log BEGIN {_activity_delta('-', 'OLD')} END''',
+
+        f'''CREATE TRIGGER personal_log_rollup_update
+        AFTER UPDATE ON personal_log
+        BEGIN {_activity_delta('-', 'OLD')} {_activity_delta('+', 'NEW')} END''',
+    ]
+
+
+def drop_triggers(conn):
+    """Stop maintaining rollups (e.g. during a bulk load); call rebuild_rollups() after"""
+    for name in TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def create_triggers(conn):
+    """(Re)create the triggers that keep the rollups current"""
+    drop_triggers(conn)
+    for statement in _triggers():
+        conn.execute(statement)
+
+
+def create_rollups(conn):
+    """Create rollup tables and (re)create their triggers, populating the tables if they are new"""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'spending_daily_totals'"
+    ).fetchone()
+    conn.executescript(_tables())
+    create_triggers(conn)
+    if not existed:
+        rebuild_rollups(conn)
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from spending_log and personal_log.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    sums = ', '.join(f'IFNULL(SUM({name}), 0)' for name in ACTIVITIES)
+    conn.execute('DELETE FROM spending_daily_totals')
+    conn.execute('''
+        INSERT INTO spending_daily_totals (date, total, entries)
+        SELECT date, ROUND(SUM(price), 2), COUNT(*) FROM spending_log GROUP BY date
+    ''')
+    conn.execute('DELETE FROM spending_category_totals')
+    conn.execute(f'''
+        INSERT INTO spending_category_totals (date, category, total, entries)
+        SELECT date, IFNULL(category, '{DEFAULT_CATEGORY}') AS bucket, ROUND(SUM(price), 2), COUNT(*)
+        FROM spending_log GROUP BY date, bucket
+    ''')
+    conn.execute('DELETE FROM activity_totals')
+    conn.execute(f'''
+        INSERT INTO activity_totals (id, days, {', '.join(ACTIVITIES)})
+        SELECT 1, COUNT(*), {sums} FROM personal_log
+    ''')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain dashboard rollup tables')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--db', default='finance_tracker.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    create_rollups(conn)
+    rebuild_rollups(conn)
+    conn.commit()
+    days = conn.execute('SELECT COUNT(*) FROM spending_daily_totals').fetchone()[0]
+    conn.close()
+    print(f"✅ Rebuilt rollups ({days} spending days)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+"""
+Full-text search for Finance Tracker
+- Spending items repeat (hundreds of thousands of "Tim Hortons"), so they are
+  indexed once per distinct string: spending_items holds each item with its
+  entry count, and item_search is an external-content FTS5 table over it.
+  Ranking touches distinct items, not every matching entry
+- notes_search is an external-content FTS5 table over personal_log.notes;
+  the latest NOTES_WINDOW matching days are ranked. When more match, the page
+  says so (truncated) and gives older_end, the end date that reaches the rest
+- Triggers keep spending_items and both indexes in step with every insert,
+  update and delete
+- Every word of a query is a prefix match, so "tim hor" finds "Tim Hortons";
+  results are ranked by bm25 (an item's entries newest first) and can be
+  limited to a date range
+- Matches are highlighted with <mark> in HTML-escaped snippets
+- Pages are keyed by the last result shown (?after=<next>), so a page reads
+  only the entries it returns
+"""
+
+import re
+from datetime import date
+
+from markupsafe import escape
+
+TYPES = ('spending', 'notes')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_TERMS = 8
+# Distinct items considered per query; further matches are dropped and the page is marked truncated
+MAX_ITEMS = 1000
+# Matching days ranked per notes query, newest first
+NOTES_WINDOW = 2000
+SNIPPET_TOKENS = 12
+
+# Prefix indexes make "ti*" and "tim*" lookups as cheap as whole words
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'"
+
+TRIGGERS = (
+    'spending_log_search_insert',
+    'spending_log_search_update',
+    'spending_log_search_delete',
+    'spending_items_search_insert',
+    'spending_items_search_delete',
+    'personal_log_search_insert',
+    'personal_log_search_update',
+    'personal_log_search_delete',
+)
+
+# highlight() marks matches with control characters, which can't come from a
+# query token; they become <mark> tags after the text is escaped
+OPEN, CLOSE = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+CURSOR = re.compile(r'(\d+):(\d{4}-\d{2}-\d{2}):(\d+)')
+
+
+# ------------------------------
+# Schema
+# ------------------------------
+def _count_item(item):
+    return f'''
+            INSERT INTO spending_items (item, entries) VALUES ({item}, 1)
+            ON CONFLICT(item) DO UPDATE SET entries = entries + 1;'''
+
+
+def _uncount_item(item):
+    return f'''
+            UPDATE spending_items SET entries = entries - 1 WHERE item = {item};
+            DELETE FROM spending_items WHERE item = {item} AND entries <= 0;'''
+
+
+def _index_sync(index, table, column):
+    """Insert and delete statements keeping an external-content index on table.id current"""
+    remove = f"INSERT INTO {index} ({index}, rowid, {column}) VALUES ('delete', OLD.id, OLD.{column});"
+    add = f"INSERT INTO {index} (rowid, {column}) VALUES (NEW.id, NEW.{column});"
+    return remove, add
+
+
+def _triggers():
+    remove_item, add_item = _index_sync('item_search', 'spending_items', 'item')
+    remove_notes, add_notes = _index_sync('notes_search', 'personal_log', 'notes')
+    return (
+        f'''CREATE TRIGGER IF NOT EXISTS spending_log_search_insert
+        AFTER INSERT ON spending_log BEGIN{_count_item('NEW.item')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS spending_log_search_update
+        AFTER UPDATE OF item ON spending_log WHEN OLD.item IS NOT NEW.item BEGIN{_uncount_item('OLD.item')}{_count_item('NEW.item')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS spending_log_search_delete
+        AFTER DELETE ON spending_log BEGIN{_uncount_item('OLD.item')}
+        END''',
+        # spending_items rows are only ever inserted and deleted
+        f'''CREATE TRIGGER IF NOT EXISTS spending_items_search_insert
+        AFTER INSERT ON spending_items BEGIN {add_item} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS spending_items_search_delete
+        AFTER DELETE ON spending_items BEGIN {remove_item} END''',
+        # External-content deletes must pass the old text, so an edit is a
+        # delete of the old notes followed by an insert of the new ones
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_search_insert
+        AFTER INSERT ON personal_log BEGIN {add_notes} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_search_update
+        AFTER UPDATE OF notes ON personal_log BEGIN {remove_notes} {add_notes} END''',
+        f'''CREATE TRIGGER IF NOT EXISTS personal_log_search_delete
+        AFTER DELETE ON personal_log BEGIN {remove_notes} END''',
+    )
+
+
+def create_triggers(conn):
+    for sql in _triggers():
+        conn.execute(sql)
+
+
+def drop_triggers(conn):
+    """Drop the search triggers ahead of a bulk load; rebuild() afterwards"""
+    for name in TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+# One item's entries newest first, for search results; the item dictionary is counted off it
+INDEXES = (
+    ('idx_spending_log_item_date', 'spending_log (item, date)'),
+)
+
+
+def create_indexes(conn):
+    for name, target in INDEXES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def drop_indexes(conn):
+    """Drop the search indexes ahead of a bulk load; recreate with create_indexes()"""
+    for name, _target in INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def create_search(conn):
+    """Create the item index and dictionary, both FTS5 indexes and their triggers (migration step)"""
+    create_indexes(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS spending_items (
+            id INTEGER PRIMARY KEY,
+            item TEXT UNIQUE NOT NULL,
+            entries INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS item_search
+        USING fts5(item, content = 'spending_items', content_rowid = 'id', {TOKENIZE})
+    ''')
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_search
+        USING fts5(notes, content = 'personal_log', content_rowid = 'id', {TOKENIZE})
+    ''')
+    drop_triggers(conn)
+    rebuild(conn)
+    create_triggers(conn)
+
+
+def rebuild(conn):
+    """Recount the item dictionary and re-index both tables (after a bulk load)"""
+    conn.execute('DELETE FROM spending_items')
+    conn.execute('''
+        INSERT INTO spending_items (item, entries)
+        SELECT item, COUNT(*) FROM spending_log GROUP BY item
+    ''')
+    conn.execute("INSERT INTO item_search (item_search) VALUES ('rebuild')")
+    conn.execute("INSERT INTO notes_search (notes_search) VALUES ('rebuild')")
+
+
+# ------------------------------
+# Queries
+# ------------------------------
+def match_expression(text):
+    """FTS5 query for user input: every word quoted and prefix-matched, all required.
+
+    Quoting means operators and punctuation in the input are never parsed as
+    FTS5 syntax; returns None if the input has no words.
+    """
+    words = WORD.findall(text.lower())[:MAX_TERMS]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def parse_args(args):
+    """Validate query-string arguments; raises ValueError with a message for the client"""
+    kind = args.get('type', 'spending')
+    if kind not in TYPES:
+        raise ValueError(f"type must be one of: {', '.join(TYPES)}")
+    try:
+        start = date.fromisoformat(args['start']) if args.get('start') else None
+        end = date.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be YYYY-MM-DD dates')
+    if start and end and start > end:
+        raise ValueError('start must not be after end')
+
+    after = args.get('after') or None
+    if after and not (CURSOR.fullmatch(after) if kind == 'spending' else after.isdigit()):
+        raise ValueError("after must be the 'next' value of a previous page")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+
+    return {'q': (args.get('q') or '').strip(), 'type': kind, 'start': start, 'end': end,
+            'after': after, 'limit': limit}
+
+
+def highlight(text):
+    """Escape a snippet and turn its match markers into <mark> tags"""
+    return str(escape(text or '')).replace(OPEN, '<mark>').replace(CLOSE, '</mark>')
+
+
+def _date_filters(query, column):
+    sql, params = '', []
+    if query['start']:
+        sql += f' AND {column} >= ?'
+        params.append(query['start'].isoformat())
+    if query['end']:
+        sql += f' AND {column} <= ?'
+        params.append(query['end'].isoformat())
+    return sql, params
+
+
+def search_spending(conn, query, expression):
+    """(rows, next cursor, truncated): entries of the best-ranked items, newest first within an item.
+
+    The cursor is item id:date:entry id of the last row; each item's entries
+    come off idx_spending_log_item_date, so a page reads about `limit` rows.
+    truncated is true when more than MAX_ITEMS items matched.
+    """
+    items = conn.execute(f'''
+        SELECT rowid, item, highlight(item_search, 0, '{OPEN}', '{CLOSE}')
+        FROM item_search WHERE item_search MATCH ?
+        ORDER BY rank, rowid
+        LIMIT {MAX_ITEMS + 1}
+    ''', (expression,)).fetchall()
+    truncated = len(items) > MAX_ITEMS
+    items = items[:MAX_ITEMS]
+    filters, filter_params = _date_filters(query, 'date')
+
+    position, keyset, keyset_params = 0, '', []
+    if query['after']:
+        item_id, last_date, last_id = CURSOR.fullmatch(query['after']).groups()
+        ids = [row[0] for row in items]
+        if int(item_id) not in ids:
+            # The item's last entry was deleted since the previous page
+            return [], None, truncated
+        position = ids.index(int(item_id))
+        keyset, keyset_params = ' AND (date, id) < (?, ?)', [last_date, int(last_id)]
+
+    rows = []
+    for item_id, item, snippet in items[position:]:
+        for row in conn.execute(f'''
+            SELECT id, date, item, price, category FROM spending_log
+            WHERE item = ?{filters}{keyset}
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        ''', [item, *filter_params, *keyset_params, query['limit'] + 1 - len(rows)]):
+            rows.append({**dict(row), 'item_id': item_id, 'snippet': highlight(snippet)})
+        keyset, keyset_params = '', []
+        if len(rows) > query['limit']:
+            break
+
+    if len(rows) <= query['limit']:
+        return rows, None, truncated
+    last = rows[query['limit'] - 1]
+    return rows[:query['limit']], f"{last['item_id']}:{last['date']}:{last['id']}", truncated
+
+
+def search_notes(conn, query, expression):
+    """(rows, next cursor, older_end) of personal_log notes; the cursor is the number of rows already shown.
+
+    bm25 costs a little per match, so only the NOTES_WINDOW matches with the
+    latest dates are ranked: the ranked query is bounded below by the window's
+    oldest date. Dates are used rather than rowids because back-filled days
+    get rowids newer than their dates. A date range also bounds both queries
+    by the rowids of the days in it, so FTS5 skips matches outside the range
+    instead of joining each one. older_end is None unless matches were left
+    out of the window; it is the date of the newest of them, so a search
+    ending there ranks exactly the older matches.
+    """
+    filters, params = _date_filters(query, 'p.date')
+    if filters:
+        span_filters, span_params = _date_filters(query, 'date')
+        low, high = conn.execute(f'SELECT MIN(id), MAX(id) FROM personal_log WHERE 1{span_filters}',
+                                 span_params).fetchone()
+        if low is None:
+            return [], None, None
+        filters += ' AND notes_search.rowid BETWEEN ? AND ?'
+        params += [low, high]
+    # The window's oldest match, and the newest one past it if there is one
+    # (personal_log has one row per date, so dates order matches fully)
+    edge = conn.execute(f'''
+        SELECT p.date FROM notes_search
+        JOIN personal_log p ON p.id = notes_search.rowid
+        WHERE notes_search MATCH ?{filters}
+        ORDER BY p.date DESC
+        LIMIT 2 OFFSET {NOTES_WINDOW - 1}
+    ''', [expression, *params]).fetchall()
+    oldest = edge[0][0] if edge else ''
+    older_end = edge[1][0] if len(edge) > 1 else None
+
+    offset = int(query['after'] or 0)
+    rows = [dict(row) for row in conn.execute(f'''
+        SELECT p.id, p.date, p.notes,
+               snippet(notes_search, 0, '{OPEN}', '{CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet
+        FROM notes_search
+        JOIN personal_log p ON p.id = notes_search.rowid
+        WHERE notes_search MATCH ?{filters} AND p.date >= ?
+        ORDER BY notes_search.rank
+        LIMIT ? OFFSET ?
+    ''', [expression, *params, oldest, query['limit'] + 1, offset])]
+    for row in rows:
+        row['snippet'] = highlight(row['snippet'])
+    if len(rows) <= query['limit']:
+        return rows, None, older_end
+    return rows[:query['limit']], str(offset + query['limit']), older_end
+
+
+def search(conn, query):
+    """One page of results for a parsed query"""
+    expression = match_expression(query['q'])
+    truncated, older_end = False, None
+    if expression is None:
+        rows, next_cursor = [], None
+    elif query['type'] == 'spending':
+        rows, next_cursor, truncated = search_spending(conn, query, expression)
+    else:
+        rows, next_cursor, older_end = search_notes(conn, query, expression)
+        truncated = older_end is not None
+    return {
+        'q': query['q'],
+        'type': query['type'],
+        'start': query['start'].isoformat() if query['start'] else None,
+        'end': query['end'].isoformat() if query['end'] else None,
+        'results': rows,
+        'next': next_cursor,
+        'truncated': truncated,
+        'older_end': older_end,
+    }
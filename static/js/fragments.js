@@ -0,0 +1,165 @@
+// In-place updates for the spending and personal forms.
+// Forms marked data-fragment="<kind>" are posted with fetch() asking for JSON;
+// the reply carries only the changed rows and totals as rendered HTML, which
+// replace or slot into the page. Without JavaScript the forms post normally
+// and the server redirects to the full page.
+(function () {
+    'use strict';
+
+    function parse(html) {
+        var template = document.createElement('template');
+        template.innerHTML = html.trim();
+        return template.content.firstElementChild;
+    }
+
+    function showAlert(message, category) {
+        var box = document.getElementById('alerts');
+        if (!box || !message) {
+            return;
+        }
+        var alert = document.createElement('div');
+        alert.className = 'alert alert-' + (category === 'error' ? 'danger' : 'success') + ' alert-dismissible fade show';
+        alert.setAttribute('role', 'alert');
+        alert.textContent = message;
+        var close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.setAttribute('data-bs-dismiss', 'alert');
+        alert.appendChild(close);
+        box.replaceChildren(alert);
+    }
+
+    function replaceById(id, html) {
+        var current = document.getElementById(id);
+        if (current && html) {
+            current.replaceWith(parse(html));
+        }
+    }
+
+    // Lists hold [data-date] children newest first, then a [data-empty] placeholder
+    function dated(list) {
+        return Array.prototype.slice.call(list.querySelectorAll(':scope > [data-date]'));
+    }
+
+    function syncEmpty(list) {
+        var placeholder = list.querySelector(':scope > [data-empty]');
+        if (placeholder) {
+            placeholder.hidden = dated(list).length > 0;
+        }
+    }
+
+    function insertByDate(list, element) {
+        var date = element.getAttribute('data-date');
+        var before = dated(list).find(function (child) {
+            return child.getAttribute('data-date') < date;
+        }) || list.querySelector(':scope > [data-empty]');
+        list.insertBefore(element, before);
+        syncEmpty(list);
+    }
+
+    var handlers = {
+        'spending-add': function (form, data) {
+            replaceById('spending-summary', data.summary_html);
+            var list = document.getElementById('spending-days');
+            if (list && data.day_html) {
+                var day = parse(data.day_html);
+                var existing = dated(list).find(function (child) {
+                    return child.getAttribute('data-date') === data.date;
+                });
+                if (existing) {
+                    existing.querySelector('h6').after(day.querySelector('.spending-item'));
+                } else {
+                    insertByDate(list, day);
+                }
+            }
+            // Keep the chosen date for the next entry
+            var date = form.elements.namedItem('date');
+            var chosen = date.value;
+            form.reset();
+            date.value = chosen;
+            // Not form.elements.item: that's the collection's item() method
+            form.elements.namedItem('item').focus();
+        },
+
+        'spending-delete': function (form, data) {
+            replaceById('spending-summary', data.summary_html);
+            var entry = document.getElementById('spending-entry-' + data.deleted);
+            if (!entry) {
+                return;
+            }
+            var day = entry.closest('.spending-day');
+            entry.remove();
+            if (day && !day.querySelector('.spending-item')) {
+                day.remove();
+            }
+            syncEmpty(document.getElementById('spending-days'));
+        },
+
+        'personal-save': function (form, data) {
+            var list = document.getElementById('recent-entries');
+            if (!list || !data.entry_html) {
+                return;
+            }
+            dated(list).forEach(function (child) {
+                if (child.getAttribute('data-date') === data.date) {
+                    child.remove();
+                }
+            });
+            insertByDate(list, parse(data.entry_html));
+            var limit = parseInt(list.getAttribute('data-limit'), 10);
+            dated(list).slice(limit).forEach(function (child) {
+                child.remove();
+            });
+        }
+    };
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        var handler = handlers[form.getAttribute('data-fragment')];
+        // Inline onsubmit handlers (delete confirmations) run first and may have cancelled it
+        if (!handler || event.defaultPrevented || !window.fetch) {
+            return;
+        }
+        event.preventDefault();
+        var button = form.querySelector('[type=submit]');
+        if (button) {
+            button.disabled = true;
+        }
+        fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: {'Accept': 'application/json'},
+            credentials: 'same-origin'
+        }).then(function (response) {
+            if ((response.headers.get('Content-Type') || '').indexOf('application/json') !== 0) {
+                if (response.redirected) {
+                    // Signed out: follow it to the login page
+                    window.location.assign(response.url);
+                } else {
+                    showAlert('Something went wrong (' + response.status + '); reload the page to see what was saved', 'error');
+                }
+                return;
+            }
+            return response.json().then(function (data) {
+                if (!response.ok) {
+                    showAlert(data.error, 'error');
+                    return;
+                }
+                try {
+                    handler(form, data);
+                } catch (error) {
+                    // The write went through; show it from a fresh page
+                    window.location.reload();
+                    return;
+                }
+                showAlert(data.message, 'success');
+            });
+        }).catch(function () {
+            showAlert('Could not reach the server; check the page before trying again', 'error');
+        }).finally(function () {
+            if (button) {
+                button.disabled = false;
+            }
+        });
+    });
+})();
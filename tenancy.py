@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant mode for Finance Tracker
+- Turned on by setting TENANT_DIR (FINANCE_TENANT_DIR); without it the app is
+  single-user on DATABASE, exactly as before
+- TENANT_DIR/tenants.db holds accounts (users) and the database files they map
+  to (shards); each new account gets its own shard, and accounts added with
+  --share-with share one (a household ledger)
+- Every request outside /login, /register and /static needs a logged-in
+  user; the router points the request's database connection, cache keys and
+  trends engine at that user's shard
+- The process-wide stats (/metrics, /api/cache/stats, /api/tenancy/stats)
+  span every tenant, so they need OPERATOR_TOKEN (FINANCE_OPERATOR_TOKEN) as
+  a bearer token instead of a login, and are refused when it isn't set
+- Open shards (a connection pool each) live in an LRU of TENANT_OPEN_SHARDS;
+  shards unused for TENANT_IDLE_SECONDS, or beyond that count, are closed
+- A shard's schema is created (or migrated) the first time a process opens it,
+  so accounts cost nothing until they are used
+- Writers on different shards never wait on each other's SQLite write lock
+
+Usage: python tenancy.py --dir tenants add-user alice [--share-with bob]
+       python tenancy.py --dir tenants list
+       python tenancy.py --dir tenants migrate   # bring every shard up to date now
+"""
+
+import argparse
+import getpass
+import hmac
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, redirect, render_template, request, session, url_for
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import db
+import maintenance
+import migrations
+import periods
+
+DIRECTORY = 'tenants.db'
+SHARD_PATH = 'shards/shard-{:06d}.db'
+
+DEFAULT_OPEN_SHARDS = 64
+DEFAULT_IDLE_SECONDS = 300
+DEFAULT_SHARD_POOL_SIZE = 4
+
+USERNAME = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+MIN_PASSWORD_LENGTH = 8
+
+# Endpoints served without logging in
+PUBLIC_ENDPOINTS = {'login', 'register', 'static'}
+
+# Endpoints reporting on every tenant at once; served only with the operator token
+OPERATOR_ENDPOINTS = {'metrics', 'cache_stats', 'tenancy_stats'}
+
+# Compared against when a username doesn't exist, so failed logins take the same time either way
+_DUMMY_HASH = generate_password_hash('not a password')
+
+
+# ------------------------------
+# Accounts
+# ------------------------------
+def create_directory(conn):
+    """Create the account and shard tables (idempotent)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS shards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL COLLATE NOCASE,
+            password_hash TEXT NOT NULL,
+            shard_id INTEGER NOT NULL REFERENCES shards (id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_shard ON users (shard_id)')
+    maintenance.create_maintenance(conn)
+    conn.commit()
+
+
+def create_user(conn, username, password, share_with=None):
+    """Add an account on a new shard (or on share_with's); returns its id.
+
+    Raises ValueError with a message for the user if the name is taken or
+    either value is unacceptable.
+    """
+    if not USERNAME.fullmatch(username or ''):
+        raise ValueError('Usernames are 1-64 letters, digits, dots, dashes or underscores')
+    if len(password or '') < MIN_PASSWORD_LENGTH:
+        raise ValueError(f'Passwords need at least {MIN_PASSWORD_LENGTH} characters')
+
+    password_hash = generate_password_hash(password)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone():
+            raise ValueError(f'{username} is already taken')
+        if share_with:
+            row = conn.execute('SELECT shard_id FROM users WHERE username = ?', (share_with,)).fetchone()
+            if row is None:
+                raise ValueError(f'No user named {share_with}')
+            shard_id = row[0]
+        else:
+            # The row id picks the file name, so insert first and name it after
+            shard_id = conn.execute("INSERT INTO shards (path) VALUES ('')").lastrowid
+            conn.execute('UPDATE shards SET path = ? WHERE id = ?', (SHARD_PATH.format(shard_id), shard_id))
+        user_id = conn.execute(
+            'INSERT INTO users (username, password_hash, shard_id) VALUES (?, ?, ?)',
+            (username, password_hash, shard_id),
+        ).lastrowid
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return user_id
+
+
+def authenticate(conn, username, password):
+    """The user row for a correct username and password, else None"""
+    row = conn.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,)).fetchone()
+    if row is None:
+        check_password_hash(_DUMMY_HASH, password)
+        return None
+    return row['id'] if check_password_hash(row['password_hash'], password) else None
+
+
+def load_user(conn, user_id):
+    return conn.execute('''
+        SELECT u.id, u.username, s.id AS shard_id, s.path
+        FROM users u JOIN shards s ON s.id = u.shard_id
+        WHERE u.id = ?
+    ''', (user_id,)).fetchone()
+
+
+def shard_paths(conn, tenant_dir):
+    """Absolute paths of every shard that has been created on disk"""
+    paths = (os.path.join(tenant_dir, row[0]) for row in conn.execute('SELECT path FROM shards ORDER BY id'))
+    return [path for path in paths if os.path.exists(path)]
+
+
+# ------------------------------
+# Shards
+# ------------------------------
+def open_shard(path, directory):
+    """Create or migrate a shard's schema; cheap (one PRAGMA read) once it's current"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = db.connect(path)
+    try:
+        if migrations.current_version(conn) != migrations.MIGRATIONS[-1][0]:
+            # Steps commit as they go, so two processes opening a new shard at once would both
+            # run them: serialize on the directory's write lock (migrate() re-reads the version)
+            lock = db.connect(directory)
+            try:
+                lock.execute('BEGIN IMMEDIATE')
+                migrations.migrate(conn)
+            finally:
+                lock.rollback()
+                lock.close()
+        migrations.check(conn)
+    finally:
+        conn.close()
+
+
+class Shard:
+    """One open shard: its connection pool and per-database state (the trends engine)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pool = None
+        self.extensions = {}
+        self.users = 0
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open(self, directory, size, timeout, factory):
+        with self._lock:
+            if self.pool is None:
+                open_shard(self.path, directory)
+                self.pool = db.ConnectionPool(self.path, size=size, timeout=timeout, factory=factory)
+
+    def close(self):
+        write_queue = self.extensions.get('write_queue')
+        if write_queue is not None:
+            write_queue.close()
+        if self.pool is not None:
+            self.pool.close_all()
+        self.extensions.clear()
+        periods.forget(self.path)
+
+
+class ShardCache:
+    """LRU of open shards.
+
+    checkout() pins a shard for the length of a request; only unpinned shards
+    are closed, when there are more than max_open or they have been idle for
+    idle_seconds.
+    """
+
+    def __init__(self, directory, max_open=DEFAULT_OPEN_SHARDS, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 pool_size=DEFAULT_SHARD_POOL_SIZE, pool_timeout=db.DEFAULT_POOL_TIMEOUT,
+                 factory=sqlite3.Connection):
+        self.directory = directory
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.factory = factory
+        self.opened = 0
+        self.evicted = 0
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, path):
+        with self._lock:
+            shard = self._shards.get(path)
+            if shard is None:
+                shard = self._shards[path] = Shard(path)
+                self.opened += 1
+            self._shards.move_to_end(path)
+            shard.users += 1
+            self._evict()
+        try:
+            # Outside the LRU lock: creating a new shard's schema mustn't hold up other tenants
+            shard.open(self.directory, self.pool_size, self.pool_timeout, self.factory)
+        except Exception:
+            self.checkin(shard)
+            raise
+        return shard
+
+    def checkin(self, shard):
+        with self._lock:
+            shard.users -= 1
+            shard.last_used = time.monotonic()
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        for path, shard in list(self._shards.items()):
+            if shard.users:
+                continue
+            if len(self._shards) <= self.max_open and now - shard.last_used < self.idle_seconds:
+                break  # oldest first, so the rest were used more recently
+            del self._shards[path]
+            shard.close()
+            self.evicted += 1
+
+    def close_all(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.close()
+            self._shards.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': len(self._shards),
+                'in_use': sum(1 for shard in self._shards.values() if shard.users),
+                'opened': self.opened,
+                'evicted': self.evicted,
+            }
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def enabled(app=None):
+    return bool((app or current_app).config.get('TENANT_DIR'))
+
+
+def directory_path(app=None):
+    return os.path.join((app or current_app).config['TENANT_DIR'], DIRECTORY)
+
+
+def get_directory_pool(app=None):
+    """Get (or lazily create) the pool of connections to tenants.db"""
+    app = app or current_app
+    pool = app.extensions.get('tenant_directory')
+    if pool is None:
+        pool = db.ConnectionPool(
+            directory_path(app),
+            size=app.config.get('DB_POOL_SIZE', db.DEFAULT_POOL_SIZE),
+            timeout=app.config.get('DB_POOL_TIMEOUT', db.DEFAULT_POOL_TIMEOUT),
+            factory=app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection),
+        )
+        app.extensions['tenant_directory'] = pool
+    return pool
+
+
+def get_shards(app=None):
+    """Get (or lazily create) the app's shard LRU"""
+    app = app or current_app
+    shards = app.extensions.get('shards')
+    if shards is None:
+        shards = app.extensions.setdefault('shards', ShardCache(
+            directory_path(app),
+            max_open=app.config['TENANT_OPEN_SHARDS'],
+            idle_seconds=app.config['TENANT_IDLE_SECONDS'],
+            pool_size=app.config['TENANT_POOL_SIZE'],
+            pool_timeout=app.config.get('DB_POOL_TIMEOUT', db.DEFAULT_POOL_TIMEOUT),
+            factory=app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection),
+        ))
+    return shards
+
+
+def directory_query(fn, *args):
+    """Run fn(conn, *args) on a pooled tenants.db connection"""
+    pool = get_directory_pool()
+    conn = pool.acquire()
+    try:
+        return fn(conn, *args)
+    finally:
+        pool.release(conn)
+
+
+def init_directory(app):
+    """Create TENANT_DIR and tenants.db (called from init_db)"""
+    os.makedirs(app.config['TENANT_DIR'], exist_ok=True)
+    conn = db.connect(directory_path(app))
+    try:
+        create_directory(conn)
+    finally:
+        conn.close()
+
+
+def all_databases(app):
+    """tenants.db and every shard, for the maintenance scheduler"""
+    conn = db.connect(directory_path(app))
+    try:
+        return [directory_path(app)] + shard_paths(conn, app.config['TENANT_DIR'])
+    finally:
+        conn.close()
+
+
+def _check_operator():
+    """Let the request through only with Authorization: Bearer <OPERATOR_TOKEN>"""
+    expected = current_app.config['OPERATOR_TOKEN']
+    scheme, _, sent = request.headers.get('Authorization', '').partition(' ')
+    if expected and scheme.lower() == 'bearer' and hmac.compare_digest(sent.strip(), expected):
+        return None
+    return jsonify({'error': 'operator token required'}), 401
+
+
+def _route_request():
+    """Resolve the logged-in user and point the request at their shard"""
+    if request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return None
+    if request.endpoint in OPERATOR_ENDPOINTS:
+        return _check_operator()
+    user_id = session.get('user_id')
+    user = directory_query(load_user, user_id) if user_id is not None else None
+    if user is None:
+        session.pop('user_id', None)
+        if request.path.startswith('/api/'):
+            return jsonify({'error': 'login required'}), 401
+        return redirect(url_for('login', next=request.full_path.rstrip('?')))
+
+    shard = get_shards().checkout(os.path.join(current_app.config['TENANT_DIR'], user['path']))
+    g.user = user
+    g.shard = shard
+    g.database = shard.path
+    g.db_pool = shard.pool
+    g.db_extensions = shard.extensions
+    return None
+
+
+def _release_shard(exception=None):
+    shard = g.pop('shard', None)
+    if shard is not None:
+        # The connection goes back before the shard is unpinned, or eviction could strand it
+        db.close_db()
+        get_shards().checkin(shard)
+
+
+def _safe_next(target):
+    return target if target and target.startswith('/') and not target.startswith('//') else url_for('main.dashboard')
+
+
+def init_app(app):
+    """Route requests to tenant shards when TENANT_DIR is set; no-op otherwise"""
+    app.config.setdefault('TENANT_DIR', os.environ.get('FINANCE_TENANT_DIR'))
+    app.config.setdefault('TENANT_OPEN_SHARDS', DEFAULT_OPEN_SHARDS)
+    app.config.setdefault('TENANT_IDLE_SECONDS', DEFAULT_IDLE_SECONDS)
+    app.config.setdefault('TENANT_POOL_SIZE', DEFAULT_SHARD_POOL_SIZE)
+    app.config.setdefault('TENANT_REGISTRATION', os.environ.get('FINANCE_REGISTRATION', '1') != '0')
+    app.config.setdefault('OPERATOR_TOKEN', os.environ.get('FINANCE_OPERATOR_TOKEN'))
+
+    @app.context_processor
+    def current_user():
+        return {'multi_tenant': enabled(app), 'current_user': g.get('user')}
+
+    if not enabled(app):
+        return app
+
+    app.config['MAINTENANCE_DATABASES'] = lambda: all_databases(app)
+    if not app.config.get('MAINTENANCE_BACKUP_DIR'):
+        app.config['MAINTENANCE_BACKUP_DIR'] = os.path.join(app.config['TENANT_DIR'], 'backups')
+    app.before_request(_route_request)
+    app.teardown_request(_release_shard)
+
+    @app.route('/login', methods=['GET', 'POST'])
+    def login():
+        """Log in and go back to the page that asked for it"""
+        if request.method == 'POST':
+            user_id = directory_query(authenticate, request.form.get('username', ''), request.form.get('password', ''))
+            if user_id is not None:
+                session.clear()
+                session['user_id'] = user_id
+                return redirect(_safe_next(request.args.get('next')))
+            return render_template('login.html', mode='login', error='Wrong username or password'), 401
+        return render_template('login.html', mode='login')
+
+    @app.route('/register', methods=['GET', 'POST'])
+    def register():
+        """Create an account (on its own new shard) and log in"""
+        if not app.config['TENANT_REGISTRATION']:
+            return render_template('login.html', mode='login', error='Registration is closed'), 403
+        if request.method == 'POST':
+            try:
+                user_id = directory_query(create_user, request.form.get('username', ''),
+                                          request.form.get('password', ''))
+            except ValueError as e:
+                return render_template('login.html', mode='register', error=str(e)), 400
+            session.clear()
+            session['user_id'] = user_id
+            return redirect(url_for('main.dashboard'))
+        return render_template('login.html', mode='register')
+
+    @app.route('/logout', methods=['POST'])
+    def logout():
+        session.clear()
+        return redirect(url_for('login'))
+
+    @app.route('/api/tenancy/stats')
+    def tenancy_stats():
+        """Open, pinned, opened and evicted shard counts for this process"""
+        return get_shards().stats()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=os.environ.get('FINANCE_TENANT_DIR', 'tenants'), help='TENANT_DIR')
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add-user', help='Create an account (prompts for the password)')
+    add.add_argument('username')
+    add.add_argument('--share-with', help="Put the account on this user's shard")
+    sub.add_parser('list', help='List accounts and their shards')
+    sub.add_parser('migrate', help='Create or migrate every shard now instead of on first use')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    conn = db.connect(os.path.join(args.dir, DIRECTORY))
+    create_directory(conn)
+    if args.command == 'add-user':
+        password = getpass.getpass(f'Password for {args.username}: ')
+        try:
+            create_user(conn, args.username, password, args.share_with)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        print(f"✅ Added {args.username}")
+    elif args.command == 'list':
+        for row in conn.execute('''
+            SELECT u.username, s.path, u.created_at FROM users u JOIN shards s ON s.id = u.shard_id ORDER BY u.id
+        '''):
+            print(f"   {row['username']:<24} {row['path']:<28} {row['created_at']}")
+    else:
+        for (path,) in conn.execute('SELECT path FROM shards ORDER BY id').fetchall():
+            open_shard(os.path.join(args.dir, path), os.path.join(args.dir, DIRECTORY))
+            print(f"   ✅ {path}")
+        print(f"✅ Every shard at schema version {migrations.MIGRATIONS[-1][0]}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Custom activity name tests
+- An activity whose name is an SQL keyword works as a personal export column
+  and as an analytics series field
+- Names that would repeat an exported column are refused
+"""
+
+import csv
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+import activities
+import analytics
+import db
+import export
+from benchmarks import datagen
+
+ROWS = 500
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'export.db')
+    datagen.generate(path, ROWS)
+    conn = db.connect(path)
+    yield conn
+    conn.close()
+
+
+def test_keyword_activity_name_is_exported(conn):
+    activities.add(conn, 'order', 'Order')
+    header = next(csv.reader(io.StringIO(b''.join(export.export(conn, 'personal', 'csv')).decode())))
+    parquet = pq.read_table(io.BytesIO(b''.join(export.export(conn, 'personal', 'parquet'))))
+    assert 'order' in header
+    assert 'order' in parquet.column_names
+
+
+def test_keyword_activity_name_is_a_series_field(conn):
+    activities.add(conn, 'order', 'Order')
+    query = analytics.parse_args({'fields': 'spending,order'}, activities.load(conn))
+    rows = analytics.series(conn, query).fetchall()
+    assert rows and len(rows[0]) == 5  # bucket, start, end, spending, order
+
+
+@pytest.mark.parametrize('name', export.TABLES['personal'][1])
+def test_export_column_names_are_refused(conn, name):
+    with pytest.raises(ValueError):
+        activities.add(conn, name, name.title())
@@ -0,0 +1,33 @@
+"""
+Connection pool tests
+- close_all() while connections are checked out: releasing them afterwards
+  closes them instead of overfilling the idle queue
+- A closed pool refuses to hand out connections
+"""
+
+import sqlite3
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return db.ConnectionPool(str(tmp_path / 'pool.db'), size=2, timeout=0.1)
+
+
+def test_release_after_close_all_closes_the_connection(pool):
+    idle, held = pool.acquire(), pool.acquire()
+    pool.release(idle)
+    pool.close_all()
+    pool.release(held)
+    for conn in (idle, held):
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+
+def test_closed_pool_refuses_acquire(pool):
+    pool.close_all()
+    with pytest.raises(db.PoolClosed):
+        pool.acquire()
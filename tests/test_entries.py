@@ -0,0 +1,44 @@
+"""
+Spending entry validation tests
+- Prices must be finite: inf and nan are refused by the batch API and the
+  form route instead of being stored
+"""
+
+import json
+
+import pytest
+
+import entries
+from app import create_app
+from benchmarks import datagen
+
+ROWS = 200
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = str(tmp_path / 'entries.db')
+    datagen.generate(path, ROWS)
+    # The form post below carries no CSRF token
+    app = create_app({'DATABASE': path, 'MAINTENANCE_ENABLED': False, 'CSRF_ENABLED': False})
+    return app.test_client()
+
+
+@pytest.mark.parametrize('price', [float('inf'), float('-inf'), float('nan'), 0, -1])
+def test_validate_spending_refuses_price(price):
+    rows, results = entries.validate_spending([{'date': '2024-01-01', 'item': 'Coffee', 'price': price}])
+    assert rows is None
+    assert results[0]['errors'] == ['price must be a positive number']
+
+
+def test_batch_refuses_infinite_price(client):
+    body = json.dumps({'entries': [{'date': '2024-01-01', 'item': 'Coffee', 'price': float('inf')}]})
+    response = client.post('/api/spending/batch', data=body, content_type='application/json')
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize('price', ['inf', 'nan'])
+def test_form_refuses_non_finite_price(client, price):
+    response = client.post('/spending/add', data={'date': '2024-01-01', 'item': 'Coffee', 'price': price},
+                           headers={'Accept': 'application/json'})
+    assert response.status_code == 400
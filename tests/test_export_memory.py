@@ -0,0 +1,70 @@
+"""
+Bounded-memory export tests
+- Exports the same synthetic table at two sizes, 4x apart, in every format
+  and asserts the peak Python allocation (tracemalloc) doesn't grow with it:
+  a regression that collected rows before encoding them would add megabytes
+- python -m benchmarks.export_memory checks process RSS at millions of rows
+"""
+
+import csv
+import io
+import tracemalloc
+
+import pytest
+
+import db
+import export
+from benchmarks import datagen
+
+SMALL_ROWS = 5000
+LARGE_ROWS = SMALL_ROWS * 4
+CHUNK_SIZE = 1000
+# Allowed growth in peak allocation from the small export to the large one
+SLACK_KB = 256
+
+
+@pytest.fixture(scope='module')
+def databases(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('export')
+    paths = {}
+    for rows in (SMALL_ROWS, LARGE_ROWS):
+        paths[rows] = str(directory / f'{rows}.db')
+        datagen.generate(paths[rows], rows)
+    return paths
+
+
+def export_peak(path, fmt):
+    """Returns (peak KB allocated while exporting, bytes written)"""
+    conn = db.connect(path)
+    try:
+        written = 0
+        tracemalloc.start()
+        try:
+            for data in export.export(conn, 'spending', fmt, chunk_size=CHUNK_SIZE):
+                written += len(data)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        conn.close()
+    return peak / 1024, written
+
+
+@pytest.mark.parametrize('fmt', list(export.FORMATS))
+def test_peak_memory_is_flat(databases, fmt):
+    export_peak(databases[SMALL_ROWS], fmt)  # imports and first-use caches (pyarrow) aren't part of the export
+    small, small_bytes = export_peak(databases[SMALL_ROWS], fmt)
+    large, large_bytes = export_peak(databases[LARGE_ROWS], fmt)
+    assert large_bytes > 3 * small_bytes
+    assert large <= small * 1.25 + SLACK_KB, f'{fmt}: peak {small:.0f} KB at {SMALL_ROWS} rows, {large:.0f} KB at {LARGE_ROWS}'
+
+
+def test_csv_exports_every_row(databases):
+    conn = db.connect(databases[SMALL_ROWS])
+    try:
+        body = b''.join(export.export(conn, 'spending', 'csv', chunk_size=CHUNK_SIZE)).decode()
+    finally:
+        conn.close()
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == list(export.TABLES['spending'][1])
+    assert len(rows) - 1 == SMALL_ROWS
@@ -0,0 +1,38 @@
+"""
+Statement metrics tests
+- Statements that differ only in literals or placeholder counts share a label
+- The number of statement labels is capped; later statements share "other"
+"""
+
+import pytest
+
+import db
+import metrics
+
+
+@pytest.fixture
+def conn():
+    conn = db.connect(':memory:', metrics.InstrumentedConnection)
+    metrics.reset()  # drop the connection's PRAGMAs
+    yield conn
+    conn.close()
+    metrics.reset()
+
+
+def statement_labels():
+    return {line.split('statement="')[1].split('"')[0]
+            for line in metrics.render().splitlines() if line.startswith('finance_query_rows_total')}
+
+
+def test_literals_and_placeholder_lists_share_a_label(conn):
+    for count in range(1, 6):
+        conn.execute(f"SELECT {count}, 'x' WHERE 1 IN ({', '.join('?' * count)})", (1,) * count).fetchall()
+    assert statement_labels() == {'SELECT ?, ? WHERE ? IN (?)'}
+
+
+def test_statement_labels_are_capped(conn):
+    for index in range(metrics.MAX_STATEMENTS + 10):
+        conn.execute(f'SELECT 1 AS column_{index}').fetchall()
+    labels = statement_labels()
+    assert len(labels) == metrics.MAX_STATEMENTS + 1
+    assert metrics.OTHER in labels
@@ -0,0 +1,66 @@
+"""
+Query-plan regression tests
+- Builds a small synthetic database, drives every route through the test
+  client and runs EXPLAIN QUERY PLAN on each distinct statement issued
+- Fails if any statement scans spending_log, personal_log or another large
+  table in full; plans are checked both without planner statistics (a new
+  database) and after the maintenance job's ANALYZE
+- python -m benchmarks.query_plans runs the same check at millions of rows
+"""
+
+import sqlite3
+
+import pytest
+
+import maintenance
+import migrations
+from benchmarks import query_plans
+
+ROWS = 5000
+
+
+@pytest.fixture(scope='module')
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    query_plans.build(path, ROWS)
+    return path
+
+
+@pytest.fixture(scope='module')
+def statements(database):
+    app = query_plans.make_app(database)
+    return query_plans.exercise_routes(app)
+
+
+def test_routes_issue_reads_and_writes(statements):
+    keywords = {sql.split(' ', 1)[0].upper() for sql in statements}
+    assert {'SELECT', 'INSERT', 'DELETE'} <= keywords
+
+
+def assert_no_full_scans(conn, statements):
+    scans = [f'{", ".join(tables)}: {sql[:120]}'
+             for sql, tables in query_plans.check_plans(conn, statements) if tables]
+    assert not scans, 'full table scans:\n' + '\n'.join(scans)
+
+
+def test_no_full_table_scans(database, statements):
+    conn = sqlite3.connect(database)
+    try:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        assert_no_full_scans(conn, statements)
+    finally:
+        conn.close()
+
+
+def test_no_full_table_scans_after_analyze(database, statements, tmp_path):
+    # On a copy, so the other test keeps planning without statistics
+    source = sqlite3.connect(database)
+    conn = sqlite3.connect(str(tmp_path / 'analyzed.db'))
+    try:
+        source.backup(conn)
+        migrations.migrate(conn)
+        maintenance.analyze(conn)
+        assert_no_full_scans(conn, statements)
+    finally:
+        source.close()
+        conn.close()
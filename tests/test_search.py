@@ -0,0 +1,57 @@
+"""
+Notes search window tests
+- The ranked window is the matches with the latest dates, even when older
+  days were back-filled after newer ones
+- Following older_end from page to page reaches every match exactly once
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import db
+import migrations
+import search
+
+WINDOW = 10
+START = date(2024, 1, 1)
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, 'NOTES_WINDOW', WINDOW)
+    conn = db.connect(str(tmp_path / 'search.db'))
+    migrations.migrate(conn)
+    recent = [START + timedelta(days=i) for i in range(30)]
+    # Back-filled after the recent days, so these older dates get newer rowids
+    backfill = [START - timedelta(days=i) for i in range(1, 31)]
+    conn.executemany('INSERT INTO personal_log (date, notes) VALUES (?, ?)',
+                     [(day.isoformat(), 'leg day') for day in recent + backfill])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def notes_page(conn, end=None):
+    args = {'q': 'leg', 'type': 'notes', 'limit': str(search.MAX_LIMIT)}
+    if end:
+        args['end'] = end
+    return search.search(conn, search.parse_args(args))
+
+
+def test_window_holds_the_latest_dates(conn):
+    page = notes_page(conn)
+    dates = sorted(row['date'] for row in page['results'])
+    assert dates == [(START + timedelta(days=i)).isoformat() for i in range(30 - WINDOW, 30)]
+    assert page['older_end'] == (START + timedelta(days=29 - WINDOW)).isoformat()
+
+
+def test_older_end_pages_cover_every_match_once(conn):
+    seen, end = [], None
+    while True:
+        page = notes_page(conn, end)
+        seen += [row['date'] for row in page['results']]
+        end = page['older_end']
+        if not end:
+            break
+    assert len(seen) == len(set(seen)) == 60
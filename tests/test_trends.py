@@ -0,0 +1,38 @@
+"""
+Trends report tests
+- A range that ends before the first logged day reports no days instead of
+  indexing before the start of the per-day arrays
+"""
+
+import pytest
+
+import trends
+from app import create_app
+from benchmarks import datagen
+
+ROWS = 2000
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('trends') / 'trends.db')
+    datagen.generate(path, ROWS)
+    app = create_app({'DATABASE': path, 'MAINTENANCE_ENABLED': False})
+    return app.test_client()
+
+
+@pytest.mark.parametrize('report', trends.REPORTS)
+def test_range_before_the_data_is_empty(client, report):
+    response = client.get(f'/api/trends/{report}?start=1999-12-01&end=2000-01-01')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['start'], data['end']) == ('1999-12-01', '2000-01-01')
+    assert data.get('dates', []) == []
+    assert data.get('weekdays', []) == []
+    assert data.get('days_logged', 0) == 0
+
+
+def test_end_before_the_data_without_start(client):
+    response = client.get('/api/trends/rolling?end=2000-01-01')
+    assert response.status_code == 200
+    assert response.get_json()['rolling'] == {str(window): [] for window in trends.DEFAULT_WINDOWS}
@@ -0,0 +1,479 @@
+"""
+Columnar trends engine for Finance Tracker
+- Loads spending_log and personal_log once into NumPy columns and keeps
+  per-day spending, entry and category arrays and activity masks next to them
+- Triggers record the id of every changed row in trend_changes; refresh()
+  re-reads just those rows, appends new ones and patches the per-day arrays
+- Rolling windows, weekday patterns, activity streaks and activity/spending
+  cross-tabs are vectorized over the per-day arrays, so a decade of history
+  costs milliseconds
+- Reports cover the active activities from activities.load(), including ones
+  added after the personal_log columns
+"""
+
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import activities
+import activity_bits
+import categories
+import db
+
+log = logging.getLogger('finance')
+
+# Journal rows kept; an engine that falls further behind reloads from scratch
+JOURNAL_SIZE = 100_000
+JOURNALED_TABLES = ('spending_log', 'personal_log')
+RESET = '*'
+
+# Changed rows beyond this are cheaper to pick up with a full reload
+RELOAD_THRESHOLD = 50_000
+LOAD_CHUNK = 100_000
+FETCH_CHUNK = 500
+
+REPORTS = ('rolling', 'weekdays', 'streaks', 'co_occurrence', 'correlations')
+DEFAULT_WINDOWS = (7, 30, 90)
+MAX_WINDOW = 3660
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+EPOCH = date(1970, 1, 1)
+
+# Dates come out of SQLite as days since 1970-01-01, so no per-row parsing
+DAY = 'CAST(julianday(date) - 2440587.5 AS INTEGER)'
+SPENDING_COLUMNS = f"id, {DAY}, price, IFNULL(category, '{categories.DEFAULT_CATEGORY}')"
+# Every activity form or batch save also upserts the day's personal_log row, so
+# the journal picks up changes to the activity_log-only activities too
+PERSONAL_COLUMNS = f"id, {DAY}, {activity_bits.DAY_MASK_SQL}"
+
+# Full loads read whole tables on purpose
+LOAD_QUERIES = (
+    f'SELECT {SPENDING_COLUMNS} FROM spending_log ORDER BY id',
+    f'SELECT {PERSONAL_COLUMNS} FROM personal_log',
+)
+
+
+# ------------------------------
+# Change journal
+# ------------------------------
+def create_change_journal(conn):
+    """Create trend_changes, its size cap and the triggers that fill it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trend_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trend_changes_trim
+        AFTER INSERT ON trend_changes
+        BEGIN DELETE FROM trend_changes WHERE seq <= NEW.seq - {JOURNAL_SIZE}; END
+    ''')
+    create_journal_triggers(conn)
+
+
+def create_journal_triggers(conn):
+    for table in JOURNALED_TABLES:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_trends_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN INSERT INTO trend_changes (table_name, row_id) VALUES ('{table}', {row}.id); END
+            ''')
+
+
+def drop_journal_triggers(conn):
+    """Drop the journal triggers ahead of a bulk load; mark_reset() once afterwards"""
+    for table in JOURNALED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {table}_trends_{event}')
+
+
+def mark_reset(conn):
+    """Make every loaded engine reload from scratch on its next refresh"""
+    conn.execute('INSERT INTO trend_changes (table_name, row_id) VALUES (?, 0)', (RESET,))
+
+
+def journal_bounds(conn):
+    """(oldest, newest) journal sequence numbers, 0 when empty"""
+    # Separate subqueries so each one is a single b-tree lookup
+    return tuple(conn.execute('''
+        SELECT IFNULL((SELECT MIN(seq) FROM trend_changes), 0),
+               IFNULL((SELECT MAX(seq) FROM trend_changes), 0)
+    ''').fetchone())
+
+
+# ------------------------------
+# Engine
+# ------------------------------
+class _Reload(Exception):
+    """Raised while applying changes when only a full reload will do"""
+
+
+class _Columns:
+    """Append-only NumPy columns with amortized growth"""
+
+    def __init__(self, dtypes):
+        self.size = 0
+        self.arrays = {name: np.empty(0, dtype) for name, dtype in dtypes.items()}
+
+    def append(self, **columns):
+        count = len(next(iter(columns.values())))
+        needed = self.size + count
+        capacity = len(self.arrays['id'])
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity, 1024)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, values in columns.items():
+            self.arrays[name][self.size:needed] = values
+        self.size = needed
+
+    def __getitem__(self, name):
+        return self.arrays[name][:self.size]
+
+
+class Trends:
+    """In-memory columnar copy of spending_log and personal_log.
+
+    Spending rows live in id order (ids are AUTOINCREMENT, so new rows always
+    append); deleted rows stay as dead slots. Per-day arrays start at
+    `origin` (days since 1970-01-01) and run through the last day seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seq = None
+        self.loads = 0
+
+    # -- loading ---------------------------------------------------------
+    def _clear(self):
+        self.spending = _Columns({'id': np.int64, 'day': np.int32, 'price': np.float64,
+                                  'category': np.int16, 'alive': np.bool_})
+        self.category_names = []
+        self._category_codes = {}
+        self.personal_days = {}
+        self.origin = None
+        self.spend = np.zeros(0)
+        self.entries = np.zeros(0, np.int64)
+        self.category_spend = np.zeros((0, 0))
+        self.logged = np.zeros(0, np.bool_)
+        self.masks = np.zeros(0, np.int64)
+
+    def _load(self, conn, seq):
+        started = time.perf_counter()
+        self._clear()
+        cursor = conn.execute(LOAD_QUERIES[0])
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK)
+            if not rows:
+                break
+            self._append_spending(pd.DataFrame.from_records(rows, columns=('id', 'day', 'price', 'category')))
+        personal = conn.execute(LOAD_QUERIES[1]).fetchall()
+        self._set_personal(personal)
+        today = (date.today() - EPOCH).days
+        self._ensure_days(today, today)
+        self.seq = seq
+        self.loads += 1
+        log.info('trends_load spending=%d personal=%d days=%d seconds=%.2f',
+                 self.spending.size, len(personal), len(self.spend), time.perf_counter() - started)
+
+    def _ensure_days(self, low, high):
+        """Grow the per-day arrays to cover days low..high"""
+        if self.origin is None:
+            self.origin = low
+        last = self.origin + len(self.spend) - 1
+        before, after = max(self.origin - low, 0), max(high - last, 0)
+        if not before and not after:
+            return
+        self.origin -= before
+        pad = (before, after)
+        self.spend = np.pad(self.spend, pad)
+        self.entries = np.pad(self.entries, pad)
+        self.logged = np.pad(self.logged, pad)
+        self.category_spend = np.pad(self.category_spend, ((0, 0), pad))
+        self.masks = np.pad(self.masks, pad)
+
+    def _codes(self, names):
+        """Category codes for an array of names, registering new categories"""
+        for name in pd.unique(names):
+            if name not in self._category_codes:
+                self._category_codes[name] = len(self.category_names)
+                self.category_names.append(name)
+        if len(self.category_spend) < len(self.category_names):
+            missing = len(self.category_names) - len(self.category_spend)
+            self.category_spend = np.pad(self.category_spend, ((0, missing), (0, 0)))
+        return pd.Series(names).map(self._category_codes).to_numpy(np.int16)
+
+    def _accumulate(self, days, prices, codes, sign):
+        """Add (sign=1) or remove (sign=-1) rows' contributions to the per-day arrays"""
+        length = len(self.spend)
+        index = days - self.origin
+        self.spend += sign * np.bincount(index, weights=prices, minlength=length)
+        self.entries += sign * np.bincount(index, minlength=length)
+        flat = codes.astype(np.int64) * length + index
+        self.category_spend += sign * np.bincount(
+            flat, weights=prices, minlength=self.category_spend.size).reshape(self.category_spend.shape)
+
+    def _append_spending(self, frame):
+        days = frame['day'].to_numpy(np.int32)
+        prices = frame['price'].to_numpy(np.float64)
+        self._ensure_days(int(days.min()), int(days.max()))
+        codes = self._codes(frame['category'].to_numpy())
+        self.spending.append(id=frame['id'].to_numpy(np.int64), day=days, price=prices, category=codes, alive=True)
+        self._accumulate(days, prices, codes, 1)
+
+    def _set_personal(self, rows):
+        if not rows:
+            return
+        rows = np.array(rows, dtype=np.int64)
+        self._ensure_days(int(rows[:, 1].min()), int(rows[:, 1].max()))
+        index = rows[:, 1] - self.origin
+        self.logged[index] = True
+        self.masks[index] = rows[:, 2]
+        self.personal_days.update(zip(rows[:, 0].tolist(), rows[:, 1].tolist()))
+
+    # -- incremental refresh ---------------------------------------------
+    def refresh(self, conn):
+        """Bring the engine up to date with the database"""
+        # One read transaction, so the journal and the rows agree
+        conn.execute('BEGIN')
+        try:
+            oldest, newest = journal_bounds(conn)
+            if self.seq is None or oldest > self.seq + 1 or newest - self.seq > RELOAD_THRESHOLD:
+                self._load(conn, newest)
+            elif newest > self.seq:
+                changes = conn.execute('SELECT table_name, row_id FROM trend_changes WHERE seq > ?',
+                                       (self.seq,)).fetchall()
+                self.seq = None  # a failure part-way forces a reload next time
+                try:
+                    self._apply(conn, changes)
+                except _Reload:
+                    self._load(conn, newest)
+                self.seq = newest
+        finally:
+            conn.rollback()
+
+    def _fetch(self, conn, sql, ids):
+        rows = []
+        for i in range(0, len(ids), FETCH_CHUNK):
+            chunk = ids[i:i + FETCH_CHUNK]
+            rows += conn.execute(sql.format(', '.join('?' * len(chunk))), chunk).fetchall()
+        return rows
+
+    def _apply(self, conn, changes):
+        spending_ids, personal_ids = set(), set()
+        for table, row_id in changes:
+            if table == RESET:
+                raise _Reload()
+            (spending_ids if table == 'spending_log' else personal_ids).add(row_id)
+        if spending_ids:
+            self._apply_spending(conn, sorted(spending_ids))
+        if personal_ids:
+            self._apply_personal(conn, sorted(personal_ids))
+
+    def _positions(self, ids):
+        """Slots of the given ids, and which of them are present"""
+        column = self.spending['id']
+        positions = np.searchsorted(column, ids)
+        found = positions < len(column)
+        found[found] = column[positions[found]] == ids[found]
+        return positions, found
+
+    def _apply_spending(self, conn, ids):
+        # Take every changed row out, then put back the current version of
+        # those that still exist
+        positions, found = self._positions(np.array(ids, np.int64))
+        old = positions[found]
+        old = old[self.spending['alive'][old]]
+        if len(old):
+            self._accumulate(self.spending['day'][old], self.spending['price'][old],
+                             self.spending['category'][old], -1)
+            self.spending['alive'][old] = False
+
+        rows = self._fetch(conn, f'SELECT {SPENDING_COLUMNS} FROM spending_log WHERE id IN ({{}})', ids)
+        if not rows:
+            return
+        frame = pd.DataFrame.from_records(rows, columns=('id', 'day', 'price', 'category')).sort_values('id')
+        positions, found = self._positions(frame['id'].to_numpy(np.int64))
+        new = frame[~found]
+        if len(new) and self.spending.size and new['id'].iloc[0] <= self.spending['id'][-1]:
+            raise _Reload()  # an id below the newest one: not an append
+        if found.any():
+            existing = frame[found]
+            days = existing['day'].to_numpy(np.int32)
+            prices = existing['price'].to_numpy(np.float64)
+            self._ensure_days(int(days.min()), int(days.max()))
+            codes = self._codes(existing['category'].to_numpy())
+            slots = positions[found]
+            self.spending['day'][slots] = days
+            self.spending['price'][slots] = prices
+            self.spending['category'][slots] = codes
+            self.spending['alive'][slots] = True
+            self._accumulate(days, prices, codes, 1)
+        if len(new):
+            self._append_spending(new)
+
+    def _apply_personal(self, conn, ids):
+        for row_id in ids:
+            day = self.personal_days.pop(row_id, None)
+            if day is not None:
+                self.logged[day - self.origin] = False
+                self.masks[day - self.origin] = 0
+        self._set_personal(self._fetch(conn, f'SELECT {PERSONAL_COLUMNS} FROM personal_log WHERE id IN ({{}})', ids))
+
+    # -- reports ---------------------------------------------------------
+    def report(self, conn, name, query):
+        """Refresh, then build one of REPORTS for the query from parse_args()"""
+        with self._lock:
+            self.refresh(conn)
+            today = (date.today() - EPOCH).days
+            self._ensure_days(today, today)
+            bits = activity_bits.bits_for(activities.load(conn))
+            end = min((query['end'] - EPOCH).days, self.origin + len(self.spend) - 1)
+            if end < self.origin:
+                # The whole range is before the first day: report over no days
+                report = getattr(self, f'_{name}')(0, -1, query, bits)
+                return {**report, 'start': (query['start'] or query['end']).isoformat(),
+                        'end': query['end'].isoformat()}
+            start = max((query['start'] - EPOCH).days, self.origin) if query['start'] else self.origin
+            start = min(start, end)
+            return getattr(self, f'_{name}')(start - self.origin, end - self.origin, query, bits)
+
+    def _day(self, position):
+        return (EPOCH + timedelta(days=int(self.origin + position))).isoformat()
+
+    def _dates(self, low, high):
+        return pd.date_range(self._day(low), periods=high - low + 1, freq='D')
+
+    def _frame(self, low, high, bits):
+        """Per-day DataFrame for array positions low..high"""
+        frame = pd.DataFrame({'spending': self.spend[low:high + 1], 'entries': self.entries[low:high + 1],
+                              'logged': self.logged[low:high + 1]}, index=self._dates(low, high))
+        masks = self.masks[low:high + 1]
+        for activity, bit in bits.items():
+            frame[activity] = (masks & bit) != 0
+        return frame
+
+    def _span(self, low, high):
+        return {'start': self._day(low), 'end': self._day(high)}
+
+    def _rolling(self, low, high, query, bits):
+        # Trailing sums from a cumulative sum; windows reach back before `low`
+        totals = np.concatenate(([0.0], np.cumsum(self.spend)))
+        index = np.arange(low, high + 1) + 1
+        rolling = {str(window): np.round(totals[index] - totals[np.maximum(index - window, 0)], 2).tolist()
+                   for window in query['windows']}
+        return {
+            **self._span(low, high),
+            'dates': np.arange(self.origin + low, self.origin + high + 1).astype('datetime64[D]').astype(str).tolist(),
+            'spending': np.round(self.spend[low:high + 1], 2).tolist(),
+            'rolling': rolling,
+        }
+
+    def _weekdays(self, low, high, query, bits):
+        frame = self._frame(low, high, bits)
+        for code, name in enumerate(self.category_names):
+            frame[f'category:{name}'] = self.category_spend[code, low:high + 1]
+        weekday = frame.index.dayofweek
+        means = frame.drop(columns=['logged', *bits]).groupby(weekday).mean()
+        logged = frame[frame['logged']]
+        rates = logged[list(bits)].groupby(logged.index.dayofweek).mean()
+        days = frame.groupby(weekday).size()
+        weekdays = []
+        for number, name in enumerate(WEEKDAYS):
+            if number not in days.index:
+                continue
+            row = means.loc[number]
+            weekdays.append({
+                'weekday': name,
+                'days': int(days[number]),
+                'spending': round(float(row['spending']), 2),
+                'entries': round(float(row['entries']), 2),
+                'categories': {category: round(float(row[f'category:{category}']), 2)
+                               for category in self.category_names},
+                'activities': {activity: round(float(rates.loc[number, activity]), 3) if number in rates.index else None
+                               for activity in bits},
+            })
+        return {**self._span(low, high), 'weekdays': weekdays}
+
+    def _bits(self, low, high, bits):
+        return activity_bits.ActivityBits(self.masks[low:high + 1], self.logged[low:high + 1], bits)
+
+    def _streaks(self, low, high, query, bits):
+        bits = self._bits(low, high, bits)
+        streaks = {}
+        for activity in bits.bits:
+            length, first = bits.longest_streak(activity)
+            longest = None
+            if length:
+                longest = {'days': length, 'start': self._day(low + first), 'end': self._day(low + first + length - 1)}
+            # The current streak may end the day before `end`, which may not be logged yet
+            streaks[activity] = {'current': bits.current_streak(activity), 'longest': longest,
+                                 'days': bits.count(activity)}
+        return {**self._span(low, high), 'streaks': streaks}
+
+    def _co_occurrence(self, low, high, query, bits):
+        bits = self._bits(low, high, bits)
+        return {**self._span(low, high), 'days_logged': bits.logged.bit_count(), 'days': bits.co_occurrence()}
+
+    def _correlations(self, low, high, query, bits):
+        # Only days with a personal entry say whether an activity happened
+        logged = self.logged[low:high + 1]
+        spend = self.spend[low:high + 1][logged]
+        category_spend = self.category_spend[:, low:high + 1][:, logged]
+        result = {}
+        for activity, bit in bits.items():
+            done = (self.masks[low:high + 1][logged] & bit) != 0
+            with_days, without_days = int(done.sum()), int((~done).sum())
+            varies = 0 < with_days < len(done) and spend.std() > 0
+            result[activity] = {
+                'days_with': with_days,
+                'days_without': without_days,
+                'spending_with': _mean(spend, done),
+                'spending_without': _mean(spend, ~done),
+                'correlation': round(float(np.corrcoef(done, spend)[0, 1]), 3) if varies else None,
+                'categories': {name: {'with': _mean(category_spend[code], done),
+                                      'without': _mean(category_spend[code], ~done)}
+                               for code, name in enumerate(self.category_names)},
+            }
+        return {**self._span(low, high), 'days_logged': int(logged.sum()), 'activities': result}
+
+
+def _mean(values, mask):
+    return round(float(values[mask].mean()), 2) if mask.any() else None
+
+
+def parse_args(args, today=None):
+    """Validate query-string arguments; raises ValueError with a message for the client"""
+    today = today or date.today()
+    try:
+        start = date.fromisoformat(args['start']) if args.get('start') else None
+        end = date.fromisoformat(args['end']) if args.get('end') else today
+    except ValueError:
+        raise ValueError('start and end must be YYYY-MM-DD dates')
+    if start and start > end:
+        raise ValueError('start must not be after end')
+    try:
+        windows = tuple(int(w) for w in args['windows'].split(',')) if args.get('windows') else DEFAULT_WINDOWS
+    except ValueError:
+        raise ValueError('windows must be comma-separated day counts')
+    if not all(1 <= w <= MAX_WINDOW for w in windows):
+        raise ValueError(f'windows must be between 1 and {MAX_WINDOW} days')
+    return {'start': start, 'end': end, 'windows': windows}
+
+
+def get_trends(app=None):
+    """Get (or lazily create) the trends engine for the request's database; it loads on first use"""
+    extensions = db.database_extensions(app)
+    engine = extensions.get('trends')
+    if engine is None:
+        engine = extensions.setdefault('trends', Trends())
+    return engine
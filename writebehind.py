@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Write-behind group commit for Finance Tracker
+- Off by default; with WRITE_BEHIND (FINANCE_WRITE_BEHIND=1) the form routes
+  hand their writes to a queue instead of committing on the request's own
+  connection
+- One writer thread per database drains the queue into a single transaction:
+  after the first write arrives it waits up to WRITE_BEHIND_WINDOW_MS for
+  more, or until WRITE_BEHIND_MAX_WRITES are pending, then commits them all
+- Each write runs in its own savepoint, so a failing write is rolled back and
+  raised to its caller without taking the rest of the group with it
+- write() returns only once its group has committed, on a connection with the
+  same pragmas as every other, so durability is unchanged and the request
+  (and the page it redirects to) reads its own write
+- Queues are per-database state (db.database_extensions), so each tenant
+  shard gets its own writer
+
+Usage: python -m benchmarks.group_commit --writers 16 --duration 5
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+import db
+import metrics
+
+DEFAULT_WINDOW_MS = 5
+DEFAULT_MAX_WRITES = 256
+DEFAULT_TIMEOUT = 10.0
+
+log = logging.getLogger('finance.writebehind')
+
+
+class WriteTimeout(Exception):
+    """A queued write wasn't started within the timeout; it was withdrawn, so nothing was written"""
+
+
+class WriteQueue:
+    """Queue of pending writes to one database and the thread that commits them in groups.
+
+    The thread starts with the first write and stops on close().
+    """
+
+    def __init__(self, path, window=DEFAULT_WINDOW_MS / 1000, max_writes=DEFAULT_MAX_WRITES,
+                 timeout=DEFAULT_TIMEOUT, factory=sqlite3.Connection):
+        self.path = path
+        self.window = window
+        self.max_writes = max_writes
+        self.timeout = timeout
+        self.factory = factory
+        self.groups = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Run fn(conn, *args) in the next group; returns its result once the group has committed.
+
+        fn must not commit. Its exception, if any, is raised here after its
+        savepoint has been rolled back.
+        """
+        future = Future()
+        self._start()
+        self._queue.put((future, fn, args))
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise WriteTimeout(f'No write to {self.path} committed within {self.timeout}s')
+            # Already in a group: its outcome is about to be known
+            return future.result()
+
+    def close(self, timeout=None):
+        """Commit what's queued, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        return {'groups': self.groups, 'writes': self.writes, 'pending': self._queue.qsize()}
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='finance-writebehind', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        conn = db.connect(self.path, self.factory)
+        try:
+            stop = False
+            while not stop:
+                group, stop = self._collect()
+                if group:
+                    self._commit(conn, group)
+        finally:
+            conn.close()
+
+    def _collect(self):
+        """Block for the first write, then gather more until the window closes or the group is full.
+
+        Returns (group, stop); stop is set once close() has been called.
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_writes:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return group, True
+            group.append(item)
+        return group, False
+
+    def _commit(self, conn, group):
+        # Writes whose caller timed out were cancelled and are dropped here
+        group = [item for item in group if item[0].set_running_or_notify_cancel()]
+        if not group:
+            return
+        outcomes = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for future, fn, args in group:
+                conn.execute('SAVEPOINT write')
+                try:
+                    outcomes.append((future, fn(conn, *args), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write')
+                    outcomes.append((future, None, e))
+                conn.execute('RELEASE write')
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            log.exception('Group of %d writes to %s failed', len(group), self.path)
+            metrics.WRITE_GROUP_SIZE.observe(('failed',), len(group))
+            for future, _fn, _args in group:
+                future.set_exception(e)
+            return
+        self.groups += 1
+        self.writes += len(group)
+        metrics.WRITE_GROUP_SIZE.observe(('committed',), len(group))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+def get_queue(app=None):
+    """Get (or lazily create) the write queue for the request's database"""
+    app = app or current_app
+    extensions = db.database_extensions(app)
+    write_queue = extensions.get('write_queue')
+    if write_queue is None:
+        write_queue = extensions.setdefault('write_queue', WriteQueue(
+            db.current_database(app),
+            window=app.config['WRITE_BEHIND_WINDOW_MS'] / 1000,
+            max_writes=app.config['WRITE_BEHIND_MAX_WRITES'],
+            timeout=app.config['WRITE_BEHIND_TIMEOUT'],
+            factory=app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection),
+        ))
+    return write_queue
+
+
+def write(fn, *args):
+    """Run fn(conn, *args) and commit it: in the next group when write-behind is on,
+    otherwise on the request's connection. Returns fn's result."""
+    if not current_app.config['WRITE_BEHIND']:
+        conn = db.get_db()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        return result
+    return get_queue().submit(fn, *args)
+
+
+def init_app(app):
+    app.config.setdefault('WRITE_BEHIND', os.environ.get('FINANCE_WRITE_BEHIND', '0') == '1')
+    app.config.setdefault('WRITE_BEHIND_WINDOW_MS', DEFAULT_WINDOW_MS)
+    app.config.setdefault('WRITE_BEHIND_MAX_WRITES', DEFAULT_MAX_WRITES)
+    app.config.setdefault('WRITE_BEHIND_TIMEOUT', DEFAULT_TIMEOUT)
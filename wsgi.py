@@ -0,0 +1,22 @@
+"""
+WSGI entry point for production servers
+- Builds the app through create_app() and applies schema migrations at import,
+  so with gunicorn's preload_app they run once in the master before workers fork
+- Fails fast if the database schema doesn't match the code
+- This is the process's only app instance (app.py builds none at import), so
+  gunicorn.conf.py's post_fork resets everything the workers serve
+
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import logging
+
+from app import create_app, init_db
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+app = create_app()
+
+applied = init_db(app)
+if applied:
+    logging.getLogger('finance').info('schema_migrated versions=%s', ','.join(map(str, applied)))